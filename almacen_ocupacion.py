@@ -0,0 +1,251 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, time, timedelta
+
+from estado_eventos import descartar, reglas_de
+from main import parsear_intervalo
+
+# Almacén local de ocupación por agente (OWNER_ID de Bitrix) en SQLite. Los clientes
+# sincronizan eventos sueltos (alta/cambio/baja por ID y VERSION) y luego consultan la
+# disponibilidad con "agente_id" en lugar de reenviar el calendario completo. Los intervalos
+# se guardan ya parseados (ISO, ordenable) con índice por (agente, inicio) y (agente, fin),
+# así la consulta sólo lee los eventos que tocan la ventana pedida. Junto al intervalo se
+# guardan los campos de estado (ACTIVE, ACCESSIBILITY, MEETING_STATUS, ATTENDEE_LIST...) para
+# aplicar "filtro_eventos" de la consulta a los eventos guardados igual que a los en línea.
+#
+# Variables de entorno:
+#   CITAS_ALMACEN_DB=ruta   activa el almacén (sin ella, "agente_id" no consulta nada)
+#
+# Operaciones (payload con "operacion"):
+#   {"operacion": "upsert", "agente_id"?, "eventos"|"calendar"|"citas": [...]}
+#   {"operacion": "eliminar", "agente_id", "ids": [...]}
+#   {"operacion": "reemplazar", "agente_id", "eventos"|"calendar"|"citas": [...]}
+#   {"operacion": "vaciar", "agente_id"}
+
+OPERACIONES = ("upsert", "eliminar", "reemplazar", "vaciar")
+
+# Campos que usa estado_eventos.motivo_descarte (DELETED no: un evento borrado no se guarda)
+CAMPOS_ESTADO = ("ACTIVE", "ACCESSIBILITY", "MEETING_STATUS", "OWNER_ID")
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _version(ev):
+    try:
+        return int(ev.get("VERSION") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _es_borrado(ev):
+    return str(ev.get("DELETED") or "").upper() == "Y"
+
+
+def _estado(ev):
+    # JSON con los campos de estado presentes (de ATTENDEE_LIST sólo id y status), o None
+    estado = {k: ev[k] for k in CAMPOS_ESTADO if ev.get(k) not in (None, "")}
+    asistentes = ev.get("ATTENDEE_LIST")
+    if isinstance(asistentes, list):
+        lista = [{"id": a.get("id"), "status": a.get("status")} for a in asistentes if isinstance(a, dict)]
+        if lista:
+            estado["ATTENDEE_LIST"] = lista
+    return json.dumps(estado, separators=(",", ":")) if estado else None
+
+
+class AlmacenOcupacion:
+    """Eventos por agente en un archivo SQLite (una conexión por hilo, WAL)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        con = self._conexion()
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS eventos ("
+            " agente TEXT NOT NULL, id TEXT NOT NULL, version INTEGER NOT NULL,"
+            " inicio TEXT NOT NULL, fin TEXT NOT NULL, PRIMARY KEY (agente, id))"
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS eventos_inicio ON eventos (agente, inicio)")
+        con.execute("CREATE INDEX IF NOT EXISTS eventos_fin ON eventos (agente, fin)")
+        # Bases creadas antes de guardar el estado: sus filas (NULL) ocupan siempre
+        if "estado" not in [fila[1] for fila in con.execute("PRAGMA table_info(eventos)")]:
+            con.execute("ALTER TABLE eventos ADD COLUMN estado TEXT")
+        con.commit()
+
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=5.0)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def upsert(self, agente, eventos):
+        """Inserta o actualiza eventos por ID. Una VERSION menor que la guardada se ignora;
+        DELETED=Y borra el evento. Retorna contadores.
+        """
+        con = self._conexion()
+        with con:
+            return self._escribir(con, agente, eventos)
+
+    def _escribir(self, con, agente, eventos):
+        # Cuerpo de upsert, dentro de la transacción abierta por quien llama
+        aplicados = ignorados = eliminados = 0
+        for ev in eventos:
+            if not isinstance(ev, dict) or ev.get("ID") in (None, ""):
+                ignorados += 1
+                continue
+            dueno = str(agente if agente is not None else ev.get("OWNER_ID") or "")
+            if not dueno:
+                ignorados += 1
+                continue
+            id_ev = str(ev["ID"])
+            if _es_borrado(ev):
+                eliminados += con.execute("DELETE FROM eventos WHERE agente = ? AND id = ?",
+                                          (dueno, id_ev)).rowcount
+                continue
+            intervalo = parsear_intervalo(ev)
+            if intervalo is None:
+                ignorados += 1
+                continue
+            cur = con.execute(
+                "INSERT INTO eventos (agente, id, version, inicio, fin, estado) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (agente, id) DO UPDATE SET version = excluded.version,"
+                " inicio = excluded.inicio, fin = excluded.fin, estado = excluded.estado"
+                " WHERE excluded.version >= eventos.version",
+                (dueno, id_ev, _version(ev), _iso(intervalo[0]), _iso(intervalo[1]), _estado(ev)),
+            )
+            if cur.rowcount:
+                aplicados += 1
+            else:
+                ignorados += 1
+        return {"aplicados": aplicados, "ignorados": ignorados, "eliminados": eliminados}
+
+    def eliminar(self, agente, ids):
+        con = self._conexion()
+        with con:
+            n = sum(con.execute("DELETE FROM eventos WHERE agente = ? AND id = ?",
+                                (str(agente), str(i))).rowcount for i in ids)
+        return {"eliminados": n}
+
+    def vaciar(self, agente):
+        con = self._conexion()
+        with con:
+            n = con.execute("DELETE FROM eventos WHERE agente = ?", (str(agente),)).rowcount
+        return {"eliminados": n}
+
+    def reemplazar(self, agente, eventos):
+        """Sincronización completa: el calendario del agente pasa a ser exactamente `eventos`.
+        Borrado e inserción van en una sola transacción (BEGIN IMMEDIATE): una consulta
+        concurrente ve el calendario anterior o el nuevo, nunca el agente vacío.
+        """
+        con = self._conexion()
+        with con:
+            con.execute("BEGIN IMMEDIATE")
+            eliminados = con.execute("DELETE FROM eventos WHERE agente = ?", (str(agente),)).rowcount
+            datos = self._escribir(con, agente, eventos)
+        datos["eliminados"] += eliminados
+        return datos
+
+    def intervalos(self, agente, desde=None, hasta=None, reglas=None):
+        """[(inicio, fin), ...] del agente que se cruzan con [desde, hasta) (datetime u omitidos).
+        Con `reglas` (estado_eventos.reglas_de) se omiten los eventos que descartan.
+        """
+        sql = "SELECT inicio, fin, estado FROM eventos WHERE agente = ?"
+        args = [str(agente)]
+        if desde is not None:
+            sql += " AND fin > ?"
+            args.append(_iso(desde))
+        if hasta is not None:
+            sql += " AND inicio < ?"
+            args.append(_iso(hasta))
+        filas = self._conexion().execute(sql + " ORDER BY inicio", args).fetchall()
+        if reglas is not None:
+            filas = [fila for fila in filas if fila[2] is None or not descartar(json.loads(fila[2]), reglas)]
+        return [(datetime.fromisoformat(i), datetime.fromisoformat(f)) for i, f, _ in filas]
+
+    def estadisticas(self):
+        con = self._conexion()
+        eventos, agentes = con.execute("SELECT COUNT(*), COUNT(DISTINCT agente) FROM eventos").fetchone()
+        return {"ruta": self.ruta, "eventos": eventos, "agentes": agentes}
+
+
+_ALMACEN = None
+_ALMACEN_INICIADO = False
+
+
+def obtener_almacen():
+    """Almacén del proceso según CITAS_ALMACEN_DB (None si no está configurado)."""
+    global _ALMACEN, _ALMACEN_INICIADO
+    if not _ALMACEN_INICIADO:
+        _ALMACEN_INICIADO = True
+        ruta = os.environ.get("CITAS_ALMACEN_DB")
+        if ruta:
+            _ALMACEN = AlmacenOcupacion(ruta)
+    return _ALMACEN
+
+
+def agente_de(payload):
+    if not isinstance(payload, dict):
+        return None
+    for k in ("agente_id", "OWNER_ID"):
+        v = payload.get(k)
+        if v is not None and v != "":
+            return str(v)
+    return None
+
+
+def ocupacion_almacenada(payload, desde=None, hasta=None):
+    """Intervalos guardados para payload["agente_id"] dentro de los días [desde, hasta], con
+    el mismo "filtro_eventos" que los eventos en línea.
+    """
+    almacen = obtener_almacen()
+    agente = agente_de(payload)
+    if almacen is None or agente is None:
+        return []
+    inicio = datetime.combine(desde, time(0, 0)) if desde is not None else None
+    fin = datetime.combine(hasta + timedelta(days=1), time(0, 0)) if hasta is not None else None
+    return almacen.intervalos(agente, inicio, fin, reglas_de(payload))
+
+
+def _eventos_de(payload):
+    # Eventos completos (con ID/VERSION/DELETED), no sólo DATE_FROM/DATE_TO
+    eventos = payload.get("eventos")
+    if isinstance(eventos, list):
+        return eventos
+    if isinstance(payload.get("calendar"), list) and payload["calendar"]:
+        primero = payload["calendar"][0]
+        body = primero.get("body", {}) if isinstance(primero, dict) else {}
+        result = body.get("result", []) if isinstance(body, dict) else []
+        return result if isinstance(result, list) else []
+    citas = payload.get("citas")
+    if isinstance(citas, dict) and isinstance(citas.get("result"), list):
+        return citas["result"]
+    return []
+
+
+def aplicar_operacion(payload):
+    """Ejecuta payload["operacion"] sobre el almacén y retorna un resumen."""
+    almacen = obtener_almacen()
+    if almacen is None:
+        return {"error": "Almacén de ocupación no configurado (CITAS_ALMACEN_DB)"}
+    operacion = payload.get("operacion")
+    if operacion not in OPERACIONES:
+        return {"error": f"Operación no soportada: {operacion}"}
+    agente = agente_de(payload)
+    if agente is None and operacion != "upsert":
+        return {"error": "Se requiere 'agente_id' para esta operación"}
+
+    if operacion == "upsert":
+        datos = almacen.upsert(agente, _eventos_de(payload))
+    elif operacion == "reemplazar":
+        datos = almacen.reemplazar(agente, _eventos_de(payload))
+    elif operacion == "eliminar":
+        datos = almacen.eliminar(agente, payload.get("ids") or [])
+    else:
+        datos = almacen.vaciar(agente)
+    return {"operacion": operacion, "agente_id": agente, **datos}
@@ -0,0 +1,71 @@
+from main import (
+    disponibilidad_para_dias,
+    formatear_slot,
+    grilla_slots,
+    indexar_ocupacion,
+    leer_configuracion,
+    marcar_ocupados,
+    normalizar_payload,
+    ocupacion_de,
+    seleccionar_dias,
+)
+
+# Slots libres en común para reuniones con varios asistentes:
+# {"asistentes": [{"calendar"|"citas"|"resultado"|"agente_id": ...}, ...], "minimo_libres"?: K,
+#  "minutos"?, "Cantidad_dias"?, "filtro"?}
+# Con K = N (por defecto) basta la unión ordenada de todas las ocupaciones; con K < N se
+# cuenta por slot cuántos asistentes están ocupados y se tolera hasta N - K.
+# "capacidad" no aplica: un slot sirve sólo si el asistente no tiene ninguna cita en él.
+# Se aplican las mismas reglas que a un agente: sábado hasta 13:00, festivos y dias_habiles
+# (o la plantilla de "filtro", con su margen alrededor de las citas de cada asistente).
+
+
+def _minimo_libres(payload, n):
+    try:
+        k = int(payload.get("minimo_libres", n))
+    except (TypeError, ValueError):
+        k = n
+    return max(1, min(n, k))
+
+
+def calcular_comun(payload, hoy, motor=None):
+    fuentes = [normalizar_payload(a) for a in payload.get("asistentes") or []]
+    if "filtro_eventos" in payload:
+        # Las reglas de estado del payload valen para cada asistente que no traiga las suyas
+        fuentes = [dict({"filtro_eventos": payload["filtro_eventos"]}, **f) if isinstance(f, dict) else f
+                   for f in fuentes]
+    # Cada asistente es una persona: una cita suya lo ocupa aunque el payload traiga
+    # "capacidad" (las de distintos asistentes no son sillas en paralelo)
+    config = dict(leer_configuracion(payload), capacidad=1)
+    dias = seleccionar_dias(hoy, config)
+    ventana = (dias[0], dias[-1]) if dias else None
+    ocupaciones = [ocupacion_de(f, config, ventana) for f in fuentes]
+    n = len(ocupaciones)
+    k = _minimo_libres(payload, n) if n else 0
+
+    if k >= n:
+        # Todos libres: un slot sirve si no se cruza con la unión de todas las ocupaciones
+        union = [iv for ocupacion in ocupaciones for iv in ocupacion]
+        return disponibilidad_para_dias(dias, config, union, motor)
+
+    tolerancia = n - k
+    plantilla = config["plantilla"]
+    indices = [indexar_ocupacion(ocupacion, dias) for ocupacion in ocupaciones]
+    resultado = []
+    for d in dias:
+        if plantilla is not None:
+            grilla = plantilla.grilla(d)
+        else:
+            grilla = grilla_slots(d, config["t_desde"], config["t_hasta"], config["slot_minutes"])
+        ocupados = [0] * len(grilla)
+        for indice in indices:
+            bloques = indice.get(d)
+            if bloques:
+                for i, ocupado in enumerate(marcar_ocupados(grilla, bloques)):
+                    if ocupado:
+                        ocupados[i] += 1
+        resultado.append({
+            "dia": d.isoformat(),
+            "citas": [formatear_slot(inicio, fin) for (inicio, fin), c in zip(grilla, ocupados) if c <= tolerancia],
+        })
+    return resultado
@@ -0,0 +1,2 @@
+# Benchmarks del motor de disponibilidad. Ejecutar desde la raíz del repositorio:
+#   python -m benchmarks.bench_servidor
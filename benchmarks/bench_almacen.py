@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.sinteticos import generar_eventos, generar_payload
+
+# Calendario en línea contra almacén de ocupación: costo de una consulta reenviando y
+# parseando todo el calendario, frente a cambiar un evento (upsert) y consultar por agente_id.
+
+
+def cronometrar(fn, repeticiones):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - t0) / repeticiones
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Calendario en línea vs almacén SQLite")
+    parser.add_argument("--eventos", default="1000,10000,50000")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args(argv[1:])
+
+    directorio = tempfile.mkdtemp(prefix="citas_almacen_")
+    os.environ["CITAS_ALMACEN_DB"] = os.path.join(directorio, "ocupacion.db")
+    os.environ["CITAS_CACHE"] = "0"
+    from main import calcular_disponibilidad
+
+    hoy = date(2025, 9, 2)
+    filas = []
+    for n in (int(x) for x in args.eventos.split(",")):
+        # Historial largo: la mayoría de los eventos caen fuera de la ventana consultada
+        payload = generar_payload(n, desde=date(2024, 1, 1), dias=700)
+        agente = f"agente-{n}"
+        cuerpo = json.dumps(payload)
+        eventos = payload["calendar"][0]["body"]["result"]
+        calcular_disponibilidad({"operacion": "reemplazar", "agente_id": agente, "eventos": eventos})
+
+        cambio = dict(generar_eventos(1, desde=hoy, semilla=n)[0], ID=eventos[0]["ID"], VERSION="2")
+        consulta = {"agente_id": agente}
+        en_linea = cronometrar(lambda: calcular_disponibilidad(json.loads(cuerpo), hoy=hoy), args.repeticiones)
+        upsert = cronometrar(lambda: calcular_disponibilidad(
+            {"operacion": "upsert", "agente_id": agente, "eventos": [cambio]}), args.repeticiones)
+        por_agente = cronometrar(lambda: calcular_disponibilidad(dict(consulta), hoy=hoy), args.repeticiones)
+        filas.append({
+            "eventos": n,
+            "cuerpo_mb": round(len(cuerpo) / 1e6, 2),
+            "en_linea_ms": round(en_linea * 1000, 2),
+            "upsert_ms": round(upsert * 1000, 2),
+            "consulta_agente_ms": round(por_agente * 1000, 2),
+        })
+    print(json.dumps(filas, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
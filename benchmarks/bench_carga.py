@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import ssl
+import subprocess
+import sys
+import time
+from urllib.parse import quote_plus, urlsplit
+
+from benchmarks.bench_servidor import RAIZ, esperar_puerto, percentil, puerto_libre
+from benchmarks.sinteticos import generar_payload
+
+# Generador de carga (asyncio) que reproduce payloads capturados contra una instancia local:
+# index.php -> main.py (php -S), servidor.py o cualquier URL. Sin red externa.
+#
+#   python3 -m benchmarks.bench_carga --lanzar servidor --conexiones 8 --duracion 30
+#   python3 -m benchmarks.bench_carga --url http://127.0.0.1:8000/ --pid 1234 --tasa 20
+#   python3 -m benchmarks.bench_carga --exportar-muestras capturas/
+#
+# Payloads: un directorio (--payloads) con un archivo por solicitud, el cuerpo tal cual se
+# capturó: *.json se envía como application/json y *.form como form-urlencoded. Sin
+# directorio se usan las muestras del repo (curl_examples.sh, envio.json, ejemplo.py), más
+# un calendario sintético de --sinteticos eventos si se pide.
+#
+# Modos:
+#   cerrado   --conexiones N clientes que envían una solicitud tras otra (por defecto)
+#   abierto   --tasa R llegadas por segundo (Poisson, o --llegadas constante); --conexiones
+#             limita las conexiones simultáneas y lo que no cabe espera en cola. La latencia
+#             se mide desde la llegada programada, así la cola cuenta (sin omisión coordinada).
+#
+# CPU del servidor: utime + stime (más los hijos ya recogidos) del proceso y sus
+# descendientes vivos, leída de /proc antes y después de la medición. Con --lanzar se usa
+# el proceso lanzado; si no, --pid.
+
+TIPOS = {".json": "application/json", ".form": "application/x-www-form-urlencoded"}
+
+
+def muestras_incluidas():
+    """[(nombre, tipo, cuerpo)] con los ejemplos del repo."""
+    muestras = []
+    with open(os.path.join(RAIZ, "curl_examples.sh"), "r", encoding="utf-8") as f:
+        guion = f.read()
+    # Cada curl: -H "Content-Type: ..." seguido de -d '...' o --data-urlencode 'campo=...'
+    patron = re.compile(r'-H "Content-Type: ([^"]+)"\s*\\\s*(-d|--data-urlencode) \'(.*?)\'', re.S)
+    for i, (tipo, opcion, dato) in enumerate(patron.findall(guion), 1):
+        if opcion == "--data-urlencode":
+            campo, _, valor = dato.partition("=")
+            dato = f"{campo}={quote_plus(valor)}"
+        muestras.append((f"curl_{i}", tipo, dato.encode("utf-8")))
+    with open(os.path.join(RAIZ, "envio.json"), "rb") as f:
+        muestras.append(("envio", "application/json", f.read()))
+    from ejemplo import load_calendar
+
+    # Mismo payload que arma ejemplo.py con su calendario de muestra
+    ejemplo = {
+        "minutos": 10,
+        "Cantidad_dias": 3,
+        "filtro": {"horario": {"desde": "09:00", "hasta": "17:00"}, "jornada": 1},
+        "calendar": load_calendar([""]),
+    }
+    muestras.append(("ejemplo", "application/json", json.dumps(ejemplo, ensure_ascii=False).encode("utf-8")))
+    return muestras
+
+
+def muestra_sintetica(eventos):
+    payload = generar_payload(eventos, 20, 7, dias=30, relleno=800)
+    return (f"sintetico_{eventos}", "application/json", json.dumps(payload).encode("utf-8"))
+
+
+def leer_directorio(directorio):
+    muestras = []
+    for nombre in sorted(os.listdir(directorio)):
+        base, ext = os.path.splitext(nombre)
+        if ext in TIPOS:
+            with open(os.path.join(directorio, nombre), "rb") as f:
+                muestras.append((base, TIPOS[ext], f.read()))
+    return muestras
+
+
+def exportar(muestras, directorio):
+    os.makedirs(directorio, exist_ok=True)
+    extension = {tipo: ext for ext, tipo in TIPOS.items()}
+    for nombre, tipo, cuerpo in muestras:
+        with open(os.path.join(directorio, nombre + extension.get(tipo, ".json")), "wb") as f:
+            f.write(cuerpo)
+
+
+def cpu_arbol(pid):
+    """CPU (s) del proceso `pid` y sus descendientes vivos, con los hijos ya recogidos."""
+    procesos = {}
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat", "r") as f:
+                campos = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        procesos[int(entrada)] = (int(campos[1]), sum(int(c) for c in campos[11:15]))
+    total = 0
+    pendientes = [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        if actual in procesos:
+            total += procesos[actual][1]
+        pendientes.extend(p for p, (padre, _) in procesos.items() if padre == actual)
+    return total / os.sysconf("SC_CLK_TCK")
+
+
+class Conexion:
+    """Conexión HTTP/1.1 mínima sobre asyncio, reutilizable mientras el servidor la mantenga."""
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.lector = self.escritor = None
+
+    async def abrir(self):
+        host, puerto, cifrado = self.destino
+        self.lector, self.escritor = await asyncio.open_connection(
+            host, puerto, ssl=ssl.create_default_context() if cifrado else None)
+
+    def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        self.lector = self.escritor = None
+
+    async def enviar(self, solicitud):
+        """Envía bytes ya armados y retorna (estado, bytes del cuerpo)."""
+        if self.escritor is None:
+            await self.abrir()
+        self.escritor.write(solicitud)
+        await self.escritor.drain()
+        cabeza = await self.lector.readuntil(b"\r\n\r\n")
+        lineas = cabeza.decode("latin-1").split("\r\n")
+        version, estado = lineas[0].split(" ", 2)[:2]
+        cabeceras = {}
+        for linea in lineas[1:]:
+            k, sep, v = linea.partition(":")
+            if sep:
+                cabeceras[k.strip().lower()] = v.strip().lower()
+        if "chunked" in cabeceras.get("transfer-encoding", ""):
+            largo = 0
+            while True:
+                tam = int((await self.lector.readline()).split(b";", 1)[0], 16)
+                await self.lector.readexactly(tam + 2)
+                largo += tam
+                if tam == 0:
+                    break
+        elif "content-length" in cabeceras:
+            largo = int(cabeceras["content-length"])
+            await self.lector.readexactly(largo)
+        else:
+            largo = len(await self.lector.read())
+            self.cerrar()
+            return int(estado), largo
+        if version == "HTTP/1.0" or cabeceras.get("connection") == "close":
+            self.cerrar()
+        return int(estado), largo
+
+
+def armar_solicitud(url, tipo, cuerpo, extras):
+    partes = urlsplit(url)
+    ruta = (partes.path or "/") + (f"?{partes.query}" if partes.query else "")
+    cabeza = [f"POST {ruta} HTTP/1.1", f"Host: {partes.netloc}", f"Content-Type: {tipo}",
+              f"Content-Length: {len(cuerpo)}", "Connection: keep-alive", *extras]
+    return ("\r\n".join(cabeza) + "\r\n\r\n").encode("latin-1") + cuerpo
+
+
+class Registro:
+    def __init__(self):
+        self.latencias = {}
+        self.errores = {}
+        self.estados = {}
+        self.bytes = 0
+
+    def anotar(self, nombre, latencia, estado=None, largo=0, error=None):
+        self.latencias.setdefault(nombre, []).append(latencia)
+        if estado is not None:
+            self.estados[estado] = self.estados.get(estado, 0) + 1
+            if estado >= 400:
+                error = f"http_{estado}"
+        if error is not None:
+            clave = (nombre, error)
+            self.errores[clave] = self.errores.get(clave, 0) + 1
+        self.bytes += largo
+
+
+async def una(conexiones, solicitud, nombre, inicio, registro, limite):
+    conexion = conexiones.pop() if conexiones else None
+    try:
+        if conexion is None:
+            conexion = Conexion(solicitud[0])
+        estado, largo = await asyncio.wait_for(conexion.enviar(solicitud[1]), limite)
+        registro.anotar(nombre, time.perf_counter() - inicio, estado, largo)
+    except asyncio.TimeoutError:
+        conexion.cerrar()
+        registro.anotar(nombre, time.perf_counter() - inicio, error="timeout")
+    except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        conexion.cerrar()
+        registro.anotar(nombre, time.perf_counter() - inicio, error="conexion")
+    conexiones.append(conexion)
+
+
+async def modo_cerrado(solicitudes, args, registro, elegir):
+    conexiones = []
+    fin = time.perf_counter() + args.duracion if args.duracion else None
+    restantes = [args.solicitudes]
+
+    def quedan():
+        if fin is not None:
+            return time.perf_counter() < fin
+        restantes[0] -= 1
+        return restantes[0] >= 0
+
+    async def cliente():
+        while quedan():
+            nombre, solicitud = elegir()
+            await una(conexiones, solicitud, nombre, time.perf_counter(), registro, args.timeout)
+
+    await asyncio.gather(*(cliente() for _ in range(args.conexiones)))
+
+
+async def modo_abierto(solicitudes, args, registro, elegir, rnd):
+    conexiones = []
+    cupo = asyncio.Semaphore(args.conexiones)
+    pendientes = set()
+    t0 = time.perf_counter()
+    llegada = t0
+    total = 0
+    max_cola = 0
+
+    async def atender(nombre, solicitud, programada):
+        async with cupo:
+            await una(conexiones, solicitud, nombre, programada, registro, args.timeout)
+
+    while True:
+        llegada += rnd.expovariate(args.tasa) if args.llegadas == "poisson" else 1.0 / args.tasa
+        if (args.duracion and llegada - t0 >= args.duracion) or (not args.duracion and total >= args.solicitudes):
+            break
+        espera = llegada - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        nombre, solicitud = elegir()
+        tarea = asyncio.ensure_future(atender(nombre, solicitud, llegada))
+        pendientes.add(tarea)
+        tarea.add_done_callback(pendientes.discard)
+        max_cola = max(max_cola, len(pendientes) - args.conexiones)
+        total += 1
+    if pendientes:
+        await asyncio.gather(*pendientes)
+    return max_cola
+
+
+def informe(registro, pared, cpu, args, max_cola=None):
+    todas = [lat for lats in registro.latencias.values() for lat in lats]
+    n = len(todas)
+    errores = sum(registro.errores.values())
+    por_tipo = {}
+    for (_, error), c in registro.errores.items():
+        por_tipo[error] = por_tipo.get(error, 0) + c
+    por_payload = {}
+    for nombre, lats in sorted(registro.latencias.items()):
+        por_payload[nombre] = {
+            "solicitudes": len(lats),
+            "errores": sum(c for (p, _), c in registro.errores.items() if p == nombre),
+            "p50_ms": round(percentil(lats, 50) * 1000, 2),
+            "p99_ms": round(percentil(lats, 99) * 1000, 2),
+        }
+    datos = {
+        "modo": "abierto" if args.tasa else "cerrado",
+        "conexiones": args.conexiones,
+        "tasa_objetivo_rps": args.tasa,
+        "pared_s": round(pared, 3),
+        "solicitudes": n,
+        "throughput_rps": round(n / pared, 2) if pared > 0 else 0.0,
+        "exitosas_rps": round((n - errores) / pared, 2) if pared > 0 else 0.0,
+        "tasa_error": round(errores / n, 4) if n else 0.0,
+        "errores": por_tipo,
+        "estados": {str(k): v for k, v in sorted(registro.estados.items())},
+        "latencia_ms": {
+            "media": round(sum(todas) / n * 1000, 2) if n else 0.0,
+            **{f"p{p}".replace(".", ""): round(percentil(todas, p) * 1000, 2) for p in (50, 90, 99, 99.9)},
+            "max": round(max(todas) * 1000, 2) if n else 0.0,
+        },
+        "bytes_recibidos": registro.bytes,
+        "por_payload": por_payload,
+    }
+    if max_cola is not None:
+        datos["cola_max"] = max_cola
+    if cpu is not None:
+        datos["cpu_servidor_ms"] = round(cpu * 1000, 1)
+        datos["cpu_por_solicitud_ms"] = round(cpu * 1000 / n, 2) if n else 0.0
+        datos["cpu_utilizacion"] = round(cpu / pared, 3) if pared > 0 else 0.0
+    return datos
+
+
+def lanzar(tipo, procesos, entorno):
+    """Levanta una instancia local; retorna (Popen, url)."""
+    puerto = puerto_libre()
+    if tipo == "php":
+        if shutil.which("php") is None:
+            raise SystemExit("php no está instalado: usa --lanzar servidor o --url")
+        comando = ["php", "-S", f"127.0.0.1:{puerto}", "index.php"]
+    else:
+        comando = [sys.executable, "servidor.py", "--host", "127.0.0.1", "--puerto", str(puerto),
+                   "--procesos", str(procesos)]
+    proc = subprocess.Popen(comando, cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    esperar_puerto(puerto)
+    return proc, f"http://127.0.0.1:{puerto}/"
+
+
+async def correr(muestras, url, args, pid):
+    partes = urlsplit(url)
+    cifrado = partes.scheme == "https"
+    destino = (partes.hostname, partes.port or (443 if cifrado else 80), cifrado)
+    solicitudes = [(nombre, (destino, armar_solicitud(url, tipo, cuerpo, args.cabecera)))
+                   for nombre, tipo, cuerpo in muestras]
+    rnd = random.Random(args.semilla)
+    secuencia = iter(range(sys.maxsize))
+
+    def elegir():
+        if args.orden == "secuencial":
+            return solicitudes[next(secuencia) % len(solicitudes)]
+        return rnd.choice(solicitudes)
+
+    if args.calentamiento:
+        await modo_cerrado(solicitudes, argparse.Namespace(**dict(
+            vars(args), duracion=0, solicitudes=args.calentamiento)), Registro(), elegir)
+
+    registro = Registro()
+    cpu0 = cpu_arbol(pid) if pid else None
+    t0 = time.perf_counter()
+    max_cola = None
+    if args.tasa:
+        max_cola = await modo_abierto(solicitudes, args, registro, elegir, rnd)
+    else:
+        await modo_cerrado(solicitudes, args, registro, elegir)
+    pared = time.perf_counter() - t0
+    cpu = cpu_arbol(pid) - cpu0 if pid else None
+    return informe(registro, pared, cpu, args, max_cola)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Carga concurrente reproduciendo payloads capturados")
+    parser.add_argument("--url", help="instancia ya levantada (p. ej. http://127.0.0.1:8000/)")
+    parser.add_argument("--lanzar", choices=("servidor", "php"), help="levanta servidor.py o php -S index.php")
+    parser.add_argument("--procesos", type=int, default=1, help="procesos de servidor.py con --lanzar servidor")
+    parser.add_argument("--entorno", action="append", default=[], metavar="VAR=VALOR",
+                        help="variables para la instancia lanzada (p. ej. CITAS_CACHE=0)")
+    parser.add_argument("--pid", type=int, help="proceso del servidor para medir CPU (con --url)")
+    parser.add_argument("--payloads", help="directorio con *.json / *.form capturados")
+    parser.add_argument("--sinteticos", type=int, default=0, help="agrega un calendario sintético de N eventos")
+    parser.add_argument("--exportar-muestras", metavar="DIR", help="escribe las muestras en DIR y termina")
+    parser.add_argument("--conexiones", type=int, default=4)
+    parser.add_argument("--tasa", type=float, default=None, help="llegadas por segundo (modo abierto)")
+    parser.add_argument("--llegadas", choices=("poisson", "constante"), default="poisson")
+    parser.add_argument("--duracion", type=float, default=0, help="segundos (reemplaza a --solicitudes)")
+    parser.add_argument("--solicitudes", type=int, default=200)
+    parser.add_argument("--calentamiento", type=int, default=10, help="solicitudes previas que no se miden")
+    parser.add_argument("--orden", choices=("aleatorio", "secuencial"), default="aleatorio")
+    parser.add_argument("--cabecera", action="append", default=[], metavar="'Nombre: valor'")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--salida", default="-")
+    args = parser.parse_args(argv[1:])
+
+    muestras = leer_directorio(args.payloads) if args.payloads else muestras_incluidas()
+    if args.sinteticos:
+        muestras.append(muestra_sintetica(args.sinteticos))
+    if not muestras:
+        raise SystemExit("No hay payloads que reproducir")
+    if args.exportar_muestras:
+        exportar(muestras, args.exportar_muestras)
+        return
+    if bool(args.url) == bool(args.lanzar):
+        raise SystemExit("Indica --url o --lanzar")
+
+    proc = None
+    url, pid = args.url, args.pid
+    if args.lanzar:
+        entorno = dict(os.environ, **dict(v.split("=", 1) for v in args.entorno))
+        proc, url = lanzar(args.lanzar, args.procesos, entorno)
+        pid = proc.pid
+    try:
+        datos = asyncio.run(correr(muestras, url, args, pid))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    datos["payloads"] = len(muestras)
+    texto = json.dumps(datos, indent=2)
+    if args.salida == "-":
+        print(texto)
+    else:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,164 @@
+import argparse
+import http.client
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.bench_servidor import RAIZ, esperar_puerto, percentil, puerto_libre
+from benchmarks.sinteticos import generar_payload
+
+# Ráfaga de solicitudes idénticas (mismo calendario y filtros, en pocos milisegundos) con y
+# sin coalescencia. Reporta tiempo de pared, latencias y CPU consumida del lado servidor:
+#   servidor   hilos de servidor.py (CITAS_COALESCER=0 contra 1), CPU leída de /proc
+#   procesos   un main.py por solicitud, como index.php (sin y con CITAS_COALESCER_DIR),
+#              CPU de los hijos por getrusage
+# La cache de resultados se desactiva para que sólo cuente la coalescencia.
+
+
+def cpu_proceso(pid):
+    """utime + stime (segundos) de un proceso, desde /proc (Linux)."""
+    with open(f"/proc/{pid}/stat", "r") as f:
+        campos = f.read().rsplit(")", 1)[1].split()
+    return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def cpu_hijos():
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+def rafaga(fn, solicitudes):
+    """Lanza `solicitudes` llamadas a la vez (barrera) y retorna (latencias, pared_s)."""
+    barrera = threading.Barrier(solicitudes)
+    latencias = [0.0] * solicitudes
+    errores = []
+
+    def una(i):
+        barrera.wait()
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            errores.append(str(e))
+        latencias[i] = time.perf_counter() - t0
+
+    hilos = [threading.Thread(target=una, args=(i,)) for i in range(solicitudes)]
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    if errores:
+        raise RuntimeError(errores[0])
+    return latencias, time.perf_counter() - t0
+
+
+def fila(camino, coalescer, latencias, pared, cpu, extra=None):
+    datos = {
+        "camino": camino,
+        "coalescer": coalescer,
+        "solicitudes": len(latencias),
+        "pared_ms": round(pared * 1000, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 1),
+        "cpu_ms": round(cpu * 1000, 1),
+        "cpu_por_solicitud_ms": round(cpu * 1000 / len(latencias), 2),
+    }
+    datos.update(extra or {})
+    return datos
+
+
+def medir_servidor(cuerpo, solicitudes, coalescer, entorno):
+    puerto = puerto_libre()
+    entorno = dict(entorno, CITAS_COALESCER="1" if coalescer else "0")
+    servidor = subprocess.Popen([sys.executable, "servidor.py", "--host", "127.0.0.1", "--puerto", str(puerto)],
+                                cwd=RAIZ, env=entorno, stderr=subprocess.DEVNULL)
+    try:
+        esperar_puerto(puerto)
+
+        def post():
+            con = http.client.HTTPConnection("127.0.0.1", puerto, timeout=120)
+            try:
+                con.request("POST", "/", body=cuerpo, headers={"Content-Type": "application/json"})
+                resp = con.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    raise RuntimeError(f"HTTP {resp.status}")
+            finally:
+                con.close()
+
+        post()  # calentamiento: módulos y tabla de días hábiles
+        cpu0 = cpu_proceso(servidor.pid)
+        latencias, pared = rafaga(post, solicitudes)
+        cpu = cpu_proceso(servidor.pid) - cpu0
+        con = http.client.HTTPConnection("127.0.0.1", puerto, timeout=10)
+        con.request("GET", "/estadisticas")
+        estadisticas = json.loads(con.getresponse().read()).get("coalescencia")
+        con.close()
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    extra = {"coalescidas": estadisticas["coalescidas"] if estadisticas else 0}
+    return fila("servidor", coalescer, latencias, pared, cpu, extra)
+
+
+def medir_procesos(cuerpo, solicitudes, coalescer, entorno):
+    directorio = tempfile.mkdtemp(prefix="citas_coalescer_") if coalescer else None
+    entorno = dict(entorno)
+    if directorio:
+        entorno["CITAS_COALESCER_DIR"] = directorio
+
+    def ejecutar():
+        proc = subprocess.Popen([sys.executable, "main.py", "--stdin", "--formato", "compacto"], cwd=RAIZ,
+                                env=entorno, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        proc.communicate(cuerpo)
+        if proc.returncode != 0:
+            raise RuntimeError(f"main.py salió con {proc.returncode}")
+
+    try:
+        # Incluye el arranque de cada intérprete, que la coalescencia no evita
+        cpu0 = cpu_hijos()
+        latencias, pared = rafaga(ejecutar, solicitudes)
+        cpu = cpu_hijos() - cpu0
+    finally:
+        if directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+    return fila("procesos", coalescer, latencias, pared, cpu)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="CPU ahorrada por la coalescencia ante una ráfaga idéntica")
+    parser.add_argument("--solicitudes", type=int, default=32, help="solicitudes simultáneas en la ráfaga")
+    parser.add_argument("--eventos", type=int, default=5000)
+    parser.add_argument("--minutos", type=int, default=20)
+    parser.add_argument("--cantidad-dias", type=int, default=30)
+    parser.add_argument("--caminos", default="servidor,procesos")
+    parser.add_argument("--hoy", default="2025-09-01")
+    args = parser.parse_args(argv[1:])
+
+    entorno = dict(os.environ, CITAS_HOY=args.hoy, CITAS_CACHE="0")
+    entorno.pop("CITAS_COALESCER_DIR", None)
+    desde = date.fromisoformat(args.hoy) + timedelta(days=1)
+    payload = generar_payload(args.eventos, args.minutos, args.cantidad_dias, desde=desde, dias=args.cantidad_dias)
+    cuerpo = json.dumps(payload).encode("utf-8")
+
+    medidores = {"servidor": medir_servidor, "procesos": medir_procesos}
+    filas = []
+    for camino in args.caminos.split(","):
+        base = medidores[camino](cuerpo, args.solicitudes, False, entorno)
+        coal = medidores[camino](cuerpo, args.solicitudes, True, entorno)
+        if base["cpu_ms"]:
+            coal["cpu_ahorrada"] = round(1 - coal["cpu_ms"] / base["cpu_ms"], 3)
+        filas.extend((base, coal))
+    print(json.dumps(filas, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Regresión de tamaño de payload: argumento de línea de comandos (camino anterior de
+# index.php) contra stdin (proc_open). Con calendarios de varios MB el camino por argv
+# falla con E2BIG; por stdin sólo lo limita la memoria.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTORNO = dict(os.environ, CITAS_HOY="2025-09-01")
+
+
+def esperar(proc):
+    _, estado, uso = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(estado)
+    return proc.returncode, uso.ru_maxrss
+
+
+def via_argv(ruta):
+    with open(ruta, "r", encoding="utf-8") as f:
+        cuerpo = f.read()
+    try:
+        proc = subprocess.Popen([sys.executable, "main.py", cuerpo], cwd=RAIZ, env=ENTORNO, stdout=subprocess.DEVNULL)
+    except OSError as e:
+        return {"ok": False, "error": e.strerror}
+    codigo, rss = esperar(proc)
+    return {"ok": codigo == 0, "rss_mb": round(rss / 1024, 1)}
+
+
+def via_stdin(ruta):
+    with open(ruta, "rb") as entrada:
+        proc = subprocess.Popen([sys.executable, "main.py", "--stdin"], cwd=RAIZ,
+                                stdin=entrada, env=ENTORNO, stdout=subprocess.DEVNULL)
+        codigo, rss = esperar(proc)
+    return {"ok": codigo == 0, "rss_mb": round(rss / 1024, 1)}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Payload por argv vs stdin con calendarios grandes")
+    parser.add_argument("--eventos", default="30,300,1500,6000",
+                        help="eventos por calendario (~3 KB c/u con relleno Bitrix)")
+    parser.add_argument("--relleno", type=int, default=2500)
+    args = parser.parse_args(argv[1:])
+
+    filas = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in (int(x) for x in args.eventos.split(",")):
+            ruta = os.path.join(tmp, f"payload_{n}.json")
+            # Se genera en otro proceso para que el fork no herede un payload grande en memoria
+            subprocess.run([sys.executable, "-m", "benchmarks.sinteticos", "--eventos", str(n),
+                            "--relleno", str(args.relleno), "--desde", "2025-09-02", "--salida", ruta],
+                           cwd=RAIZ, check=True)
+            fila = {"eventos": n, "cuerpo_mb": round(os.path.getsize(ruta) / 1e6, 2)}
+            # stdin primero: via_argv carga el cuerpo en este proceso y el fork heredaría esa memoria
+            for nombre, fn in (("stdin", via_stdin), ("argv", via_argv)):
+                t0 = time.perf_counter()
+                r = fn(ruta)
+                r["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+                fila[nombre] = r
+            filas.append(fila)
+    print(json.dumps(filas, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
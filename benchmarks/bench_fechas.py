@@ -0,0 +1,82 @@
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime
+
+from benchmarks.sinteticos import generar_eventos
+from main import FORMATO_BITRIX, parsear_intervalo
+
+# Parseo de intervalos Bitrix: strptime (camino original) contra el parser de formato fijo
+# y contra los epoch DATE_*_TS_UTC + TZ_OFFSET_* (CITAS_USAR_TS_UTC / "usar_ts_utc").
+
+
+def con_epoch(eventos):
+    # Mismo instante expresado en epoch UTC con desfase de Bogotá (-5 h)
+    offset = -5 * 3600
+    for ev in eventos:
+        for campo, campo_ts in (("DATE_FROM", "DATE_FROM_TS_UTC"), ("DATE_TO", "DATE_TO_TS_UTC")):
+            local = datetime.strptime(ev[campo], FORMATO_BITRIX)
+            ev[campo_ts] = str(int((local - datetime(1970, 1, 1)).total_seconds()) - offset)
+        ev["TZ_OFFSET_FROM"] = ev["TZ_OFFSET_TO"] = str(offset)
+    return eventos
+
+
+def por_strptime(eventos):
+    resultado = []
+    for ev in eventos:
+        try:
+            ci = datetime.strptime(ev["DATE_FROM"], FORMATO_BITRIX)
+            cf = datetime.strptime(ev["DATE_TO"], FORMATO_BITRIX)
+        except Exception:
+            continue
+        if cf > ci:
+            resultado.append((ci, cf))
+    return resultado
+
+
+def por_parser(eventos, usar_ts):
+    resultado = []
+    for ev in eventos:
+        intervalo = parsear_intervalo(ev, usar_ts)
+        if intervalo is not None:
+            resultado.append(intervalo)
+    return resultado
+
+
+def mejor_de(fn, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        r = fn()
+        dt = time.perf_counter() - t0
+        mejor = dt if mejor is None or dt < mejor else mejor
+    return r, mejor
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="strptime vs parser de formato fijo vs epoch")
+    parser.add_argument("--eventos", default="10000,100000")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args(argv[1:])
+
+    filas = []
+    for n in (int(x) for x in args.eventos.split(",")):
+        eventos = con_epoch(generar_eventos(n, desde=date(2025, 9, 1), dias=60))
+        base, t_strptime = mejor_de(lambda: por_strptime(eventos), args.repeticiones)
+        rapido, t_rapido = mejor_de(lambda: por_parser(eventos, False), args.repeticiones)
+        epoch, t_epoch = mejor_de(lambda: por_parser(eventos, True), args.repeticiones)
+        assert rapido == base and epoch == base, "los caminos no producen los mismos intervalos"
+        filas.append({
+            "eventos": n,
+            "strptime_ms": round(t_strptime * 1000, 1),
+            "formato_fijo_ms": round(t_rapido * 1000, 1),
+            "epoch_ms": round(t_epoch * 1000, 1),
+            "aceleracion_formato_fijo": round(t_strptime / t_rapido, 2),
+            "aceleracion_epoch": round(t_strptime / t_epoch, 2),
+        })
+    print(json.dumps(filas, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,49 @@
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+from benchmarks.sinteticos import generar_payload
+from main import decodificar_cuerpo, decodificar_flujo
+
+# Memoria pico y tiempo de decodificación: json.loads del cuerpo completo contra la
+# lectura incremental (lector_flujo) que sólo conserva DATE_FROM/DATE_TO y estado.
+
+
+def medir(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    payload = fn()
+    dt = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return payload, dt, pico
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Decodificación completa vs incremental")
+    parser.add_argument("--eventos", default="100,1000,5000")
+    parser.add_argument("--relleno", type=int, default=2500, help="bytes de DESCRIPTION por evento")
+    args = parser.parse_args(argv[1:])
+
+    filas = []
+    for n in (int(x) for x in args.eventos.split(",")):
+        cuerpo = json.dumps(generar_payload(n, relleno=args.relleno)).encode("utf-8")
+        # Sólo se mide la decodificación; el cuerpo ya está en memoria en ambos casos
+        _, t_completo, pico_completo = medir(lambda: decodificar_cuerpo(cuerpo))
+        _, t_flujo, pico_flujo = medir(lambda: decodificar_flujo(io.BytesIO(cuerpo), limite=len(cuerpo)))
+        filas.append({
+            "eventos": n,
+            "cuerpo_mb": round(len(cuerpo) / 1e6, 2),
+            "completo_ms": round(t_completo * 1000, 1),
+            "completo_pico_mb": round(pico_completo / 1e6, 2),
+            "flujo_ms": round(t_flujo * 1000, 1),
+            "flujo_pico_mb": round(pico_flujo / 1e6, 2),
+        })
+    print(json.dumps(filas, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,56 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+from benchmarks.sinteticos import generar_payload
+from formatos_salida import FORMATOS, fragmentos
+from main import calcular_disponibilidad
+
+# Tamaño de respuesta, CPU de serialización y memoria pico por formato de salida
+# (json indentado, compacto, rangos fusionados, ndjson) para ventanas largas con slots cortos.
+
+
+def medir(payload, formato, hoy):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    resultado = calcular_disponibilidad(payload, hoy=hoy, perezoso=formato == "ndjson")
+    t1 = time.perf_counter()
+    total = 0
+    for trozo in fragmentos(resultado, formato, payload):
+        total += len(trozo.encode("utf-8"))
+    t2 = time.perf_counter()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return total, t1 - t0, t2 - t1, pico
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Comparación de formatos de salida")
+    parser.add_argument("--eventos", type=int, default=500)
+    parser.add_argument("--minutos", type=int, default=10)
+    parser.add_argument("--cantidad-dias", type=int, default=60)
+    args = parser.parse_args(argv[1:])
+
+    hoy = date(2025, 9, 2)
+    payload = generar_payload(args.eventos, minutos=args.minutos, cantidad_dias=args.cantidad_dias,
+                              desde=hoy, dias=args.cantidad_dias + 20)
+    payload["motor"] = "intervalos"
+    filas = []
+    for formato in FORMATOS:
+        calcular_disponibilidad(payload, hoy=hoy)  # calentar tabla y módulos
+        tam, t_calculo, t_serial, pico = medir(payload, formato, hoy)
+        filas.append({
+            "formato": formato,
+            "bytes": tam,
+            "calculo_ms": round(t_calculo * 1000, 1),
+            "serializacion_ms": round(t_serial * 1000, 1),
+            "pico_mb": round(pico / 1e6, 2),
+        })
+    print(json.dumps(filas, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
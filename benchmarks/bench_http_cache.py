@@ -0,0 +1,96 @@
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks.bench_servidor import RAIZ, esperar_puerto, percentil, puerto_libre
+from benchmarks.sinteticos import generar_payload
+
+# Consultas repetidas del mismo calendario (el chatbot que pregunta una y otra vez) contra
+# servidor.py, con tres clientes:
+#   plano        sin Accept-Encoding ni validadores
+#   gzip         Accept-Encoding: gzip
+#   etag+gzip    además reenvía el ETag recibido en If-None-Match (304 sin recalcular)
+# Reporta bytes en el cable por respuesta (línea de estado + cabeceras + cuerpo) y latencia.
+# Con --sin-cache se desactiva la cache de resultados para ver el cálculo que evita el 304.
+
+CLIENTES = ("plano", "gzip", "etag+gzip")
+
+
+def bytes_respuesta(resp, cuerpo):
+    cabeceras = sum(len(k) + len(v) + 4 for k, v in resp.getheaders())
+    return len(f"HTTP/1.1 {resp.status} {resp.reason}\r\n") + cabeceras + 2 + len(cuerpo)
+
+
+def sondear(puerto, cuerpo, cliente, consultas):
+    con = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+    latencias = []
+    bytes_total = 0
+    estados = {}
+    etag = None
+    try:
+        for _ in range(consultas):
+            cabeceras = {"Content-Type": "application/json"}
+            if cliente != "plano":
+                cabeceras["Accept-Encoding"] = "gzip"
+            if cliente == "etag+gzip" and etag is not None:
+                cabeceras["If-None-Match"] = etag
+            t0 = time.perf_counter()
+            con.request("POST", "/", body=cuerpo, headers=cabeceras)
+            resp = con.getresponse()
+            datos = resp.read()
+            latencias.append(time.perf_counter() - t0)
+            etag = resp.getheader("ETag") or etag
+            estados[resp.status] = estados.get(resp.status, 0) + 1
+            bytes_total += bytes_respuesta(resp, datos)
+    finally:
+        con.close()
+    return {
+        "cliente": cliente,
+        "consultas": consultas,
+        "estados": {str(k): v for k, v in sorted(estados.items())},
+        "bytes_por_respuesta": round(bytes_total / consultas),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 3),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Bytes y latencia de consultas repetidas con ETag/gzip")
+    parser.add_argument("--eventos", type=int, default=500)
+    parser.add_argument("--minutos", type=int, default=20)
+    parser.add_argument("--cantidad-dias", type=int, default=30)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--sin-cache", action="store_true", help="CITAS_CACHE=0 en el servidor")
+    parser.add_argument("--hoy", default="2025-09-01")
+    args = parser.parse_args(argv[1:])
+
+    entorno = dict(os.environ, CITAS_HOY=args.hoy)
+    if args.sin_cache:
+        entorno["CITAS_CACHE"] = "0"
+    desde = date.fromisoformat(args.hoy) + timedelta(days=1)
+    payload = generar_payload(args.eventos, args.minutos, args.cantidad_dias, desde=desde, dias=args.cantidad_dias)
+    cuerpo = json.dumps(payload).encode("utf-8")
+
+    puerto = puerto_libre()
+    servidor = subprocess.Popen([sys.executable, "servidor.py", "--host", "127.0.0.1", "--puerto", str(puerto)],
+                                cwd=RAIZ, env=entorno, stderr=subprocess.DEVNULL)
+    try:
+        esperar_puerto(puerto)
+        filas = [sondear(puerto, cuerpo, cliente, args.consultas) for cliente in CLIENTES]
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    base = filas[0]
+    for fila in filas[1:]:
+        fila["bytes_vs_plano"] = round(fila["bytes_por_respuesta"] / base["bytes_por_respuesta"], 4)
+        fila["p50_vs_plano"] = round(fila["p50_ms"] / base["p50_ms"], 3) if base["p50_ms"] else None
+    print(json.dumps({"cuerpo_solicitud_bytes": len(cuerpo), "filas": filas}, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
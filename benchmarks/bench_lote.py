@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import date
+
+from benchmarks.sinteticos import generar_calendar
+from main import calcular_disponibilidad
+
+# Lote de agentes en una llamada (lote.calcular_lote, con procesos si el lote es grande)
+# contra una llamada por agente en el mismo proceso. Como referencia se estima también el
+# costo del despachador actual (un `python3 main.py` por agente) a partir de un arranque medido.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def medir_arranque(payload):
+    cuerpo = json.dumps(payload)
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--stdin"], cwd=RAIZ, input=cuerpo.encode("utf-8"),
+                   stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - t0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Disponibilidad por lote vs una llamada por agente")
+    parser.add_argument("--agentes", default="1,10,100,1000")
+    parser.add_argument("--eventos", type=int, default=80, help="eventos por agente")
+    parser.add_argument("--cantidad-dias", type=int, default=20)
+    parser.add_argument("--minutos", type=int, default=10)
+    parser.add_argument("--procesos", type=int, default=None)
+    args = parser.parse_args(argv[1:])
+    # Sin cache de resultados: el lote repite los mismos calendarios que la pasada individual
+    os.environ["CITAS_CACHE"] = "0"
+
+    hoy = date(2025, 9, 1)
+    arranque = medir_arranque({"calendar": generar_calendar(args.eventos, desde=hoy), "minutos": args.minutos,
+                               "Cantidad_dias": args.cantidad_dias})
+    filas = []
+    for n in (int(x) for x in args.agentes.split(",")):
+        lote = {
+            "agentes": [{"id": f"agente-{i}", "calendar": generar_calendar(args.eventos, desde=hoy, semilla=i)}
+                        for i in range(n)],
+            "minutos": args.minutos,
+            "Cantidad_dias": args.cantidad_dias,
+        }
+        if args.procesos:
+            lote["procesos"] = args.procesos
+
+        t0 = time.perf_counter()
+        individual = {}
+        for agente in lote["agentes"]:
+            p = {"calendar": agente["calendar"], "minutos": args.minutos, "Cantidad_dias": args.cantidad_dias}
+            individual[agente["id"]] = calcular_disponibilidad(p, hoy=hoy)
+        t_individual = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        por_lote = calcular_disponibilidad(lote, hoy=hoy)
+        t_lote = time.perf_counter() - t0
+
+        if por_lote != individual:
+            raise AssertionError(f"Resultados distintos con {n} agentes")
+        filas.append({
+            "agentes": n,
+            "exec_estimado_ms": round(arranque * n * 1000, 1),
+            "individual_ms": round(t_individual * 1000, 1),
+            "lote_ms": round(t_lote * 1000, 1),
+            "aceleracion": round(t_individual / t_lote, 2) if t_lote else None,
+        })
+    print(json.dumps(filas, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,103 @@
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.sinteticos import generar_eventos, FORMATO_BITRIX
+from main import generar_slots_desde_bloques, indexar_ocupacion
+from plantilla_horario import compilar_plantilla, minuto_de
+
+# Plantilla con dos franjas por día, descanso y margen contra la aproximación previa: una
+# llamada por franja con horario desde/hasta, citas extendidas por el margen del lado del
+# cliente y descarte de los slots que pasan del fin de la franja o pisan el descanso.
+
+PLANTILLA = {
+    "horario": {"todos": ["07:30-12:30", "14:00-18:00"], "sabado": "08:00-12:00"},
+    "descansos": ["10:00-10:20"],
+    "margen": {"antes": 10, "despues": 5},
+}
+
+
+def _hora(texto):
+    m = minuto_de(texto)
+    return datetime.min.replace(hour=m // 60, minute=m % 60).time()
+
+
+def aproximacion(dias, citas, minutos):
+    # Franjas del día sin el descanso, en "HH:MM" como las enviaría el cliente
+    antes, despues = timedelta(minutes=10), timedelta(minutes=5)
+    extendidas = [(ci - antes, cf + despues) for ci, cf in citas]
+    ocupacion = indexar_ocupacion(extendidas, dias)
+    resultado = []
+    for d in dias:
+        franjas = (("08:00", "10:00"), ("10:20", "12:00")) if d.weekday() == 5 else \
+            (("07:30", "10:00"), ("10:20", "12:30"), ("14:00", "18:00"))
+        slots = []
+        for desde, hasta in franjas:
+            for s in generar_slots_desde_bloques(d, _hora(desde), _hora(hasta), minutos, ocupacion.get(d, [])):
+                if s["hora_fin"] <= hasta and s["hora_fin"] > s["hora_inicio"]:
+                    slots.append(s)
+        resultado.append(slots)
+    return resultado
+
+
+def con_plantilla(dias, citas, minutos):
+    plantilla = compilar_plantilla(PLANTILLA, minutos)
+    ocupacion = indexar_ocupacion(plantilla.con_margen(citas), dias)
+    return [plantilla.generar_slots(d, None, None, minutos, ocupacion.get(d, [])) for d in dias]
+
+
+def mejor_de(fn, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def medir(n_eventos, dias, minutos, repeticiones):
+    desde = date(2025, 9, 1)
+    citas = [(datetime.strptime(e["DATE_FROM"], FORMATO_BITRIX), datetime.strptime(e["DATE_TO"], FORMATO_BITRIX))
+             for e in generar_eventos(n_eventos, desde=desde, dias=dias)]
+    dias_validos = [desde + timedelta(days=i) for i in range(dias) if (desde + timedelta(days=i)).weekday() != 6]
+    if aproximacion(dias_validos, citas, minutos) != con_plantilla(dias_validos, citas, minutos):
+        raise AssertionError(f"Salida distinta con {n_eventos} eventos")
+    t_aprox = mejor_de(lambda: aproximacion(dias_validos, citas, minutos), repeticiones)
+    t_plantilla = mejor_de(lambda: con_plantilla(dias_validos, citas, minutos), repeticiones)
+    return {
+        "eventos": n_eventos,
+        "aproximacion_ms": round(t_aprox * 1000, 3),
+        "plantilla_ms": round(t_plantilla * 1000, 3),
+        "aceleracion": round(t_aprox / t_plantilla, 2) if t_plantilla else None,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Plantilla compilada contra una llamada por franja")
+    parser.add_argument("--eventos", default="0,100,1000,5000")
+    parser.add_argument("--dias", type=int, default=60)
+    parser.add_argument("--minutos", type=int, default=10)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args(argv[1:])
+
+    t0 = time.perf_counter()
+    compilar_plantilla(PLANTILLA, args.minutos)
+    compilacion = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    compilar_plantilla(PLANTILLA, args.minutos)
+    reutilizada = time.perf_counter() - t0
+
+    curva = [medir(int(n), args.dias, args.minutos, args.repeticiones) for n in args.eventos.split(",")]
+    print(json.dumps({
+        "dias": args.dias,
+        "minutos": args.minutos,
+        "compilacion_us": round(compilacion * 1e6, 1),
+        "reutilizada_us": round(reutilizada * 1e6, 1),
+        "curva": curva,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,119 @@
+import argparse
+import http.client
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.sinteticos import generar_payload
+
+# Compara el camino exec (un `python3 main.py <payload>` por solicitud, como hace index.php)
+# contra el servidor persistente (servidor.py). Reporta throughput y latencias p50/p99.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    orden = sorted(valores)
+    k = min(len(orden) - 1, max(0, int(round(p / 100.0 * (len(orden) - 1)))))
+    return orden[k]
+
+
+def resumen(nombre, latencias, total_s):
+    return {
+        "camino": nombre,
+        "solicitudes": len(latencias),
+        "throughput_rps": round(len(latencias) / total_s, 2) if total_s > 0 else 0.0,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+    }
+
+
+def correr(fn, solicitudes, concurrencia):
+    latencias = []
+
+    def una(_):
+        t0 = time.perf_counter()
+        fn()
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ex:
+        latencias.extend(ex.map(una, range(solicitudes)))
+    return latencias, time.perf_counter() - t0
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar_puerto(puerto, limite_s=15.0):
+    fin = time.time() + limite_s
+    while time.time() < fin:
+        try:
+            with socket.create_connection(("127.0.0.1", puerto), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"El servidor no abrió el puerto {puerto}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Compara exec vs servidor persistente")
+    parser.add_argument("--solicitudes", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=4)
+    parser.add_argument("--eventos", type=int, default=50)
+    parser.add_argument("--procesos", type=int, default=1, help="procesos del servidor persistente")
+    parser.add_argument("--hoy", default="2025-09-01", help="fecha fija (CITAS_HOY) para repetir la misma carga")
+    args = parser.parse_args(argv[1:])
+    entorno = dict(os.environ, CITAS_HOY=args.hoy)
+    desde = date.fromisoformat(args.hoy) + timedelta(days=1)
+
+    # Un calendario distinto por solicitud para no medir aciertos de la cache de resultados
+    cuerpos = [json.dumps(generar_payload(args.eventos, desde=desde, semilla=i)).encode("utf-8") for i in range(args.solicitudes + 1)]
+    siguiente = itertools.count()
+
+    def via_exec():
+        cuerpo = cuerpos[next(siguiente) % len(cuerpos)]
+        subprocess.run([sys.executable, "main.py", "--stdin"], cwd=RAIZ, input=cuerpo, env=entorno,
+                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True)
+
+    puerto = puerto_libre()
+    proc = subprocess.Popen([sys.executable, "servidor.py", "--host", "127.0.0.1", "--puerto", str(puerto),
+                             "--procesos", str(args.procesos)], cwd=RAIZ, env=entorno, stderr=subprocess.DEVNULL)
+    try:
+        esperar_puerto(puerto)
+
+        def via_servidor():
+            cuerpo = cuerpos[next(siguiente) % len(cuerpos)]
+            con = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+            con.request("POST", "/", body=cuerpo, headers={"Content-Type": "application/json"})
+            resp = con.getresponse()
+            resp.read()
+            con.close()
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}")
+
+        via_servidor()  # calentamiento
+        resultados = [
+            resumen("exec", *correr(via_exec, args.solicitudes, args.concurrencia)),
+            resumen("servidor", *correr(via_servidor, args.solicitudes, args.concurrencia)),
+        ]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(json.dumps({"eventos": args.eventos, "concurrencia": args.concurrencia, "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
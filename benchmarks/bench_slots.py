@@ -0,0 +1,101 @@
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as hora
+
+from benchmarks.sinteticos import generar_eventos, FORMATO_BITRIX
+from main import generar_slots_desde_bloques, hay_interseccion, indexar_ocupacion
+from motor_bitmap import generar_slots_bitmap
+
+# Curva de escalamiento del motor de slots: barrido lineal original (slot x evento)
+# contra el índice de intervalos por día (indexar_ocupacion + generar_slots_desde_bloques)
+# y contra el motor de ocupación por minuto (motor_bitmap).
+
+
+def generar_slots_lineal(d, t_desde, t_hasta, slot_minutes, citas_parsed):
+    # Copia del algoritmo original de generar_slots_para_dia (referencia)
+    cap_sabado = hora(13, 0, 0)
+    t_hasta_real = t_hasta
+    if d.weekday() == 5 and (t_hasta > cap_sabado):
+        t_hasta_real = cap_sabado
+    inicio_dt = datetime.combine(d, t_desde)
+    fin_dt = datetime.combine(d, t_hasta_real)
+    if fin_dt <= inicio_dt:
+        return []
+    slots = []
+    cursor = inicio_dt
+    delta = timedelta(minutes=max(1, int(slot_minutes)))
+    while cursor < fin_dt:
+        fin_slot = cursor + delta
+        ocupado = False
+        for ci, cf in citas_parsed:
+            if not (ci.date() == d or cf.date() == d or (ci.date() < d < cf.date())):
+                continue
+            if hay_interseccion(cursor, fin_slot, ci, cf):
+                ocupado = True
+                break
+        if not ocupado:
+            slots.append({
+                "hora_inicio": cursor.strftime("%H:%M"),
+                "hora_fin": fin_slot.strftime("%H:%M"),
+            })
+        cursor = fin_slot
+    return slots
+
+
+def medir(n_eventos, dias, minutos, repeticiones):
+    desde = date(2025, 9, 1)
+    citas = [(datetime.strptime(e["DATE_FROM"], FORMATO_BITRIX), datetime.strptime(e["DATE_TO"], FORMATO_BITRIX))
+             for e in generar_eventos(n_eventos, desde=desde, dias=dias)]
+    dias_validos = [desde + timedelta(days=i) for i in range(dias) if (desde + timedelta(days=i)).weekday() != 6]
+    t_desde = hora(8, 0, 0)
+    t_hasta = hora(17, 0, 0)
+
+    def lineal():
+        return [generar_slots_lineal(d, t_desde, t_hasta, minutos, citas) for d in dias_validos]
+
+    def indexado():
+        ocupacion = indexar_ocupacion(citas, dias_validos)
+        return [generar_slots_desde_bloques(d, t_desde, t_hasta, minutos, ocupacion.get(d, [])) for d in dias_validos]
+
+    def bitmap():
+        ocupacion = indexar_ocupacion(citas, dias_validos)
+        return [generar_slots_bitmap(d, t_desde, t_hasta, minutos, ocupacion.get(d, [])) for d in dias_validos]
+
+    referencia = json.dumps(lineal())
+    if json.dumps(indexado()) != referencia or json.dumps(bitmap()) != referencia:
+        raise AssertionError(f"Salida distinta con {n_eventos} eventos")
+
+    tiempos = {}
+    for nombre, fn in (("lineal", lineal), ("indexado", indexado), ("bitmap", bitmap)):
+        mejor = float("inf")
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            fn()
+            mejor = min(mejor, time.perf_counter() - t0)
+        tiempos[nombre] = mejor
+    return {
+        "eventos": n_eventos,
+        "lineal_ms": round(tiempos["lineal"] * 1000, 3),
+        "indexado_ms": round(tiempos["indexado"] * 1000, 3),
+        "bitmap_ms": round(tiempos["bitmap"] * 1000, 3),
+        "aceleracion": round(tiempos["lineal"] / tiempos["indexado"], 1) if tiempos["indexado"] else None,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Curva de escalamiento del motor de slots")
+    parser.add_argument("--eventos", default="10,50,100,250,500,1000,2000")
+    parser.add_argument("--dias", type=int, default=60)
+    parser.add_argument("--minutos", type=int, default=5)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args(argv[1:])
+
+    curva = [medir(int(n), args.dias, args.minutos, args.repeticiones) for n in args.eventos.split(",")]
+    print(json.dumps({"dias": args.dias, "minutos": args.minutos, "curva": curva}, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
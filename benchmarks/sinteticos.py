@@ -0,0 +1,123 @@
+import argparse
+import json
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+# Generadores de payloads sintéticos con el shape de Bitrix (calendar[].body.result).
+
+FORMATO_BITRIX = "%d/%m/%Y %H:%M:%S"
+
+
+def relleno_bitrix(i, inicio, fin, relleno):
+    # Campos que Bitrix envía en cada evento y que el motor no usa (ver ejemplo.py)
+    return {
+        "PARENT_ID": str(1000000 + i),
+        "ACTIVE": "Y",
+        "DELETED": "N",
+        "CAL_TYPE": "user",
+        "OWNER_ID": "17890",
+        "NAME": f"Cita sintética {i}",
+        "TZ_FROM": "America/Bogota",
+        "TZ_TO": "America/Bogota",
+        "TZ_OFFSET_FROM": "-18000",
+        "TZ_OFFSET_TO": "-18000",
+        "DT_LENGTH": int((fin - inicio).total_seconds()),
+        "DESCRIPTION": "x" * relleno,
+        "ACCESSIBILITY": "busy",
+        "IMPORTANCE": "normal",
+        "IS_MEETING": False,
+        "MEETING_STATUS": "H",
+        "MEETING_HOST": "17890",
+        "MEETING": {"NOTIFY": False, "MEETING_CREATOR": 17890, "HOST_NAME": "Agente", "LANGUAGE_ID": "la"},
+        "REMIND": [],
+        "RRULE": "",
+        "EXDATE": "",
+        "VERSION": "1",
+        "ATTENDEES_CODES": ["U17890"],
+        "RECURRENCE_ID": "null",
+        "ATTENDEE_LIST": [{"id": 17890, "entryId": str(1000000 + i), "status": "H"}],
+        "attendeesEntityList": [{"entityId": "user", "id": 17890}],
+    }
+
+
+# Duraciones (minutos) de los eventos de un día normal
+DURACIONES = (10, 15, 20, 30, 45, 60)
+
+
+def generar_eventos(n, desde=None, dias=30, semilla=1, relleno=None, densidad=None,
+                    duraciones=DURACIONES, multidia=0.0, max_dias_evento=3):
+    """Genera eventos {DATE_FROM, DATE_TO} repartidos en horario laboral.
+    - `densidad`: eventos por día; si se indica, reemplaza a `n` (n = densidad * dias).
+    - `duraciones`: minutos posibles de cada evento.
+    - `multidia`: fracción de eventos que abarcan de 1 a `max_dias_evento` días completos
+      (vacaciones, viajes), cruzando la medianoche.
+    Con `relleno` (bytes de DESCRIPTION) se agregan los campos típicos de Bitrix.
+    """
+    rnd = random.Random(semilla)
+    desde = desde or (date.today() + timedelta(days=1))
+    if densidad is not None:
+        n = int(round(densidad * dias))
+    eventos = []
+    for i in range(n):
+        d = desde + timedelta(days=rnd.randrange(dias))
+        inicio = datetime.combine(d, datetime.min.time()) + timedelta(minutes=rnd.randrange(8 * 60, 17 * 60, 5))
+        if multidia and rnd.random() < multidia:
+            fin = inicio + timedelta(days=rnd.randint(1, max_dias_evento), minutes=rnd.choice(duraciones))
+        else:
+            fin = inicio + timedelta(minutes=rnd.choice(duraciones))
+        ev = {
+            "ID": str(1000000 + i),
+            "DATE_FROM": inicio.strftime(FORMATO_BITRIX),
+            "DATE_TO": fin.strftime(FORMATO_BITRIX),
+        }
+        if relleno is not None:
+            ev.update(relleno_bitrix(i, inicio, fin, relleno))
+        eventos.append(ev)
+    return eventos
+
+
+def generar_calendar(n, desde=None, dias=30, semilla=1, relleno=None, **opciones):
+    return [{"body": {"result": generar_eventos(n, desde, dias, semilla, relleno, **opciones)}, "statusCode": 200}]
+
+
+def generar_payload(n, minutos=20, cantidad_dias=7, desde=None, dias=30, semilla=1, relleno=None, **opciones):
+    """Payload completo; `opciones` (densidad, duraciones, multidia, max_dias_evento) van a generar_eventos."""
+    return {
+        "calendar": generar_calendar(n, desde, dias, semilla, relleno, **opciones),
+        "minutos": minutos,
+        "Cantidad_dias": cantidad_dias,
+    }
+
+
+def lista_enteros(texto):
+    return tuple(int(x) for x in texto.split(",") if x.strip())
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Genera un payload sintético estilo Bitrix")
+    parser.add_argument("--eventos", type=int, default=100)
+    parser.add_argument("--relleno", type=int, default=None, help="bytes de DESCRIPTION por evento")
+    parser.add_argument("--minutos", type=int, default=20)
+    parser.add_argument("--cantidad-dias", type=int, default=7)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--desde", type=date.fromisoformat, default=None, help="primer día (YYYY-MM-DD)")
+    parser.add_argument("--dias", type=int, default=30, help="días sobre los que se reparten los eventos")
+    parser.add_argument("--densidad", type=float, default=None, help="eventos por día (reemplaza --eventos)")
+    parser.add_argument("--duraciones", type=lista_enteros, default=DURACIONES, help="minutos, p. ej. 15,30,60")
+    parser.add_argument("--multidia", type=float, default=0.0, help="fracción de eventos de varios días")
+    parser.add_argument("--salida", default="-")
+    args = parser.parse_args(argv[1:])
+
+    payload = generar_payload(args.eventos, args.minutos, args.cantidad_dias, desde=args.desde, dias=args.dias,
+                              semilla=args.semilla, relleno=args.relleno, densidad=args.densidad,
+                              duraciones=args.duraciones, multidia=args.multidia)
+    if args.salida == "-":
+        json.dump(payload, sys.stdout)
+    else:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,185 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.bench_servidor import RAIZ, esperar_puerto, percentil, puerto_libre
+from benchmarks.sinteticos import DURACIONES, generar_payload, lista_enteros
+
+# Suite de benchmarks por etapa. Para cada tamaño de calendario sintético mide por separado:
+#   decodificacion   json.loads del cuerpo
+#   extraccion       parsear_resultado / parsear_citas / extraer_citas_de_calendar
+#   fechas           DATE_FROM/DATE_TO -> datetime (parsear_intervalo)
+#   dias             selección de días válidos (seleccionar_dias)
+#   slots            generación de slots (disponibilidad_para_dias)
+#   serializacion    json.dumps de la respuesta (formato por defecto)
+#   http             POST / de extremo a extremo contra servidor.py
+# y escribe un JSON con los tiempos (mejor de N, en ms) para comparar entre versiones:
+#   python -m benchmarks.suite --salida antes.json
+#   python -m benchmarks.suite --salida despues.json --comparar antes.json
+
+
+def mejor_de(fn, repeticiones):
+    mejor = None
+    resultado = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = fn()
+        dt = time.perf_counter() - t0
+        mejor = dt if mejor is None or dt < mejor else mejor
+    return resultado, mejor * 1000
+
+
+def medir_etapas(cuerpo, hoy, repeticiones):
+    from formatos_salida import fragmentos
+    from main import (
+        disponibilidad_para_dias,
+        extraer_citas_de_calendar,
+        leer_configuracion,
+        parsear_citas,
+        parsear_intervalo,
+        parsear_resultado,
+        seleccionar_dias,
+    )
+
+    payload, t_decod = mejor_de(lambda: json.loads(cuerpo), repeticiones)
+
+    def extraer():
+        fuentes = parsear_resultado(payload)
+        fuentes.extend(parsear_citas(payload.get("citas", {})))
+        fuentes.extend(extraer_citas_de_calendar(payload.get("calendar")))
+        return fuentes
+
+    fuentes, t_extr = mejor_de(extraer, repeticiones)
+    intervalos, t_fechas = mejor_de(
+        lambda: [iv for iv in (parsear_intervalo(c) for c in fuentes) if iv is not None], repeticiones)
+    config = leer_configuracion(payload)
+    dias, t_dias = mejor_de(lambda: seleccionar_dias(hoy, config), repeticiones)
+    resultado, t_slots = mejor_de(lambda: disponibilidad_para_dias(dias, config, intervalos), repeticiones)
+    texto, t_serial = mejor_de(lambda: "".join(fragmentos(resultado)), repeticiones)
+    return {
+        "decodificacion_ms": round(t_decod, 3),
+        "extraccion_ms": round(t_extr, 3),
+        "fechas_ms": round(t_fechas, 3),
+        "dias_ms": round(t_dias, 3),
+        "slots_ms": round(t_slots, 3),
+        "serializacion_ms": round(t_serial, 3),
+        "intervalos": len(intervalos),
+        "respuesta_bytes": len(texto.encode("utf-8")),
+    }
+
+
+def medir_http(puerto, cuerpo, solicitudes):
+    latencias = []
+    con = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+    try:
+        for _ in range(solicitudes):
+            t0 = time.perf_counter()
+            con.request("POST", "/", body=cuerpo, headers={"Content-Type": "application/json"})
+            resp = con.getresponse()
+            resp.read()
+            latencias.append(time.perf_counter() - t0)
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}")
+    finally:
+        con.close()
+    return {
+        "http_p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "http_p99_ms": round(percentil(latencias, 99) * 1000, 3),
+    }
+
+
+def version_git():
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True)
+        return salida.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def comparar(actual, anterior):
+    """Cociente actual/anterior por etapa y tamaño (> 1 es más lento)."""
+    previos = {f["eventos"]: f for f in anterior.get("filas", [])}
+    cambios = []
+    for fila in actual["filas"]:
+        previa = previos.get(fila["eventos"])
+        if previa is None:
+            continue
+        cambio = {"eventos": fila["eventos"]}
+        for k, v in fila.items():
+            if k.endswith("_ms") and previa.get(k):
+                cambio[k.replace("_ms", "_x")] = round(v / previa[k], 2)
+        cambios.append(cambio)
+    return cambios
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmarks por etapa y de extremo a extremo")
+    parser.add_argument("--eventos", type=lista_enteros, default=(100, 1000, 10000))
+    parser.add_argument("--dias", type=int, default=30, help="días sobre los que se reparten los eventos")
+    parser.add_argument("--duraciones", type=lista_enteros, default=DURACIONES)
+    parser.add_argument("--multidia", type=float, default=0.02)
+    parser.add_argument("--relleno", type=int, default=None, help="bytes de DESCRIPTION por evento")
+    parser.add_argument("--minutos", type=int, default=20)
+    parser.add_argument("--cantidad-dias", type=int, default=7)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--solicitudes-http", type=int, default=20)
+    parser.add_argument("--sin-http", action="store_true")
+    parser.add_argument("--hoy", default="2025-09-01")
+    parser.add_argument("--salida", default="resultados_bench.json")
+    parser.add_argument("--comparar", default=None, help="resultado anterior para calcular cocientes")
+    args = parser.parse_args(argv[1:])
+
+    # La cache de resultados convertiría las repeticiones en aciertos
+    os.environ["CITAS_CACHE"] = "0"
+    os.environ["CITAS_HOY"] = args.hoy
+    hoy = date.fromisoformat(args.hoy) + timedelta(days=1)
+
+    servidor = None
+    puerto = None
+    if not args.sin_http:
+        puerto = puerto_libre()
+        servidor = subprocess.Popen([sys.executable, "servidor.py", "--host", "127.0.0.1", "--puerto", str(puerto)],
+                                    cwd=RAIZ, env=dict(os.environ), stderr=subprocess.DEVNULL)
+    filas = []
+    try:
+        if servidor is not None:
+            esperar_puerto(puerto)
+        for n in args.eventos:
+            payload = generar_payload(n, args.minutos, args.cantidad_dias, desde=hoy, dias=args.dias,
+                                      relleno=args.relleno, duraciones=args.duraciones, multidia=args.multidia)
+            cuerpo = json.dumps(payload).encode("utf-8")
+            fila = {"eventos": n, "cuerpo_bytes": len(cuerpo)}
+            fila.update(medir_etapas(cuerpo, hoy, args.repeticiones))
+            if servidor is not None:
+                fila.update(medir_http(puerto, cuerpo, args.solicitudes_http))
+            filas.append(fila)
+            print(json.dumps(fila), file=sys.stderr)
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait()
+
+    datos = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "version": version_git(),
+        "python": platform.python_version(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("salida", "comparar")},
+        "filas": filas,
+    }
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            datos["comparacion"] = comparar(datos, json.load(f))
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2)
+        f.write("\n")
+    print(json.dumps(datos.get("comparacion", filas), indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Validadores y compresión HTTP para servidor.py (index.php aplica el mismo esquema).
+#
+# ETag fuerte = SHA-256 (32 hex) del cuerpo sin comprimir; la variante gzip lleva el sufijo
+# "-gzip" porque es otra representación. Con If-None-Match coincidente se responde 304 sin
+# cuerpo. Además, el servidor recuerda qué ETag produjo cada entrada (hash del cuerpo de la
+# solicitud + formato + día, la misma clave de coalescencia): si el cliente vuelve a
+# preguntar por lo mismo con ese ETag, el 304 sale sin recalcular. Esto sólo se hace cuando
+# la respuesta depende únicamente de la entrada (sin almacén de ocupación ni operaciones).
+#
+# Variables de entorno:
+#   CITAS_ETAG=0          sin ETag ni 304
+#   CITAS_ETAGS_MAX=4096  entradas recordadas (LRU, por proceso)
+#   CITAS_GZIP=0          sin compresión
+#   CITAS_GZIP_MIN=1024   bytes a partir de los cuales se comprime (si el cliente acepta gzip)
+
+ETAG_ACTIVO = os.environ.get("CITAS_ETAG", "1") != "0"
+
+GZIP_ACTIVO = os.environ.get("CITAS_GZIP", "1") != "0"
+
+UMBRAL_GZIP = int(os.environ.get("CITAS_GZIP_MIN", "1024"))
+
+SUFIJO_GZIP = "-gzip"
+
+
+def etag_de(datos):
+    """ETag fuerte del cuerpo (bytes sin comprimir)."""
+    return '"' + hashlib.sha256(datos).hexdigest()[:32] + '"'
+
+
+def etag_gzip(etag):
+    return etag[:-1] + SUFIJO_GZIP + '"'
+
+
+def coincide(if_none_match, etag):
+    """If-None-Match usa comparación débil: W/ y la variante gzip valen igual. El endpoint es
+    POST, donde "*" pediría 412 (RFC 9110) y no 304: se ignora.
+    """
+    if not if_none_match or etag is None:
+        return False
+    base = etag.strip('"')
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*":
+            continue
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        candidato = candidato.strip('"')
+        if candidato.endswith(SUFIJO_GZIP):
+            candidato = candidato[:-len(SUFIJO_GZIP)]
+        if candidato == base:
+            return True
+    return False
+
+
+def acepta_gzip(accept_encoding):
+    """True si Accept-Encoding admite gzip (respeta q=0)."""
+    if not accept_encoding:
+        return False
+    for parte in accept_encoding.lower().split(","):
+        nombre, _, parametros = parte.partition(";")
+        if nombre.strip() not in ("gzip", "*"):
+            continue
+        q = parametros.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def comprimir(datos):
+    # mtime=0: la misma entrada produce los mismos bytes (y el mismo ETag)
+    return gzip.compress(datos, compresslevel=6, mtime=0)
+
+
+class CacheHTTP:
+    """ETag por entrada (LRU) y contadores de 304 / gzip del proceso."""
+
+    def __init__(self, max_entradas=4096):
+        self.max_entradas = max(1, int(max_entradas))
+        self._etags = OrderedDict()
+        self._lock = threading.Lock()
+        self.no_modificadas = 0
+        self.sin_calculo = 0
+        self.comprimidas = 0
+        self.bytes_sin_comprimir = 0
+        self.bytes_comprimidos = 0
+
+    def etag_conocido(self, entrada):
+        """(etag, bytes del cuerpo) de la última respuesta a esta entrada, o None."""
+        with self._lock:
+            conocido = self._etags.get(entrada)
+            if conocido is not None:
+                self._etags.move_to_end(entrada)
+            return conocido
+
+    def recordar(self, entrada, etag, largo):
+        with self._lock:
+            self._etags[entrada] = (etag, largo)
+            self._etags.move_to_end(entrada)
+            while len(self._etags) > self.max_entradas:
+                self._etags.popitem(last=False)
+
+    def registrar_304(self, sin_calculo):
+        with self._lock:
+            self.no_modificadas += 1
+            self.sin_calculo += sin_calculo
+
+    def registrar_gzip(self, antes, despues):
+        with self._lock:
+            self.comprimidas += 1
+            self.bytes_sin_comprimir += antes
+            self.bytes_comprimidos += despues
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "etags": len(self._etags),
+                "no_modificadas": self.no_modificadas,
+                "no_modificadas_sin_calculo": self.sin_calculo,
+                "comprimidas": self.comprimidas,
+                "bytes_sin_comprimir": self.bytes_sin_comprimir,
+                "bytes_comprimidos": self.bytes_comprimidos,
+            }
+
+
+_CACHE_HTTP = CacheHTTP(int(os.environ.get("CITAS_ETAGS_MAX", "4096")))
+
+
+def obtener_cache_http():
+    return _CACHE_HTTP
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time as reloj
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+# Cache de resultados de disponibilidad. La clave es un hash canónico de lo que determina
+# la respuesta: intervalos ocupados ya parseados (ordenados y fusionados), minutos,
+# Cantidad_dias, filtro normalizado (horario y días de la semana) y la fecha de inicio.
+# Dos payloads con el mismo calendario en distinto orden o con campos Bitrix distintos
+# comparten entrada. Las entradas vencen al cambiar el día (medianoche local).
+#
+# Variables de entorno:
+#   CITAS_CACHE=0            desactiva la cache
+#   CITAS_CACHE_MAX=1024     entradas máximas en memoria (LRU)
+#   CITAS_CACHE_SQLITE=ruta  almacén compartido en disco entre procesos/trabajadores
+#
+# La memoria sólo sirve en procesos de larga vida: servidor.py la habilita con usar_memoria().
+# Un main.py lanzado por solicitud nunca acertaría en ella y pagaría la clave (fusión de
+# intervalos + SHA-256) en vano; ahí la cache existe sólo con CITAS_CACHE_SQLITE.
+
+
+def clave_cache(hoy: date, config: dict, intervalos) -> str:
+    """Hash SHA-256 de (hoy, configuración normalizada, intervalos fusionados)."""
+    normal = {}
+    for k, v in sorted(config.items()):
+        if isinstance(v, (set, frozenset)):
+            v = sorted(v) or None
+        elif hasattr(v, "isoformat"):
+            v = v.isoformat()
+        normal[k] = v
+    h = hashlib.sha256()
+    h.update(hoy.isoformat().encode("ascii"))
+    h.update(json.dumps(normal, sort_keys=True, default=str).encode("utf-8"))
+    for ci, cf in intervalos:
+        h.update(f"|{ci.isoformat()}/{cf.isoformat()}".encode("ascii"))
+    return h.hexdigest()
+
+
+def proxima_medianoche(ahora=None) -> float:
+    ahora = ahora or datetime.now()
+    manana = datetime.combine(ahora.date() + timedelta(days=1), datetime.min.time())
+    return manana.timestamp()
+
+
+class CacheLRU:
+    """Cache en memoria acotada, con expulsión LRU y vencimiento al cambiar el día."""
+
+    def __init__(self, max_entradas=1024):
+        self.max_entradas = max(1, int(max_entradas))
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.vencidas = 0
+
+    def obtener(self, clave):
+        ahora = reloj.time()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                valor, expira = entrada
+                if expira > ahora:
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+                self.vencidas += 1
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, valor, expira=None):
+        expira = expira or proxima_medianoche()
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+                "vencidas": self.vencidas,
+            }
+
+
+class CacheSQLite:
+    """Almacén compartido en un archivo SQLite local (una conexión por hilo, WAL).
+    Permite que varios procesos (pre-fork del servidor o ejecuciones de main.py) compartan
+    aciertos. Los valores se guardan como JSON.
+    """
+
+    def __init__(self, ruta, max_entradas=10000):
+        self.ruta = ruta
+        self.max_entradas = max(1, int(max_entradas))
+        self._local = threading.local()
+        self._escrituras = 0
+        self.aciertos = 0
+        self.fallos = 0
+        con = self._conexion()
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            " clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL, uso REAL NOT NULL)"
+        )
+        con.execute("CREATE INDEX IF NOT EXISTS resultados_uso ON resultados (uso)")
+        con.commit()
+
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=5.0)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def obtener(self, clave):
+        con = self._conexion()
+        ahora = reloj.time()
+        fila = con.execute("SELECT valor FROM resultados WHERE clave = ? AND expira > ?", (clave, ahora)).fetchone()
+        if fila is None:
+            self.fallos += 1
+            return None
+        con.execute("UPDATE resultados SET uso = ? WHERE clave = ?", (ahora, clave))
+        con.commit()
+        self.aciertos += 1
+        return json.loads(fila[0])
+
+    def guardar(self, clave, valor, expira=None):
+        con = self._conexion()
+        ahora = reloj.time()
+        con.execute(
+            "INSERT OR REPLACE INTO resultados (clave, valor, expira, uso) VALUES (?, ?, ?, ?)",
+            (clave, json.dumps(valor, ensure_ascii=False, separators=(",", ":")), expira or proxima_medianoche(), ahora),
+        )
+        self._escrituras += 1
+        # Vencidas y exceso (LRU por 'uso') se purgan cada cierto número de escrituras
+        if self._escrituras % 100 == 1:
+            con.execute("DELETE FROM resultados WHERE expira <= ?", (ahora,))
+            con.execute(
+                "DELETE FROM resultados WHERE clave IN ("
+                " SELECT clave FROM resultados ORDER BY uso DESC LIMIT -1 OFFSET ?)",
+                (self.max_entradas,),
+            )
+        con.commit()
+
+    def estadisticas(self):
+        fila = self._conexion().execute("SELECT COUNT(*) FROM resultados").fetchone()
+        return {
+            "ruta": self.ruta,
+            "entradas": fila[0],
+            "max_entradas": self.max_entradas,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+        }
+
+
+class CacheResultados:
+    """Memoria (LRU) delante de un almacén SQLite; cualquiera de los dos puede faltar."""
+
+    def __init__(self, memoria, compartida=None):
+        self.memoria = memoria
+        self.compartida = compartida
+
+    def obtener(self, clave):
+        valor = self.memoria.obtener(clave) if self.memoria is not None else None
+        if valor is None and self.compartida is not None:
+            valor = self.compartida.obtener(clave)
+            if valor is not None and self.memoria is not None:
+                self.memoria.guardar(clave, valor)
+        return valor
+
+    def guardar(self, clave, valor):
+        expira = proxima_medianoche()
+        if self.memoria is not None:
+            self.memoria.guardar(clave, valor, expira)
+        if self.compartida is not None:
+            self.compartida.guardar(clave, valor, expira)
+
+    def estadisticas(self):
+        datos = {"memoria": self.memoria.estadisticas() if self.memoria is not None else None}
+        if self.compartida is not None:
+            datos["sqlite"] = self.compartida.estadisticas()
+        return datos
+
+
+_CACHE = None
+_CACHE_INICIADA = False
+_MEMORIA = False
+
+
+def usar_memoria():
+    """Habilita la LRU en memoria para este proceso (procesos de larga vida, como servidor.py).
+    Se llama antes de la primera obtener_cache.
+    """
+    global _MEMORIA
+    _MEMORIA = True
+
+
+def memoria_activa():
+    return _MEMORIA
+
+
+def obtener_cache():
+    """Cache del proceso según las variables de entorno (None si está desactivada o si no
+    hay ni memoria habilitada ni CITAS_CACHE_SQLITE).
+    """
+    global _CACHE, _CACHE_INICIADA
+    if not _CACHE_INICIADA:
+        _CACHE_INICIADA = True
+        ruta = os.environ.get("CITAS_CACHE_SQLITE")
+        if os.environ.get("CITAS_CACHE", "1") != "0" and (_MEMORIA or ruta):
+            memoria = CacheLRU(int(os.environ.get("CITAS_CACHE_MAX", "1024"))) if _MEMORIA else None
+            _CACHE = CacheResultados(memoria, CacheSQLite(ruta) if ruta else None)
+    return _CACHE
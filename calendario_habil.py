@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+# Tabla precalculada de días hábiles (lunes a sábado que no son festivo en Colombia).
+# Se indexa por ordinal de día: un byte por día (1 = hábil) sobre un horizonte de varios
+# años. "Los próximos N días hábiles desde D que caen en estos días de la semana" se
+# resuelve con bytearray.find, sin recorrer día por día en Python. La tabla se carga
+# desde un archivo generado (dias_habiles_co.json), así el paquete holidays sólo se
+# importa si se consulta una fecha fuera del horizonte.
+
+ARCHIVO_TABLA = os.environ.get(
+    "CITAS_TABLA_HABILES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dias_habiles_co.json"),
+)
+
+# Mismo tope del cálculo original: se buscan días en una ventana de 2 años
+MAX_DIAS_BUSQUEDA = 365 * 2
+
+
+def festivos_co(anios):
+    """Fechas festivas de Colombia para los años dados (importa holidays a demanda)."""
+    import holidays
+
+    return sorted(holidays.CountryHoliday('CO', years=list(anios)).keys())
+
+
+class TablaDiasHabiles:
+    def __init__(self, desde: date, hasta: date, festivos):
+        self.desde = desde
+        self.hasta = hasta
+        self._base = desde.toordinal()
+        n = (hasta - desde).days + 1
+        habiles = bytearray(1 if (self._base + i) % 7 != 0 else 0 for i in range(n))  # ordinal % 7 == 0 -> domingo
+        for f in festivos:
+            i = f.toordinal() - self._base
+            if 0 <= i < n:
+                habiles[i] = 0
+        self._habiles = habiles
+        self._por_mascara = {}
+
+    def cubre(self, inicio: date, dias: int) -> bool:
+        return self.desde <= inicio and inicio + timedelta(days=dias - 1) <= self.hasta
+
+    def _bitmap(self, dias_semana):
+        # Días hábiles restringidos a dias_semana (weekday 0..6); se calcula una vez por máscara
+        clave = frozenset(dias_semana) if dias_semana else None
+        bm = self._por_mascara.get(clave)
+        if bm is None:
+            if clave is None:
+                bm = self._habiles
+            else:
+                n = len(self._habiles)
+                # Patrón semanal alineado con el primer día de la tabla, repetido y combinado con AND
+                semana = bytes(1 if (self.desde.weekday() + k) % 7 in clave else 0 for k in range(7))
+                patron = (semana * (n // 7 + 1))[:n]
+                bm = bytearray((int.from_bytes(self._habiles, "little")
+                                & int.from_bytes(patron, "little")).to_bytes(n, "little"))
+            self._por_mascara[clave] = bm
+        return bm
+
+    def siguientes(self, inicio: date, cantidad: int, dias_semana=None, max_dias=MAX_DIAS_BUSQUEDA):
+        """Próximos `cantidad` días hábiles desde `inicio` (inclusive) dentro de `max_dias`
+        días, opcionalmente sólo los weekday de `dias_semana`.
+        """
+        bm = self._bitmap(dias_semana)
+        i = inicio.toordinal() - self._base
+        fin = i + max_dias
+        dias = []
+        while len(dias) < cantidad:
+            i = bm.find(1, i, fin)
+            if i < 0:
+                break
+            dias.append(date.fromordinal(self._base + i))
+            i += 1
+        return dias
+
+    def iterar(self, inicio: date, dias_semana=None, max_dias=MAX_DIAS_BUSQUEDA):
+        """Como siguientes(), pero perezoso: cada día se busca sólo cuando se pide."""
+        bm = self._bitmap(dias_semana)
+        i = inicio.toordinal() - self._base
+        fin = i + max_dias
+        while True:
+            i = bm.find(1, i, fin)
+            if i < 0:
+                return
+            yield date.fromordinal(self._base + i)
+            i += 1
+
+    def es_habil(self, d: date) -> bool:
+        i = d.toordinal() - self._base
+        return 0 <= i < len(self._habiles) and self._habiles[i] == 1
+
+
+def construir_tabla(anio_desde, anio_hasta):
+    return TablaDiasHabiles(date(anio_desde, 1, 1), date(anio_hasta, 12, 31),
+                            festivos_co(range(anio_desde, anio_hasta + 1)))
+
+
+def cargar_tabla(ruta=ARCHIVO_TABLA):
+    with open(ruta, "r", encoding="utf-8") as f:
+        datos = json.load(f)
+    return TablaDiasHabiles(date.fromisoformat(datos["desde"]), date.fromisoformat(datos["hasta"]),
+                            [date.fromisoformat(x) for x in datos["festivos"]])
+
+
+_TABLA = None
+
+
+def obtener_tabla(inicio: date = None, dias: int = MAX_DIAS_BUSQUEDA):
+    """Tabla compartida por el proceso. Si la consulta [inicio, inicio + dias) cae fuera
+    del horizonte cargado, se reconstruye con holidays cubriendo también ese rango.
+    """
+    global _TABLA
+    if _TABLA is None:
+        try:
+            _TABLA = cargar_tabla()
+        except (OSError, ValueError, KeyError):
+            hoy = date.today()
+            _TABLA = construir_tabla(hoy.year - 1, hoy.year + 5)
+    if inicio is not None and not _TABLA.cubre(inicio, dias):
+        fin = inicio + timedelta(days=dias)
+        _TABLA = construir_tabla(min(_TABLA.desde.year, inicio.year), max(_TABLA.hasta.year, fin.year))
+    return _TABLA
+
+
+def dias_validos_desde(inicio: date, cantidad: int, dias_semana=None, max_dias=MAX_DIAS_BUSQUEDA):
+    """Próximos `cantidad` días desde `inicio`, excluyendo domingos y festivos y, si se
+    indica, sólo los weekday de `dias_semana`. Equivale al recorrido día a día original.
+    `max_dias` acota la ventana de búsqueda (p. ej. hasta una fecha_fin).
+    """
+    if cantidad <= 0 or max_dias <= 0:
+        return []
+    return obtener_tabla(inicio, max_dias).siguientes(inicio, cantidad, dias_semana, max_dias)
+
+
+def iterar_dias_validos(inicio: date, dias_semana=None, max_dias=MAX_DIAS_BUSQUEDA):
+    """Generador de días válidos desde `inicio` (mismas reglas que dias_validos_desde)."""
+    if max_dias <= 0:
+        return iter(())
+    return obtener_tabla(inicio, max_dias).iterar(inicio, dias_semana, max_dias)
+
+
+def generar_archivo(anio_desde, anio_hasta, ruta=ARCHIVO_TABLA):
+    datos = {
+        "pais": "CO",
+        "desde": date(anio_desde, 1, 1).isoformat(),
+        "hasta": date(anio_hasta, 12, 31).isoformat(),
+        "festivos": [f.isoformat() for f in festivos_co(range(anio_desde, anio_hasta + 1))],
+    }
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=1)
+        f.write("\n")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Genera la tabla precalculada de días hábiles (Colombia)")
+    parser.add_argument("--desde-anio", type=int, default=2024)
+    parser.add_argument("--hasta-anio", type=int, default=2040)
+    parser.add_argument("--salida", default=ARCHIVO_TABLA)
+    args = parser.parse_args(argv[1:])
+    generar_archivo(args.desde_anio, args.hasta_anio, args.salida)
+    print(f"Tabla {args.desde_anio}-{args.hasta_anio} escrita en {args.salida}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,183 @@
+import fcntl
+import hashlib
+import os
+import random
+import threading
+import time as reloj
+
+# Coalescencia de solicitudes idénticas en vuelo ("single-flight"). En ráfagas (lanzamiento
+# de campañas) llegan muchas solicitudes con el mismo calendario y filtros en pocos
+# milisegundos: la primera (líder) calcula y las demás (seguidoras) esperan su respuesta.
+# Sólo se comparten solicitudes simultáneas; lo ya terminado es asunto de cache_resultados.
+#
+# La clave es un SHA-256 de los bytes del cuerpo, calculado mientras se leen (re-serializar
+# el payload para normalizarlo cuesta una fracción apreciable del cálculo), más el formato y
+# demás opciones que cambian la respuesta.
+#
+#   servidor.py   hilos del mismo proceso (CITAS_COALESCER=0 lo desactiva)
+#   main.py       procesos lanzados por index.php, con un candado por clave en
+#                 CITAS_COALESCER_DIR (desactivado si no se define)
+
+ACTIVA = os.environ.get("CITAS_COALESCER", "1") != "0"
+
+DIRECTORIO = os.environ.get("CITAS_COALESCER_DIR") or None
+
+# Archivos de salida/candado más viejos que esto se purgan de vez en cuando (segundos)
+VIDA_ARCHIVOS = 60.0
+
+
+class LectorConResumen:
+    """Envuelve un flujo binario y acumula el hash de lo que se lee."""
+
+    def __init__(self, flujo):
+        self._flujo = flujo
+        self._hash = hashlib.sha256()
+
+    def read(self, n=-1):
+        datos = self._flujo.read(n)
+        self._hash.update(datos)
+        return datos
+
+    def resumen(self):
+        return self._hash.hexdigest()
+
+
+def clave_solicitud(resumen_cuerpo, *opciones):
+    """Clave de coalescencia: hash del cuerpo más las opciones que cambian la respuesta."""
+    h = hashlib.sha256(resumen_cuerpo.encode("ascii"))
+    for opcion in opciones:
+        h.update(f"|{opcion}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def coalescible(payload):
+    # Las operaciones sobre el almacén modifican estado: nunca se comparten
+    return not (isinstance(payload, dict) and payload.get("operacion"))
+
+
+class _Vuelo:
+    __slots__ = ("listo", "valor", "error", "seguidores")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor = None
+        self.error = None
+        self.seguidores = 0
+
+
+class Coalescedor:
+    """Single-flight entre hilos: ejecutar(clave, fn) corre fn una sola vez por clave en vuelo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        self.lideres = 0
+        self.coalescidas = 0
+        self.errores = 0
+        self.max_seguidores = 0
+
+    def ejecutar(self, clave, fn):
+        """Retorna (valor, compartido). Si el líder falla, sus seguidoras reciben la misma excepción."""
+        with self._lock:
+            vuelo = self._en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_vuelo[clave] = _Vuelo()
+                self.lideres += 1
+            else:
+                vuelo.seguidores += 1
+                self.coalescidas += 1
+                self.max_seguidores = max(self.max_seguidores, vuelo.seguidores)
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.valor, True
+        try:
+            vuelo.valor = fn()
+        except BaseException as e:
+            vuelo.error = e
+            with self._lock:
+                self.errores += 1
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+            vuelo.listo.set()
+        return vuelo.valor, False
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "lideres": self.lideres,
+                "coalescidas": self.coalescidas,
+                "en_vuelo": len(self._en_vuelo),
+                "max_seguidores": self.max_seguidores,
+                "errores": self.errores,
+            }
+
+
+_COALESCEDOR = Coalescedor()
+
+
+def obtener_coalescedor():
+    """Coalescedor del proceso (None si CITAS_COALESCER=0)."""
+    return _COALESCEDOR if ACTIVA else None
+
+
+def _identidad(ruta):
+    try:
+        st = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def _purgar(directorio):
+    limite = reloj.time() - VIDA_ARCHIVOS
+    try:
+        with os.scandir(directorio) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.stat().st_mtime < limite:
+                        os.unlink(entrada.path)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
+def coalescer_entre_procesos(directorio, clave, calcular):
+    """Single-flight entre procesos con flock: el líder toma el candado exclusivo, calcula y
+    publica el texto en <clave>.salida (os.replace, atómico); quien encontró el candado
+    tomado espera con un candado compartido y reutiliza esa salida si es nueva (otro inodo
+    que el que había al llegar). Retorna (texto, compartido).
+    """
+    os.makedirs(directorio, exist_ok=True)
+    base = os.path.join(directorio, clave)
+    salida = base + ".salida"
+    with open(base + ".candado", "a+b") as candado:
+        try:
+            fcntl.flock(candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            lider = True
+        except BlockingIOError:
+            previa = _identidad(salida)
+            fcntl.flock(candado, fcntl.LOCK_SH)
+            lider = False
+        try:
+            if not lider and _identidad(salida) not in (None, previa):
+                try:
+                    with open(salida, "r", encoding="utf-8") as f:
+                        return f.read(), True
+                except FileNotFoundError:
+                    pass
+            texto = calcular()
+            temporal = f"{base}.{os.getpid()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                f.write(texto)
+            os.replace(temporal, salida)
+        finally:
+            fcntl.flock(candado, fcntl.LOCK_UN)
+    if random.random() < 1 / 64:
+        _purgar(directorio)
+    return texto, False
@@ -0,0 +1,186 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+
+from calendario_habil import obtener_tabla
+from main import (
+    FORMATO_BITRIX,
+    leer_configuracion,
+    ocupacion_de,
+    parsear_fecha_bitrix,
+    parsear_fecha_hora,
+)
+
+# Verificación en lote de citas propuestas antes de confirmarlas:
+# {"propuestas": [[inicio, fin], {"inicio": ..., "fin": ...}, ...],
+#  "calendar"|"citas"|"resultado"|"agente_id": ..., "filtro"?, "capacidad"?}
+# Cada propuesta se responde con conflicto sí/no, el motivo y, si choca con la ocupación,
+# el evento que la bloquea. La ocupación se indexa una vez (inicios ordenados + máximo
+# acumulado de los fines), así que cada consulta es una búsqueda binaria.
+# Se aplican las reglas de la grilla de slots: domingos y festivos no se atienden, el
+# sábado sólo hasta las 13:00, la cita debe caber dentro del horario/jornada y, si hay
+# dias_habiles en el filtro, caer en esos días (cada día que toque).
+
+CAP_SABADO = time(13, 0, 0)
+
+
+def parsear_momento(valor):
+    """"dd/mm/YYYY HH:MM:SS" (Bitrix) o ISO ("YYYY-MM-DD HH:MM[:SS]"); None si no se entiende."""
+    if not isinstance(valor, str):
+        return None
+    try:
+        return parsear_fecha_bitrix(valor)
+    except ValueError:
+        return parsear_fecha_hora(valor)
+
+
+def extremos_propuesta(propuesta):
+    if isinstance(propuesta, (list, tuple)) and len(propuesta) == 2:
+        return propuesta[0], propuesta[1]
+    if isinstance(propuesta, dict):
+        return (propuesta.get("inicio", propuesta.get("DATE_FROM")),
+                propuesta.get("fin", propuesta.get("DATE_TO")))
+    return None, None
+
+
+class IndiceOcupacion:
+    """Intervalos ordenados por inicio con el máximo acumulado de los fines: el evento de
+    fin más tardío entre los que empiezan antes de `fin` decide si hay cruce.
+    """
+
+    def __init__(self, intervalos):
+        self.eventos = sorted(intervalos)
+        self.inicios = [ci for ci, _ in self.eventos]
+        self._max_fin = []
+        self._arg_max = []
+        mejor = None
+        for i, (_, cf) in enumerate(self.eventos):
+            if mejor is None or cf > self.eventos[mejor][1]:
+                mejor = i
+            self._max_fin.append(self.eventos[mejor][1])
+            self._arg_max.append(mejor)
+
+    def cruce(self, inicio, fin):
+        """Un evento que se cruza con [inicio, fin), o None."""
+        k = bisect_left(self.inicios, fin)
+        if k and self._max_fin[k - 1] > inicio:
+            return self.eventos[self._arg_max[k - 1]]
+        return None
+
+    def _preparar_barrido(self):
+        # Bordes ordenados (a igual instante, los fines antes que los inicios), eventos activos
+        # tras cada borde y una tabla dispersa para el máximo en un rango de bordes
+        bordes = sorted([(ci, 1) for ci, _ in self.eventos] + [(cf, -1) for _, cf in self.eventos])
+        self._instantes = [t for t, _ in bordes]
+        activos = []
+        n = 0
+        for _, delta in bordes:
+            n += delta
+            activos.append(n)
+        self._maximos = [activos]
+        ancho = 1
+        while 2 * ancho <= len(activos):
+            previo = self._maximos[-1]
+            self._maximos.append([max(previo[i], previo[i + ancho]) for i in range(len(previo) - ancho)])
+            ancho *= 2
+
+    def _maximo_en(self, a, b):
+        # Máximo de activos en los bordes [a, b), b > a
+        nivel = (b - a).bit_length() - 1
+        fila = self._maximos[nivel]
+        return max(fila[a], fila[b - (1 << nivel)])
+
+    def solapamiento(self, inicio, fin):
+        """(máximo de eventos simultáneos dentro de [inicio, fin), uno de ellos), igual que
+        main.maximo_solapamiento: el estado al comienzo y los picos en los bordes interiores.
+        """
+        if not self.eventos:
+            return 0, None
+        if not hasattr(self, "_instantes"):
+            self._preparar_barrido()
+        a = bisect_right(self._instantes, inicio)
+        b = bisect_left(self._instantes, fin)
+        maximo = self._maximos[0][a - 1] if a else 0
+        if b > a:
+            maximo = max(maximo, self._maximo_en(a, b))
+        if maximo == 0:
+            return 0, None
+        return maximo, self.cruce(inicio, fin)
+
+
+def _dias_cubiertos(inicio, fin):
+    # Días que toca [inicio, fin): un fin a medianoche no ocupa el día siguiente
+    d = inicio.date()
+    ultimo = (fin - timedelta(microseconds=1)).date()
+    while d <= ultimo:
+        yield d
+        d += timedelta(days=1)
+
+
+def regla_calendario(inicio, fin, config, tabla):
+    """Motivo por el que la grilla nunca ofrecería esta cita (o None). Se revisa cada día
+    que toca la cita y que termine dentro del horario (el sábado, a las 13:00).
+    """
+    for d in _dias_cubiertos(inicio, fin):
+        if d.weekday() == 6:
+            return "domingo"
+        if not tabla.es_habil(d):
+            return "festivo"
+        if config["dias_semana"] and d.weekday() not in config["dias_semana"]:
+            return "dia_no_habil"
+    if config["plantilla"] is not None:
+        # Con plantilla la cita debe caber entera en una franja (sin descansos) de su día
+        return None if config["plantilla"].contiene(inicio, fin) else "fuera_de_horario"
+    d = inicio.date()
+    t_hasta = config["t_hasta"]
+    if d.weekday() == 5 and t_hasta > CAP_SABADO:
+        t_hasta = CAP_SABADO
+        if inicio.time() >= CAP_SABADO or fin > datetime.combine(d, CAP_SABADO):
+            return "sabado_despues_13"
+    if not (config["t_desde"] <= inicio.time() and fin <= datetime.combine(d, t_hasta)):
+        return "fuera_de_horario"
+    return None
+
+
+def verificar_propuestas(payload):
+    """Retorna {"resultados": [...], "conflictos": n, "libres": m} en el orden de entrada."""
+    config = leer_configuracion(payload)
+    propuestas = []
+    for p in payload.get("propuestas") or []:
+        a, b = extremos_propuesta(p)
+        inicio, fin = parsear_momento(a), parsear_momento(b)
+        propuestas.append((a, b, inicio, fin if inicio is not None and fin is not None and fin > inicio else None))
+
+    fechas = [inicio.date() for _, _, inicio, fin in propuestas if fin is not None]
+    ventana = (min(fechas), max(fin.date() for _, _, _, fin in propuestas if fin is not None)) if fechas else None
+    indice = IndiceOcupacion(ocupacion_de(payload, config, ventana))
+    tabla = obtener_tabla(ventana[0], (ventana[1] - ventana[0]).days + 1) if ventana else None
+    capacidad = config["capacidad"]
+
+    resultados = []
+    conflictos = 0
+    for a, b, inicio, fin in propuestas:
+        item = {"inicio": a, "fin": b, "conflicto": True}
+        if fin is None:
+            item["motivo"] = "invalida"
+        else:
+            motivo = regla_calendario(inicio, fin, config, tabla)
+            evento = None
+            if motivo is None:
+                if capacidad > 1:
+                    maximo, evento = indice.solapamiento(inicio, fin)
+                    if maximo < capacidad:
+                        evento = None
+                else:
+                    evento = indice.cruce(inicio, fin)
+                if evento is not None:
+                    motivo = "ocupado"
+            if motivo is None:
+                item["conflicto"] = False
+            else:
+                item["motivo"] = motivo
+            if evento is not None:
+                item["evento"] = {"DATE_FROM": evento[0].strftime(FORMATO_BITRIX),
+                                  "DATE_TO": evento[1].strftime(FORMATO_BITRIX)}
+        conflictos += item["conflicto"]
+        resultados.append(item)
+    return {"resultados": resultados, "conflictos": conflictos, "libres": len(resultados) - conflictos}
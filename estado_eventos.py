@@ -0,0 +1,122 @@
+import os
+
+from metricas import contar
+
+# Descarte de eventos por estado durante la extracción, antes de parsear fechas: eventos
+# borrados, inactivos, marcados como libres o invitaciones rechazadas no ocupan al agente.
+# Es opcional (sin reglas todo evento ocupa, como siempre):
+#
+#   "filtro_eventos": true                          reglas por defecto
+#   "filtro_eventos": ["eliminados", "libres"]      (o "eliminados,libres")
+#   "filtro_eventos": {"eliminados": true, "rechazados": true,
+#                      "accesibilidad": ["free", "absent"], "dueno": "1127"}
+#   CITAS_FILTRO_EVENTOS=1 | eliminados,libres      valor por defecto del proceso
+#
+# Reglas:
+#   eliminados   DELETED = Y
+#   inactivos    ACTIVE = N
+#   libres       ACCESSIBILITY en "accesibilidad" (por defecto sólo "free")
+#   rechazados   MEETING_STATUS = N, o el dueño figura con status N en ATTENDEE_LIST
+#   pendientes   MEETING_STATUS = Q, o el dueño figura con status Q (no está en las de por defecto)
+# El dueño es "dueno", si no el agente_id del payload y si no el OWNER_ID del evento.
+# Con métricas activas se cuentan "descartados" y "descartados_<regla>".
+
+REGLAS = ("eliminados", "inactivos", "libres", "rechazados", "pendientes")
+
+POR_DEFECTO = ("eliminados", "inactivos", "libres", "rechazados")
+
+ACCESIBILIDAD_LIBRE = ("free",)
+
+
+def leer_reglas(valor):
+    """Normaliza "filtro_eventos" a {"reglas", "accesibilidad", "dueno"} (None = no filtrar)."""
+    if valor is None or valor is False or valor in ("", "0", 0):
+        return None
+    dueno = None
+    accesibilidad = ACCESIBILIDAD_LIBRE
+    if valor is True or valor in ("1", 1):
+        nombres = POR_DEFECTO
+    elif isinstance(valor, str):
+        nombres = [v.strip() for v in valor.split(",")]
+    elif isinstance(valor, (list, tuple)):
+        nombres = [str(v).strip() for v in valor]
+    elif isinstance(valor, dict):
+        nombres = [k for k in REGLAS if valor.get(k)]
+        if isinstance(valor.get("accesibilidad"), (list, tuple)):
+            accesibilidad = valor["accesibilidad"]
+        dueno = valor.get("dueno")
+    else:
+        return None
+    reglas = frozenset(n.lower() for n in nombres) & frozenset(REGLAS)
+    if not reglas:
+        return None
+    return {
+        "reglas": reglas,
+        "accesibilidad": frozenset(str(a).lower() for a in accesibilidad),
+        "dueno": str(dueno) if dueno not in (None, "") else None,
+    }
+
+
+REGLAS_ENTORNO = leer_reglas(os.environ.get("CITAS_FILTRO_EVENTOS"))
+
+
+def reglas_de(payload):
+    """Reglas del payload ("filtro_eventos") o las del entorno; el dueño por defecto es agente_id."""
+    if not isinstance(payload, dict) or "filtro_eventos" not in payload:
+        reglas = REGLAS_ENTORNO
+    else:
+        reglas = leer_reglas(payload["filtro_eventos"])
+    if reglas is not None and reglas["dueno"] is None and isinstance(payload, dict) \
+            and payload.get("agente_id") not in (None, ""):
+        reglas = dict(reglas, dueno=str(payload["agente_id"]))
+    return reglas
+
+
+def _texto(v):
+    return str(v).strip().upper() if v is not None else ""
+
+
+def _estado_dueno(ev, dueno):
+    # Status del dueño en ATTENDEE_LIST ([{"id": 1127, "status": "Y"}, ...]); "" si no figura
+    asistentes = ev.get("ATTENDEE_LIST")
+    if not asistentes or not isinstance(asistentes, list):
+        return ""
+    if dueno is None:
+        dueno = ev.get("OWNER_ID")
+        if dueno in (None, ""):
+            return ""
+        dueno = str(dueno)
+    for a in asistentes:
+        if isinstance(a, dict) and str(a.get("id")) == dueno:
+            return _texto(a.get("status"))
+    return ""
+
+
+def motivo_descarte(ev, reglas):
+    """Regla por la que `ev` no ocupa al agente, o None si ocupa."""
+    r = reglas["reglas"]
+    if "eliminados" in r and _texto(ev.get("DELETED")) == "Y":
+        return "eliminados"
+    if "inactivos" in r and _texto(ev.get("ACTIVE")) == "N":
+        return "inactivos"
+    if "libres" in r and str(ev.get("ACCESSIBILITY") or "").lower() in reglas["accesibilidad"]:
+        return "libres"
+    if "rechazados" in r or "pendientes" in r:
+        estado = _texto(ev.get("MEETING_STATUS"))
+        if estado not in ("N", "Q"):
+            estado = _estado_dueno(ev, reglas["dueno"]) or estado
+        if estado == "N" and "rechazados" in r:
+            return "rechazados"
+        if estado == "Q" and "pendientes" in r:
+            return "pendientes"
+    return None
+
+
+def descartar(ev, reglas):
+    """True si el evento se descarta (y lo cuenta en las métricas)."""
+    motivo = motivo_descarte(ev, reglas)
+    if motivo is None:
+        return False
+    contar("descartados")
+    contar("descartados_" + motivo)
+    return True
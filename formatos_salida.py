@@ -0,0 +1,94 @@
+import json
+
+# Formatos de respuesta. Se eligen con payload["formato"], `--formato` en main.py o
+# `?formato=` en servidor.py / index.php:
+#   json      lista indentada (por defecto, igual que siempre)
+#   compacto  mismo contenido sin indentación ni espacios
+#   rangos    por día, los slots libres consecutivos fusionados en rangos más la duración
+#             del slot: [{"dia", "minutos", "rangos": [{"hora_inicio", "hora_fin"}]}]
+#   ndjson    una línea JSON por día (o por agente en un lote), escrita a medida que se calcula
+
+FORMATOS = ("json", "compacto", "rangos", "ndjson")
+
+TIPOS_CONTENIDO = {
+    "json": "application/json",
+    "compacto": "application/json",
+    "rangos": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+_SEPARADORES_COMPACTOS = (",", ":")
+
+
+def formato_de(payload, por_defecto="json"):
+    """Formato pedido en el payload; si no viene o no se reconoce, `por_defecto`."""
+    formato = payload.get("formato") if isinstance(payload, dict) else None
+    return formato if formato in FORMATOS else por_defecto
+
+
+def fusionar_slots(citas):
+    """[{"hora_inicio", "hora_fin"}, ...] -> rangos con los slots contiguos fusionados."""
+    rangos = []
+    for slot in citas:
+        if rangos and rangos[-1]["hora_fin"] == slot["hora_inicio"]:
+            rangos[-1]["hora_fin"] = slot["hora_fin"]
+        else:
+            rangos.append({"hora_inicio": slot["hora_inicio"], "hora_fin": slot["hora_fin"]})
+    return rangos
+
+
+def dia_en_rangos(dia, minutos):
+    return {"dia": dia["dia"], "minutos": minutos, "rangos": fusionar_slots(dia["citas"])}
+
+
+def _minutos(payload):
+    from main import leer_configuracion
+
+    return leer_configuracion(payload)["slot_minutes"]
+
+
+def a_rangos(resultado, payload):
+    """Convierte la salida de calcular_disponibilidad al formato 'rangos'."""
+    if isinstance(resultado, list):
+        minutos = _minutos(payload)
+        return [dia_en_rangos(d, minutos) for d in resultado]
+    if isinstance(resultado, dict) and isinstance(payload, dict) and isinstance(payload.get("agentes"), list):
+        # Lote de agentes: cada uno puede traer sus propios minutos
+        from lote import id_agente, payload_agente
+
+        minutos = {}
+        for i, agente in enumerate(payload.get("agentes") or []):
+            aid = id_agente(agente, i) if isinstance(agente, dict) else str(i)
+            minutos[aid] = _minutos(payload_agente(payload, agente))
+        por_defecto = _minutos(payload)
+        return {aid: [dia_en_rangos(d, minutos.get(aid, por_defecto)) for d in dias]
+                for aid, dias in resultado.items()}
+    return resultado
+
+
+def fragmentos(resultado, formato="json", payload=None):
+    """Texto de la respuesta en trozos. Con 'ndjson' cada trozo es una línea y `resultado`
+    puede ser un iterador perezoso de días; los demás formatos producen un solo trozo.
+    """
+    if formato == "ndjson":
+        if isinstance(resultado, dict):
+            if not (isinstance(payload, dict) and isinstance(payload.get("agentes"), list)) or "error" in resultado:
+                # Errores y respuestas que no son disponibilidad: una sola línea
+                yield json.dumps(resultado, ensure_ascii=False, separators=_SEPARADORES_COMPACTOS) + "\n"
+                return
+            for aid, dias in resultado.items():
+                linea = {"agente": aid, "disponibilidad": dias}
+                yield json.dumps(linea, ensure_ascii=False, separators=_SEPARADORES_COMPACTOS) + "\n"
+            return
+        for dia in resultado:
+            yield json.dumps(dia, ensure_ascii=False, separators=_SEPARADORES_COMPACTOS) + "\n"
+        return
+
+    if not isinstance(resultado, (list, dict)):
+        resultado = list(resultado)
+    if formato == "rangos":
+        yield json.dumps(a_rangos(resultado, payload), ensure_ascii=False, separators=_SEPARADORES_COMPACTOS)
+    elif formato == "compacto":
+        yield json.dumps(resultado, ensure_ascii=False, separators=_SEPARADORES_COMPACTOS)
+    else:
+        yield json.dumps(resultado, ensure_ascii=False, indent=2)
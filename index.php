@@ -2,7 +2,8 @@
 // CORS
 header("Access-Control-Allow-Origin: *");
 header("Access-Control-Allow-Methods: POST, OPTIONS");
-header("Access-Control-Allow-Headers: Content-Type, Authorization, X-Requested-With");
+header("Access-Control-Allow-Headers: Content-Type, Authorization, X-Requested-With, If-None-Match");
+header("Access-Control-Expose-Headers: ETag");
 header("Content-Type: application/json");
 
 if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
@@ -10,63 +11,149 @@ if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
     exit;
 }
 
-// v.9.4 — Acepta payload general (citas, filtro y calendar Bitrix). Cantidad_dias es global y se aplica antes de dias_habiles.
+// v.10.0 — main.py --informar-formato escribe primero el formato elegido (?formato= o el
+// "formato" del payload): streaming, Content-Type y ETag dependen de él. If-None-Match: *
+// se ignora (en POST correspondería 412, no 304).
+// v.9.9 — ETag (SHA-256 del cuerpo) con 304 ante If-None-Match y gzip desde CITAS_GZIP_MIN
+// bytes si el cliente lo acepta; mismo esquema que servidor.py (ver cache_http.py).
+// v.9.8 — CITAS_METRICAS=1 agrega la cabecera Server-Timing (tiempos por etapa de Python).
+// v.9.7 — ?formato=compacto|rangos|ndjson elige el formato de salida (ver formatos_salida.py);
+// con ndjson la salida de Python se reenvía línea a línea sin acumularla.
+// v.9.6 — El cuerpo se entrega a Python por stdin (proc_open) sin copiarlo ni decodificarlo en PHP:
+// sin límite de ARG_MAX para calendarios grandes. main.py interpreta JSON crudo o
+// form-urlencoded (payload|data|json) y sale con código 3 si el cuerpo no es válido.
 
-$body = file_get_contents("php://input");
-if (!$body) {
-    http_response_code(400); // sigue siendo error del cliente
-    echo json_encode(["error" => "No se recibió ningún cuerpo en la solicitud"]);
+$descriptores = [
+    0 => ["pipe", "r"],
+    1 => ["pipe", "w"],
+    2 => ["redirect", 1],
+];
+// Con CITAS_METRICAS=1 Python escribe sus tiempos por etapa en el descriptor 3 y se
+// devuelven en la cabecera Server-Timing junto con el costo de lanzar el proceso
+$metricas = getenv("CITAS_METRICAS") === "1";
+$entorno = null;
+if ($metricas) {
+    $t0 = microtime(true);
+    $descriptores[3] = ["pipe", "w"];
+    $entorno = getenv();
+    $entorno["CITAS_T0"] = sprintf("%.6f", $t0);
+}
+$formatos = ["json", "compacto", "rangos", "ndjson"];
+$comando = ["python3", "main.py", "--stdin", "--informar-formato"];
+$consulta = isset($_GET["formato"]) ? (string)$_GET["formato"] : "";
+if (in_array($consulta, $formatos, true)) {
+    $comando[] = "--formato";
+    $comando[] = $consulta;
+}
+if ($metricas) {
+    $comando[] = "--metricas-fd";
+    $comando[] = "3";
+}
+$proc = proc_open($comando, $descriptores, $pipes, __DIR__, $entorno);
+if (!is_resource($proc)) {
+    http_response_code(500);
+    echo json_encode([
+        "error" => "Error al ejecutar el script Python",
+        "detail" => "No se pudo iniciar el proceso",
+        "code" => 500
+    ]);
     exit;
 }
 
-// Intento 1: JSON crudo
-$data = json_decode($body, true);
+// Pasar php://input directo al stdin de Python
+$entrada = fopen("php://input", "rb");
+stream_copy_to_stream($entrada, $pipes[0]);
+fclose($entrada);
+fclose($pipes[0]);
 
-// Intento 2: si no es JSON, probar como form-urlencoded (payload=..., data=..., json=...)
-if ($data === null && json_last_error() !== JSON_ERROR_NONE) {
-    $form = [];
-    parse_str($body, $form);
-    $candidate = null;
-    foreach (["payload", "data", "json"] as $k) {
-        if (isset($form[$k]) && is_string($form[$k])) {
-            $candidate = $form[$k];
-            break;
-        }
+// Primera línea: el formato que eligió main.py. Si no llega (cuerpo inválido, error antes de
+// decidirlo) esa línea ya es parte de la salida y se trata como json
+$formato = "json";
+$inicio = fgets($pipes[1]);
+if ($inicio !== false && in_array(rtrim($inicio, "\r\n"), $formatos, true)) {
+    $formato = rtrim($inicio, "\r\n");
+    $inicio = "";
+}
+
+if ($formato === "ndjson") {
+    // Streaming: cada día sale apenas Python lo escribe. El estado ya no puede cambiar,
+    // así que un error llega como una línea {"error": ...}.
+    header("Content-Type: application/x-ndjson");
+    while (($linea = fgets($pipes[1])) !== false) {
+        echo $linea;
+        flush();
     }
-    if ($candidate !== null) {
-        $data2 = json_decode($candidate, true);
-        if ($data2 !== null || json_last_error() === JSON_ERROR_NONE) {
-            $data = $data2;
-        }
+    fclose($pipes[1]);
+    if ($metricas) {
+        fclose($pipes[3]);
     }
+    proc_close($proc);
+    exit;
 }
 
-if ($data === null && json_last_error() !== JSON_ERROR_NONE) {
+$output = (string)$inicio . stream_get_contents($pipes[1]);
+fclose($pipes[1]);
+if ($metricas) {
+    $tiempos = trim(stream_get_contents($pipes[3]));
+    fclose($pipes[3]);
+}
+$status = proc_close($proc);
+if ($metricas) {
+    $proceso = (microtime(true) - $t0) * 1000;
+    header("Server-Timing: " . ($tiempos !== "" ? $tiempos . ", " : "") . sprintf("proceso;dur=%.2f", $proceso));
+}
+
+if ($status === 3) {
+    // Cuerpo vacío o no válido: error del cliente
     http_response_code(400);
-    echo json_encode([
-        "error" => "Cuerpo no válido: se espera JSON crudo o form-urlencoded con 'payload'|'data'|'json'",
-    ]);
+    echo rtrim($output);
     exit;
 }
 
-// Puede venir 'citas', 'filtro', 'calendar', 'resultado',
-// o incluso un arreglo de eventos (result) o arreglo Bitrix.
-// Pasamos el payload completo a Python para normalizar.
-$payload_json = json_encode($data);
-$escaped_payload = escapeshellarg($payload_json);
-
-// Ejecutar el script de Python
-$cmd = "python3 main.py $escaped_payload 2>&1";
-exec($cmd, $output, $status);
-
 if ($status !== 0) {
     http_response_code(500);
     echo json_encode([
         "error" => "Error al ejecutar el script Python",
-        "detail" => implode("\n", $output),
+        "detail" => rtrim($output),
         "code" => 500
     ]);
     exit;
 }
 
-echo implode("\n", $output);
+// Validadores y compresión: Python ya calculó, pero un 304 o un cuerpo comprimido ahorran
+// la transferencia al cliente que consulta una y otra vez el mismo calendario
+$cuerpo = rtrim($output);
+$etag = substr(hash("sha256", $cuerpo), 0, 32);
+$umbral = getenv("CITAS_GZIP_MIN") !== false ? (int)getenv("CITAS_GZIP_MIN") : 1024;
+$gzip = false;
+if (getenv("CITAS_GZIP") !== "0" && strlen($cuerpo) >= $umbral && function_exists("gzencode")) {
+    // Accept-Encoding: gzip, deflate;q=0.5 ... (q=0 lo rechaza)
+    foreach (explode(",", strtolower($_SERVER["HTTP_ACCEPT_ENCODING"] ?? "")) as $parte) {
+        $trozos = explode(";", $parte, 2);
+        if (!in_array(trim($trozos[0]), ["gzip", "*"], true)) {
+            continue;
+        }
+        $q = isset($trozos[1]) ? trim($trozos[1]) : "";
+        $gzip = strpos($q, "q=") === 0 ? (float)substr($q, 2) > 0 : true;
+        break;
+    }
+}
+if (getenv("CITAS_GZIP") !== "0" && strlen($cuerpo) >= $umbral) {
+    header("Vary: Accept-Encoding");
+}
+if (getenv("CITAS_ETAG") !== "0") {
+    header('ETag: "' . $etag . ($gzip ? "-gzip" : "") . '"');
+    foreach (explode(",", $_SERVER["HTTP_IF_NONE_MATCH"] ?? "") as $candidato) {
+        $candidato = preg_replace('/-gzip$/', "", trim(preg_replace('/^W\//', "", trim($candidato)), '"'));
+        if ($candidato === $etag) {
+            http_response_code(304);
+            exit;
+        }
+    }
+}
+if ($gzip) {
+    header("Content-Encoding: gzip");
+    echo gzencode($cuerpo, 6);
+    exit;
+}
+echo $cuerpo;
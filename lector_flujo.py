@@ -0,0 +1,274 @@
+import codecs
+import json
+
+# Lectura incremental del cuerpo de la solicitud. En lugar de decodificar toda la respuesta
+# Bitrix con json.loads, se recorre la estructura externa (objeto raíz, calendar[], body,
+# result[]) y cada evento se decodifica por separado para quedarse sólo con los campos
+# que usa el motor. La memoria queda acotada por los intervalos conservados y no por el
+# tamaño del payload (cada evento trae ~3 KB de MEETING, ATTENDEE_LIST, DESCRIPTION...).
+
+# Campos que se conservan de cada evento; el resto se descarta apenas se decodifica
+CAMPOS_EVENTO = (
+    "DATE_FROM",
+    "DATE_TO",
+    "ID",
+    "ACTIVE",
+    "DELETED",
+    "ACCESSIBILITY",
+    "MEETING_STATUS",
+    "OWNER_ID",
+    "VERSION",
+    "DATE_FROM_TS_UTC",
+    "DATE_TO_TS_UTC",
+    "TZ_OFFSET_FROM",
+    "TZ_OFFSET_TO",
+    "RRULE",
+    "EXDATE",
+    "RECURRENCE_ID",
+    "ORIGINAL_DATE_FROM",
+    "ATTENDEE_LIST",
+)
+
+TAM_BLOQUE = 64 * 1024
+
+# Caracteres con los que un número JSON puede continuar
+_SIGUE_NUMERO = frozenset("0123456789.eE+-")
+
+
+class LectorJSON:
+    """Tokenizador mínimo sobre un flujo binario UTF-8.
+    Los valores completos se decodifican con json.JSONDecoder.raw_decode (en C); sólo la
+    estructura que se quiere recorrer (llaves y comas) se procesa en Python.
+    """
+
+    def __init__(self, flujo, inicial=b"", limite=None, tam_bloque=TAM_BLOQUE):
+        self._flujo = flujo
+        self._restante = limite
+        self._tam_bloque = tam_bloque
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._dec = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        if self._restante is not None:
+            self._restante -= len(inicial)
+        self._buf = self._utf8.decode(inicial)
+
+    def _llenar(self):
+        # Lee al menos lo que ya hay pendiente en el buffer para que reintentar un valor
+        # grande cueste O(n) en total y no O(n^2)
+        if self._eof:
+            return False
+        pendiente = len(self._buf) - self._pos
+        n = max(self._tam_bloque, pendiente)
+        if self._restante is not None:
+            n = min(n, self._restante)
+        datos = self._flujo.read(n) if n > 0 else b""
+        if self._restante is not None:
+            self._restante -= len(datos)
+        if not datos:
+            self._eof = True
+            self._buf = self._buf[self._pos:] + self._utf8.decode(b"", final=True)
+            self._pos = 0
+            return False
+        self._buf = self._buf[self._pos:] + self._utf8.decode(datos)
+        self._pos = 0
+        return True
+
+    def ver(self):
+        """Salta espacios y retorna el siguiente carácter sin consumirlo ('' al final)."""
+        while True:
+            buf = self._buf
+            n = len(buf)
+            i = self._pos
+            while i < n and buf[i] in " \t\n\r":
+                i += 1
+            self._pos = i
+            if i < n:
+                return buf[i]
+            if not self._llenar():
+                return ""
+
+    def esperar(self, c):
+        if self.ver() != c:
+            raise ValueError(f"JSON inválido: se esperaba '{c}'")
+        self._pos += 1
+
+    def valor(self):
+        """Decodifica y retorna el siguiente valor JSON completo."""
+        self.ver()
+        while True:
+            try:
+                v, fin = self._dec.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._llenar():
+                    continue
+                raise
+            # Un número al borde del buffer podría continuar en el siguiente bloque: raw_decode
+            # acepta el prefijo ("12." -> 12, "1.5e" -> 1.5) aunque no llegue al final
+            if isinstance(v, (int, float)) and not isinstance(v, bool) and not self._eof \
+                    and (fin == len(self._buf) or self._buf[fin] in _SIGUE_NUMERO) and self._llenar():
+                continue
+            self._pos = fin
+            return v
+
+    def saltar(self):
+        self.valor()
+
+    def claves(self):
+        """Itera las claves de un objeto; quien llama debe consumir cada valor."""
+        self.esperar("{")
+        if self.ver() == "}":
+            self._pos += 1
+            return
+        while True:
+            clave = self.valor()
+            if not isinstance(clave, str):
+                raise ValueError("JSON inválido: clave de objeto no es texto")
+            self.esperar(":")
+            yield clave
+            c = self.ver()
+            self._pos += 1
+            if c == ",":
+                continue
+            if c == "}":
+                return
+            raise ValueError("JSON inválido: se esperaba ',' o '}'")
+
+    def elementos(self):
+        """Itera los elementos de un arreglo; quien llama debe consumir cada valor."""
+        self.esperar("[")
+        if self.ver() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            c = self.ver()
+            self._pos += 1
+            if c == ",":
+                continue
+            if c == "]":
+                return
+            raise ValueError("JSON inválido: se esperaba ',' o ']'")
+
+    def terminar(self):
+        if self.ver() != "":
+            raise ValueError("JSON inválido: contenido adicional al final")
+
+
+def reducir_evento(ev, campos=CAMPOS_EVENTO):
+    if not isinstance(ev, dict):
+        return None
+    return {k: ev[k] for k in campos if k in ev}
+
+
+def _leer_eventos(lector, campos):
+    if lector.ver() != "[":
+        return lector.valor()
+    eventos = []
+    for _ in lector.elementos():
+        eventos.append(reducir_evento(lector.valor(), campos))
+    return eventos
+
+
+def _leer_con_result(lector, campos):
+    # Objeto {"result": [eventos], ...}: sólo se conserva 'result' reducido
+    if lector.ver() != "{":
+        return lector.valor()
+    obj = {}
+    for clave in lector.claves():
+        if clave == "result":
+            obj["result"] = _leer_eventos(lector, campos)
+        else:
+            lector.saltar()
+    return obj
+
+
+def _leer_envoltorio(lector, campos):
+    # Elemento de calendar[]: {"body": {"result": [...]}, "headers": ..., "statusCode": ...}
+    # o, en la lista raíz, un evento suelto {DATE_FROM, DATE_TO, ...}
+    if lector.ver() != "{":
+        lector.saltar()
+        return None
+    obj = {}
+    for clave in lector.claves():
+        if clave == "body":
+            obj["body"] = _leer_con_result(lector, campos)
+        elif clave in campos:
+            obj[clave] = lector.valor()
+        else:
+            lector.saltar()
+    return obj
+
+
+def _leer_calendar(lector, campos):
+    # extraer_citas_de_calendar sólo usa el primer elemento; el resto se descarta
+    if lector.ver() != "[":
+        lector.saltar()
+        return None
+    calendar = []
+    for _ in lector.elementos():
+        if calendar:
+            lector.saltar()
+        else:
+            calendar.append(_leer_envoltorio(lector, campos))
+    return calendar
+
+
+def _leer_lista_raiz(lector, campos):
+    # Arreglo Bitrix crudo ([{body: {result}}]) o lista de eventos sueltos
+    lista = []
+    es_calendar = None
+    for _ in lector.elementos():
+        if es_calendar:
+            lector.saltar()
+            continue
+        elem = _leer_envoltorio(lector, campos)
+        if es_calendar is None:
+            es_calendar = isinstance(elem, dict) and "body" in elem
+        lista.append(elem)
+    return lista
+
+
+def _leer_objeto(lector, campos):
+    # Objeto cuyas claves conocidas (REDUCTORES) se leen en modo flujo
+    obj = {}
+    for clave in lector.claves():
+        reductor = REDUCTORES.get(clave)
+        obj[clave] = reductor(lector, campos) if reductor else lector.valor()
+    return obj
+
+
+def _leer_objetos(lector, campos):
+    # Lote de agentes o de asistentes: cada uno trae su propio calendar/citas
+    if lector.ver() != "[":
+        return lector.valor()
+    agentes = []
+    for _ in lector.elementos():
+        agentes.append(_leer_objeto(lector, campos) if lector.ver() == "{" else lector.valor())
+    return agentes
+
+
+# Claves que se leen en modo flujo; las demás se decodifican completas
+REDUCTORES = {
+    "calendar": _leer_calendar,
+    "citas": _leer_con_result,
+    "agentes": _leer_objetos,
+    "asistentes": _leer_objetos,
+    "eventos": _leer_eventos,
+}
+
+
+def leer_payload(lector, campos=CAMPOS_EVENTO):
+    """Lee un payload completo desde el lector con la misma forma que tendría con json.loads,
+    pero con los eventos reducidos a `campos`.
+    """
+    c = lector.ver()
+    if c == "[":
+        payload = _leer_lista_raiz(lector, campos)
+    elif c == "{":
+        payload = _leer_objeto(lector, campos)
+    else:
+        payload = lector.valor()
+    lector.terminar()
+    return payload
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_resultados import memoria_activa, usar_memoria
+from main import disponibilidad_agente, normalizar_payload
+
+# Disponibilidad para muchos agentes en una sola llamada:
+# {"agentes": [{"id": ..., "calendar"|"citas"|"resultado": ..., "filtro"?, "minutos"?, "Cantidad_dias"?}, ...],
+#  "filtro"?, "minutos"?, "Cantidad_dias"?, "procesos"?}
+# Cada agente hereda del lote los campos que no trae. La selección de días hábiles se
+# calcula una vez por configuración y los lotes grandes se reparten en procesos.
+
+CAMPOS_HEREDADOS = ("minutos", "Cantidad_dias", "filtro", "usar_ts_utc", "capacidad", "filtro_eventos")
+
+# A partir de cuántos agentes conviene pagar el envío a otros procesos
+UMBRAL_PROCESOS = 64
+
+_POOL = None
+_POOL_TAM = 0
+
+
+def id_agente(agente, i):
+    for k in ("id", "agente_id", "OWNER_ID"):
+        v = agente.get(k)
+        if v is not None and v != "":
+            return str(v)
+    return str(i)
+
+
+def payload_agente(lote, agente):
+    if isinstance(agente, list):
+        agente = normalizar_payload(agente)
+    p = {k: lote[k] for k in CAMPOS_HEREDADOS if k in lote}
+    if isinstance(agente, dict):
+        p.update(agente)
+    return p
+
+
+def calcular_agentes(agentes, hoy, motor=None):
+    """Calcula [(id, disponibilidad), ...] para [(id, payload), ...] en este proceso.
+    Agentes con la misma Cantidad_dias y dias_habiles comparten la lista de días.
+    """
+    dias_por_config = {}
+    return [(aid, disponibilidad_agente(p, hoy, motor, dias_por_config)) for aid, p in agentes]
+
+
+def _tam_pool():
+    # Tamaño fijo del lado del servidor: CITAS_PROCESOS_LOTE o el número de CPUs
+    try:
+        tam = int(os.environ.get("CITAS_PROCESOS_LOTE") or 0)
+    except ValueError:
+        tam = 0
+    return max(1, tam or os.cpu_count() or 1)
+
+
+def iniciar_pool():
+    """Crea el pool del proceso. servidor.py lo llama al arrancar (en cada trabajador tras
+    el pre-fork), antes de atender: los hijos salen de un forkserver (o spawn), nunca de un
+    fork de un hilo del servidor que podría tener tomados los locks de cache, métricas o
+    coalescencia.
+    """
+    global _POOL, _POOL_TAM
+    if _POOL is None:
+        metodos = multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+        _POOL_TAM = _tam_pool()
+        # Los trabajadores viven lo que el servidor: también usan la LRU en memoria si él la usa
+        _POOL = ProcessPoolExecutor(max_workers=_POOL_TAM, mp_context=contexto,
+                                    initializer=usar_memoria if memoria_activa() else None)
+    return _POOL
+
+
+def _procesos_lote(lote, n_agentes):
+    # "procesos" del cliente sólo reparte el trabajo: nunca más que el pool ni que las CPUs
+    if n_agentes < UMBRAL_PROCESOS:
+        return 1
+    tope = min(_POOL_TAM or _tam_pool(), os.cpu_count() or 1)
+    try:
+        procesos = int(lote.get("procesos") or tope)
+    except (TypeError, ValueError):
+        procesos = tope
+    return max(1, min(procesos, tope, n_agentes))
+
+
+def calcular_lote(lote, hoy, motor=None):
+    """Retorna {agente_id: [{"dia", "citas"}, ...]} en el orden de entrada."""
+    agentes = [(id_agente(a, i) if isinstance(a, dict) else str(i), payload_agente(lote, a))
+               for i, a in enumerate(lote.get("agentes") or [])]
+    procesos = _procesos_lote(lote, len(agentes))
+
+    if procesos <= 1:
+        return dict(calcular_agentes(agentes, hoy, motor))
+
+    # Varios bloques por proceso para equilibrar agentes con calendarios de distinto tamaño
+    n_bloques = procesos * 4
+    tam = -(-len(agentes) // n_bloques)
+    bloques = [agentes[i:i + tam] for i in range(0, len(agentes), tam)]
+    pool = iniciar_pool()
+    resultado = {}
+    for parcial in pool.map(calcular_agentes, bloques, [hoy] * len(bloques), [motor] * len(bloques)):
+        resultado.update(parcial)
+    return resultado
@@ -1,7 +1,21 @@
+import argparse
+import hashlib
 import json
+import os
+import re
+from functools import partial
+from itertools import islice
 from datetime import datetime, timedelta, date, time
-import holidays
 import sys
+import time as reloj
+from urllib.parse import parse_qs
+
+from cache_resultados import clave_cache, obtener_cache
+from calendario_habil import MAX_DIAS_BUSQUEDA, dias_validos_desde, iterar_dias_validos
+from estado_eventos import REGLAS_ENTORNO, descartar, reglas_de
+from formatos_salida import FORMATOS, formato_de, fragmentos
+from lector_flujo import LectorJSON, TAM_BLOQUE, leer_payload
+from metricas import contar, etapa, iniciar as iniciar_metricas, midiendo, terminar as terminar_metricas
 
 # V.9.5 — Soporta 'resultado' (DATE FROM/DATE TO) como ocupación, selección de días acorde a dias_habiles y sábados hasta 13:00.
 
@@ -26,17 +40,56 @@ SPANISH_DAY_TO_WEEKDAY = {
 }
 
 
-def parsear_citas(citas_json):
+FORMATO_BITRIX = "%d/%m/%Y %H:%M:%S"
+
+# Mismo formato que FORMATO_BITRIX; día, mes y hora pueden venir sin cero ("9/09/2025")
+_FECHA_BITRIX = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4}) (\d{1,2}):(\d{1,2}):(\d{1,2})", re.ASCII)
+
+# Campos epoch de Bitrix que se conservan junto a DATE_FROM/DATE_TO (ver parsear_intervalo)
+CAMPOS_TS = ("DATE_FROM_TS_UTC", "DATE_TO_TS_UTC", "TZ_OFFSET_FROM", "TZ_OFFSET_TO")
+
+# En los calendarios de ejemplo DATE_FROM viene en la zona del portal y no coincide con
+# DATE_FROM_TS_UTC + TZ_OFFSET_FROM, así que usar los epoch es opcional
+USAR_TS_UTC = os.environ.get("CITAS_USAR_TS_UTC", "0") == "1"
+
+EPOCA = datetime(1970, 1, 1)
+
+
+def copiar_ts(ev, cita):
+    # Conserva los epoch de Bitrix (si vienen) para parsear_intervalo y los campos de serie
+    if "DATE_FROM_TS_UTC" in ev:
+        for k in CAMPOS_TS:
+            if k in ev:
+                cita[k] = ev[k]
+    return copiar_recurrencia(ev, cita)
+
+
+def copiar_recurrencia(ev, cita):
+    # Series (RRULE) e instancias modificadas (RECURRENCE_ID) se expanden en recurrencia.py
+    if ev.get("RRULE"):
+        cita["RRULE"] = ev["RRULE"]
+        cita["EXDATE"] = ev.get("EXDATE")
+        cita["ID"] = ev.get("ID")
+    serie = ev.get("RECURRENCE_ID")
+    if serie not in (None, "", "null", 0, "0"):
+        cita["RECURRENCE_ID"] = serie
+        cita["ORIGINAL_DATE_FROM"] = ev.get("ORIGINAL_DATE_FROM")
+    return cita
+
+
+def parsear_citas(citas_json, reglas=REGLAS_ENTORNO):
     citas = []
     if not isinstance(citas_json, dict):
         return citas
     # Estructura esperada: {"result": [{"DATE_FROM": "dd/mm/YYYY HH:MM:SS", "DATE_TO": "dd/mm/YYYY HH:MM:SS"}, ...]}
     for item in citas_json.get("result", []):
         try:
-            citas.append({
+            if reglas is not None and descartar(item, reglas):
+                continue
+            citas.append(copiar_ts(item, {
                 "DATE_FROM": item["DATE_FROM"],
                 "DATE_TO": item["DATE_TO"]
-            })
+            }))
         except Exception:
             continue
     return citas
@@ -61,10 +114,11 @@ def parsear_resultado(payload_dict):
     return citas
 
 
-def extraer_citas_de_calendar(calendar_json):
+def extraer_citas_de_calendar(calendar_json, reglas=REGLAS_ENTORNO):
     """Acepta el arreglo de calendario estilo Bitrix
     [ { "body": { "result": [ {"DATE_FROM":..., "DATE_TO":...}, ... ] }, ... } ]
-    y retorna lista de dicts {DATE_FROM, DATE_TO}.
+    y retorna lista de dicts {DATE_FROM, DATE_TO}. Con `reglas` (ver estado_eventos) los
+    eventos borrados, libres, rechazados... se descartan antes de parsear sus fechas.
     """
     citas = []
     try:
@@ -74,10 +128,12 @@ def extraer_citas_de_calendar(calendar_json):
             for ev in result:
                 if not isinstance(ev, dict):
                     continue
+                if reglas is not None and descartar(ev, reglas):
+                    continue
                 df = ev.get("DATE_FROM")
                 dt = ev.get("DATE_TO")
                 if isinstance(df, str) and isinstance(dt, str):
-                    citas.append({"DATE_FROM": df, "DATE_TO": dt})
+                    citas.append(copiar_ts(ev, {"DATE_FROM": df, "DATE_TO": dt}))
     except Exception:
         pass
     return citas
@@ -108,7 +164,56 @@ def hay_interseccion(a_inicio: datetime, a_fin: datetime, b_inicio: datetime, b_
     return not (a_fin <= b_inicio or a_inicio >= b_fin)
 
 
-def generar_slots_para_dia(d: date, t_desde: time, t_hasta: time, slot_minutes: int, citas_parsed):
+def fusionar_intervalos(intervalos):
+    # Ordena y fusiona intervalos que se solapan o se tocan; retorna lista disjunta y ordenada
+    fusion = []
+    for ci, cf in sorted(intervalos):
+        if fusion and ci <= fusion[-1][1]:
+            if cf > fusion[-1][1]:
+                fusion[-1] = (fusion[-1][0], cf)
+        else:
+            fusion.append((ci, cf))
+    return fusion
+
+
+def indexar_ocupacion(citas_parsed, dias=None, rango=None, fusionar=True):
+    """Agrupa los intervalos ocupados por día, una sola vez por solicitud.
+    Un evento queda en cada día que toca (ci.date() <= d <= cf.date()), igual que el
+    criterio de generar_slots_para_dia. Cada día queda ordenado y fusionado (con
+    `fusionar=False` sólo ordenado, para contar solapamientos).
+    Si se pasa `dias`, sólo se indexan esos días; con `rango=(desde, hasta)`, sólo los
+    días de ese rango (inclusive).
+    Retorna dict {date: [(inicio, fin), ...]}.
+    """
+    por_dia = {}
+    dias_set = set(dias) if dias is not None else None
+    if dias_set is not None and not dias_set:
+        return por_dia
+    d_min = min(dias_set) if dias_set else None
+    d_max = max(dias_set) if dias_set else None
+    if rango is not None:
+        d_min = max(d_min, rango[0]) if d_min else rango[0]
+        d_max = min(d_max, rango[1]) if d_max else rango[1]
+    un_dia = timedelta(days=1)
+    for ci, cf in citas_parsed:
+        d = ci.date()
+        d_fin = cf.date()
+        if d_min is not None:
+            if d_fin < d_min or d > d_max:
+                continue
+            d = max(d, d_min)
+            d_fin = min(d_fin, d_max)
+        while d <= d_fin:
+            if dias_set is None or d in dias_set:
+                por_dia.setdefault(d, []).append((ci, cf))
+            d += un_dia
+    for d in por_dia:
+        por_dia[d] = fusionar_intervalos(por_dia[d]) if fusionar else sorted(por_dia[d])
+    return por_dia
+
+
+def grilla_slots(d: date, t_desde: time, t_hasta: time, slot_minutes: int):
+    """Slots candidatos del día como lista de (inicio, fin), antes de mirar la ocupación."""
     # Regla: sábados (weekday==5) solo hasta las 13:00, incluso si el horario/jornada define mayor rango
     cap_sabado = time(13, 0, 0)
     t_hasta_real = t_hasta
@@ -117,43 +222,150 @@ def generar_slots_para_dia(d: date, t_desde: time, t_hasta: time, slot_minutes:
 
     inicio_dt = datetime.combine(d, t_desde)
     fin_dt = datetime.combine(d, t_hasta_real)
-    if fin_dt <= inicio_dt:
-        return []
-
-    slots = []
+    grilla = []
     cursor = inicio_dt
     delta = timedelta(minutes=max(1, int(slot_minutes)))
     while cursor < fin_dt:
         fin_slot = cursor + delta
-        ocupado = False
-        for ci, cf in citas_parsed:
-            # Considerar citas que puedan cruzar días
-            if not (ci.date() == d or cf.date() == d or (ci.date() < d < cf.date())):
-                continue
-            if hay_interseccion(cursor, fin_slot, ci, cf):
-                ocupado = True
-                break
-        if not ocupado:
-            slots.append({
-                "hora_inicio": cursor.strftime("%H:%M"),
-                "hora_fin": fin_slot.strftime("%H:%M"),
-            })
+        grilla.append((cursor, fin_slot))
         cursor = fin_slot
-    return slots
+    return grilla
 
 
-def main():
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "Se requiere al menos un argumento (payload JSON)"}))
-        return
+def marcar_ocupados(grilla, bloques):
+    """Para cada slot de la grilla indica si se cruza con algún bloque, recorriendo slots y
+    bloques del día (ordenados y disjuntos, ver indexar_ocupacion) en paralelo.
+    """
+    ocupados = []
+    j = 0
+    n = len(bloques)
+    for inicio, fin in grilla:
+        # Descartar bloques que terminan antes del slot: ya no afectan a los siguientes
+        while j < n and bloques[j][1] <= inicio:
+            j += 1
+        ocupados.append(j < n and bloques[j][0] < fin)
+    return ocupados
+
+
+def maximo_solapamiento(grilla, eventos):
+    """Para cada slot [inicio, fin) de la grilla, el máximo de eventos simultáneos dentro del
+    slot. Barrido único sobre los bordes ordenados (a igual instante, los fines antes que los
+    inicios: intervalos que sólo se tocan no se solapan); grilla ordenada y sin solapes.
+    """
+    bordes = sorted([(ci, 1) for ci, _ in eventos] + [(cf, -1) for _, cf in eventos])
+    maximos = []
+    activos = 0
+    j = 0
+    n = len(bordes)
+    for inicio, fin in grilla:
+        # Estado al comienzo del slot
+        while j < n and bordes[j][0] <= inicio:
+            activos += bordes[j][1]
+            j += 1
+        maximo = activos
+        # Picos dentro del slot
+        while j < n and bordes[j][0] < fin:
+            activos += bordes[j][1]
+            if activos > maximo:
+                maximo = activos
+            j += 1
+        maximos.append(maximo)
+    return maximos
+
+
+def formatear_slot(inicio: datetime, fin: datetime):
+    return {
+        "hora_inicio": f"{inicio.hour:02d}:{inicio.minute:02d}",
+        "hora_fin": f"{fin.hour:02d}:{fin.minute:02d}",
+    }
+
+
+def generar_slots_desde_bloques(d: date, t_desde: time, t_hasta: time, slot_minutes: int, bloques):
+    """Genera los slots libres del día a partir de sus bloques ocupados fusionados."""
+    grilla = grilla_slots(d, t_desde, t_hasta, slot_minutes)
+    return [formatear_slot(inicio, fin)
+            for (inicio, fin), ocupado in zip(grilla, marcar_ocupados(grilla, bloques)) if not ocupado]
+
+
+def generar_slots_con_capacidad(d: date, t_desde: time, t_hasta: time, slot_minutes: int, eventos, capacidad=1):
+    """Slots libres cuando caben `capacidad` citas en paralelo: un slot se ofrece mientras el
+    máximo de eventos simultáneos dentro de él sea menor que la capacidad. `eventos` son los
+    intervalos del día sin fusionar (ver indexar_ocupacion con fusionar=False).
+    """
+    grilla = grilla_slots(d, t_desde, t_hasta, slot_minutes)
+    return [formatear_slot(inicio, fin)
+            for (inicio, fin), maximo in zip(grilla, maximo_solapamiento(grilla, eventos)) if maximo < capacidad]
+
 
-    # Parseo del JSON de entrada (puede traer 'citas' y/o 'filtro')
+def generar_slots_para_dia(d: date, t_desde: time, t_hasta: time, slot_minutes: int, citas_parsed):
+    # Considera las citas que puedan cruzar días; ver indexar_ocupacion
+    bloques = indexar_ocupacion(citas_parsed, [d]).get(d, [])
+    return generar_slots_desde_bloques(d, t_desde, t_hasta, slot_minutes, bloques)
+
+
+def decodificar_cuerpo(cuerpo):
+    """Replica la lectura del cuerpo que hace index.php:
+    1) JSON crudo; 2) form-urlencoded con 'payload'|'data'|'json' conteniendo JSON.
+    Retorna el payload decodificado o lanza ValueError con el mensaje de error para el cliente.
+    """
+    if isinstance(cuerpo, bytes):
+        cuerpo = cuerpo.decode("utf-8", errors="replace")
+    if not cuerpo:
+        raise ValueError("No se recibió ningún cuerpo en la solicitud")
+
+    # Intento 1: JSON crudo
     try:
-        payload = json.loads(sys.argv[1])
-    except Exception as e:
-        print(json.dumps({"error": f"Error al interpretar JSON: {str(e)}"}))
-        return
+        return json.loads(cuerpo)
+    except ValueError:
+        pass
+
+    # Intento 2: form-urlencoded (payload=..., data=..., json=...)
+    form = parse_qs(cuerpo, keep_blank_values=True)
+    for k in ("payload", "data", "json"):
+        if form.get(k):
+            try:
+                return json.loads(form[k][-1])
+            except ValueError:
+                break
+    raise ValueError("Cuerpo no válido: se espera JSON crudo o form-urlencoded con 'payload'|'data'|'json'")
+
+
+def decodificar_flujo(flujo, limite=None):
+    """Como decodificar_cuerpo, pero leyendo el cuerpo desde un flujo binario.
+    Si el cuerpo es JSON (empieza por '{' o '['), se lee en modo incremental y de cada
+    evento sólo se conservan los campos de lector_flujo.CAMPOS_EVENTO; si no, se lee
+    completo y se interpreta como form-urlencoded.
+    `limite` acota los bytes a leer (p. ej. Content-Length).
+    """
+    n = TAM_BLOQUE if limite is None else min(TAM_BLOQUE, limite)
+    inicial = flujo.read(n) if n > 0 else b""
+    primero = inicial.lstrip(b" \t\r\n")[:1]
+    if primero in (b"{", b"["):
+        lector = LectorJSON(flujo, inicial=inicial, limite=limite)
+        try:
+            return leer_payload(lector)
+        except ValueError:
+            raise ValueError("Cuerpo no válido: se espera JSON crudo o form-urlencoded con 'payload'|'data'|'json'")
+    resto = flujo.read() if limite is None else flujo.read(max(0, limite - len(inicial)))
+    return decodificar_cuerpo(inicial + resto)
+
+
+def _motor_bitmap():
+    # motor_bitmap importa NumPy (~80 ms de arranque): sólo se carga si se elige este motor
+    from motor_bitmap import generar_slots_bitmap
+
+    return generar_slots_bitmap
+
+
+# Generadores de slots intercambiables; todos reciben los bloques fusionados del día. Cada
+# entrada retorna el generador, así los motores opcionales se importan al elegirlos
+MOTORES = {
+    "intervalos": lambda: generar_slots_desde_bloques,
+    "bitmap": _motor_bitmap,
+}
 
+
+def normalizar_payload(payload):
     # Normalización: si viene un arreglo directamente, asuma que es
     # - calendario Bitrix: [ { body: { result: [...] } } ]
     # - o lista de eventos [{DATE_FROM, DATE_TO}, ...]
@@ -164,42 +376,191 @@ def main():
         else:
             for ev in payload:
                 if isinstance(ev, dict) and "DATE_FROM" in ev and "DATE_TO" in ev:
-                    citas_list.append({
+                    if REGLAS_ENTORNO is not None and descartar(ev, REGLAS_ENTORNO):
+                        continue
+                    citas_list.append(copiar_ts(ev, {
                         "DATE_FROM": ev["DATE_FROM"],
                         "DATE_TO": ev["DATE_TO"],
-                    })
+                    }))
         payload = {"citas": {"result": citas_list}}
+    return payload
 
-    hoy = date.today() + timedelta(days=1)  # empezamos desde mañana
-    # Festivos de Colombia, sin limitar por año para soportar rangos largos
-    festivos_co = holidays.CountryHoliday('CO')
 
-    # Configuración común
-    slot_minutes = 20
-    if isinstance(payload, dict) and isinstance(payload.get("minutos"), int) and payload["minutos"] > 0:
-        slot_minutes = int(payload["minutos"])
+def parsear_fecha_bitrix(s):
+    """"dd/mm/YYYY HH:MM:SS" -> datetime sin pasar por strptime (regex + enteros).
+    Lo que no calza con el formato fijo se delega a strptime: acepta y rechaza lo mismo.
+    """
+    m = _FECHA_BITRIX.fullmatch(s)
+    if m is not None:
+        d, mes, anio, h, mi, se = m.groups()
+        try:
+            return datetime(int(anio), int(mes), int(d), int(h), int(mi), int(se))
+        except ValueError:
+            pass
+    return datetime.strptime(s, FORMATO_BITRIX)
+
+
+def instante_bitrix(ts_utc, offset):
+    """Hora local (naive) a partir del epoch UTC y el desfase en segundos de Bitrix."""
+    return EPOCA + timedelta(seconds=int(ts_utc) + int(offset or 0))
+
+
+def parsear_intervalo(ev, usar_ts=None):
+    """(inicio, fin) de un evento {DATE_FROM, DATE_TO}; None si es inválido o vacío.
+    Con `usar_ts` (por defecto CITAS_USAR_TS_UTC) y los campos DATE_*_TS_UTC presentes,
+    se usan los epoch más TZ_OFFSET_* en lugar de interpretar el texto.
+    """
+    if usar_ts is None:
+        usar_ts = USAR_TS_UTC
+    try:
+        if usar_ts and "DATE_FROM_TS_UTC" in ev and "DATE_TO_TS_UTC" in ev:
+            offset = ev.get("TZ_OFFSET_FROM")
+            ci = instante_bitrix(ev["DATE_FROM_TS_UTC"], offset)
+            cf = instante_bitrix(ev["DATE_TO_TS_UTC"], ev.get("TZ_OFFSET_TO", offset))
+        else:
+            ci = parsear_fecha_bitrix(ev["DATE_FROM"])
+            cf = parsear_fecha_bitrix(ev["DATE_TO"])
+    except Exception:
+        return None
+    return (ci, cf) if cf > ci else None
+
 
+def extraer_ocupacion(payload):
+    """(intervalos, series): las ocupaciones de 'resultado', 'citas' y 'calendar' como
+    tuplas (inicio, fin) de datetime, descartando las inválidas o vacías, y los eventos
+    recurrentes (RRULE, RECURRENCE_ID) sin expandir. "usar_ts_utc": true toma las horas de
+    DATE_*_TS_UTC + TZ_OFFSET_* cuando vienen (ver parsear_intervalo).
+    """
     # Citas existentes (opcional) y/o calendario Bitrix (opcional) y/o resultado (requerido según nueva especificación)
     citas_parsed = []
     citas_fuente = []
-    if isinstance(payload, dict):
-        # 'resultado' como ocupación base (un solo intervalo)
-        citas_fuente.extend(parsear_resultado(payload))
-        if "citas" in payload:
-            citas_fuente.extend(parsear_citas(payload.get("citas", {})))
-        if "calendar" in payload:
-            citas_fuente.extend(extraer_citas_de_calendar(payload.get("calendar")))
-
-    for c in citas_fuente:
-        try:
-            ci = datetime.strptime(c["DATE_FROM"], "%d/%m/%Y %H:%M:%S")
-            cf = datetime.strptime(c["DATE_TO"], "%d/%m/%Y %H:%M:%S")
-            if cf > ci:
-                citas_parsed.append((ci, cf))
-        except Exception:
-            continue
+    with etapa("extraccion"):
+        if isinstance(payload, dict):
+            # Eventos que no ocupan (filtro_eventos) se descartan aquí, antes de parsear fechas
+            reglas = reglas_de(payload)
+            # 'resultado' como ocupación base (un solo intervalo)
+            citas_fuente.extend(parsear_resultado(payload))
+            if "citas" in payload:
+                citas_fuente.extend(parsear_citas(payload.get("citas", {}), reglas))
+            if "calendar" in payload:
+                citas_fuente.extend(extraer_citas_de_calendar(payload.get("calendar"), reglas))
+
+    with etapa("fechas"):
+        usar_ts = payload.get("usar_ts_utc") if isinstance(payload, dict) else None
+        series = []
+        for c in citas_fuente:
+            if "RRULE" in c or "RECURRENCE_ID" in c:
+                series.append(c)
+                if "RRULE" in c:
+                    continue
+            intervalo = parsear_intervalo(c, usar_ts)
+            if intervalo is not None:
+                citas_parsed.append(intervalo)
+    contar("eventos", len(citas_fuente))
+    return citas_parsed, series
+
+
+def expandir_en_ventana(payload, series, ventana):
+    """Ocurrencias de `series` (ver extraer_ocupacion) dentro de `ventana` = (primer día,
+    último día); el costo depende de la ventana y no del largo de cada serie.
+    """
+    if not series:
+        return []
+    # Sólo las ocurrencias que caen en la ventana (ver recurrencia)
+    from recurrencia import expandir_series
+
+    usar_ts = payload.get("usar_ts_utc") if isinstance(payload, dict) else None
+    with etapa("fechas"):
+        return expandir_series(series, ventana, usar_ts)
+
+
+def recolectar_ocupacion(payload, ventana=None):
+    """Une las ocupaciones de 'resultado', 'citas' y 'calendar' (ver extraer_ocupacion).
+    Los eventos recurrentes (RRULE) aportan sus ocurrencias dentro de `ventana` = (primer
+    día, último día) (ver recurrencia). Con 'agente_id' y el almacén configurado (ver
+    almacen_ocupacion) se suman los eventos guardados que tocan la ventana.
+    """
+    citas_parsed, series = extraer_ocupacion(payload)
+    citas_parsed.extend(expandir_en_ventana(payload, series, ventana))
+    citas_parsed.extend(ocupacion_del_almacen(payload, ventana))
+    contar("intervalos", len(citas_parsed))
+    return citas_parsed
+
+
+def usa_almacen(payload):
+    """True si la ocupación incluye eventos guardados (agente_id con el almacén configurado)."""
+    if not isinstance(payload, dict) or payload.get("agente_id") in (None, ""):
+        return False
+    from almacen_ocupacion import obtener_almacen
+
+    return obtener_almacen() is not None
+
+
+def ocupacion_del_almacen(payload, ventana):
+    """Eventos guardados de payload["agente_id"] que tocan `ventana` (ver almacen_ocupacion).
+    Sin ventana (ningún día que responder) no se consulta nada.
+    """
+    if ventana is None or not usa_almacen(payload):
+        return []
+    from almacen_ocupacion import ocupacion_almacenada
+
+    with etapa("almacen"):
+        return ocupacion_almacenada(payload, *ventana)
+
+
+def parsear_fecha(valor):
+    """Acepta date, "YYYY-MM-DD" o "dd/mm/YYYY" (con o sin hora). Retorna date o None."""
+    if isinstance(valor, date):
+        return valor
+    if not isinstance(valor, str) or not valor.strip():
+        return None
+    s = valor.strip().split(" ", 1)[0].split("T", 1)[0]
+    try:
+        if "/" in s:
+            d, m, y = s.split("/")
+            return date(int(y), int(m), int(d))
+        return date.fromisoformat(s)
+    except ValueError:
+        return None
 
-    disponibilidad_por_dia = {}
+
+def parsear_fecha_hora(valor):
+    """Acepta datetime, "YYYY-MM-DD[THH:MM[:SS]]" o "dd/mm/YYYY[ HH:MM[:SS]]".
+    Sin hora se toma el inicio del día. Retorna datetime o None.
+    """
+    if isinstance(valor, datetime):
+        return valor
+    d = parsear_fecha(valor)
+    if d is None:
+        return None
+    hora = time(0, 0)
+    if isinstance(valor, str):
+        partes = valor.strip().replace("T", " ", 1).split(" ", 1)
+        if len(partes) == 2 and partes[1].strip():
+            try:
+                hora = time.fromisoformat(partes[1].strip())
+            except ValueError:
+                return None
+    return datetime.combine(d, hora.replace(tzinfo=None))
+
+
+def fecha_hoy():
+    """Fecha de "hoy"; CITAS_HOY=YYYY-MM-DD la fija para pruebas y benchmarks reproducibles."""
+    return parsear_fecha(os.environ.get("CITAS_HOY")) or date.today()
+
+
+def leer_configuracion(payload):
+    """Lee minutos, horario (jornada/horario), dias_habiles, Cantidad_dias y la ventana de
+    fechas (fecha_inicio/desde_fecha, fecha_fin) del payload.
+    Retorna dict con slot_minutes, t_desde, t_hasta, dias_semana (set o None), cantidad_dias
+    (None = sin tope dentro de la ventana), fecha_inicio y fecha_fin (date o None),
+    limite_slots (int o None), inicio_minimo (datetime o None), capacidad (int >= 1) y
+    plantilla (plantilla_horario.PlantillaHorario compilada, o None).
+    """
+    # Configuración común
+    slot_minutes = 20
+    if isinstance(payload, dict) and isinstance(payload.get("minutos"), int) and payload["minutos"] > 0:
+        slot_minutes = int(payload["minutos"])
 
     # Cantidad_dias global (puede aplicarse con o sin filtro)
     cantidad_dias_global = None
@@ -241,42 +602,461 @@ def main():
                 if key in SPANISH_DAY_TO_WEEKDAY:
                     dias_wd_filtro.add(SPANISH_DAY_TO_WEEKDAY[key])
 
-    # 2) Construir lista de días válidos base según Cantidad_dias y dias_habiles
-    #    - Siempre excluir domingos (weekday==6) y festivos
-    #    - Si hay dias_habiles, seleccionar los próximos N días que cumplan con esos días de la semana
-    #    - Si no hay dias_habiles, seleccionar los próximos N días válidos
+    # Plantilla por día de la semana (franjas, descansos, margen): reemplaza a horario/jornada
+    plantilla = None
+    if isinstance(filtro, dict) and filtro.get("plantilla") is not None:
+        from plantilla_horario import compilar_plantilla
+
+        plantilla = compilar_plantilla(filtro["plantilla"], slot_minutes)
+        if plantilla is not None:
+            # Sólo cuentan los días en que la plantilla tiene franjas
+            dias_wd_filtro = set(plantilla.dias_semana) if dias_wd_filtro is None \
+                else dias_wd_filtro & plantilla.dias_semana
+
+    # Ventana explícita: fecha_inicio (o desde_fecha) en lugar de "mañana", y fecha_fin inclusive
+    fecha_inicio = fecha_fin = None
+    if isinstance(payload, dict):
+        fecha_inicio = parsear_fecha(payload.get("fecha_inicio", payload.get("desde_fecha")))
+        fecha_fin = parsear_fecha(payload.get("fecha_fin"))
+
+    # Primeros N slots libres (opcionalmente no antes de inicio_minimo)
+    limite_slots = inicio_minimo = None
+    if isinstance(payload, dict):
+        try:
+            raw_limite = payload.get("limite_slots")
+            limite_slots = int(raw_limite) if raw_limite is not None else None
+        except (TypeError, ValueError):
+            limite_slots = None
+        if limite_slots is not None and limite_slots <= 0:
+            limite_slots = None
+        inicio_minimo = parsear_fecha_hora(payload.get("inicio_minimo"))
+
+    # Citas simultáneas por slot (sillas/consultorios en paralelo); 1 = comportamiento clásico
+    capacidad = 1
+    if isinstance(payload, dict):
+        try:
+            capacidad = max(1, int(payload.get("capacidad") or 1))
+        except (TypeError, ValueError):
+            capacidad = 1
+
+    # 2) Cantidad de días válidos a seleccionar (7 por defecto; con fecha_fin o limite_slots,
+    #    todos los de la ventana)
     target_count = None
     try:
-        target_count = int(cantidad_dias_global) if cantidad_dias_global is not None else 7
+        if cantidad_dias_global is not None:
+            target_count = int(cantidad_dias_global)
+        elif fecha_fin is None and limite_slots is None:
+            target_count = 7
     except Exception:
         target_count = 7
 
-    dias_validos = []
-    d = hoy
-    max_loop_days = 365 * 2
-    loops = 0
-    while len(dias_validos) < target_count and loops < max_loop_days:
-        loops += 1
-        if d.weekday() != 6 and d not in festivos_co:
-            if isinstance(dias_wd_filtro, set) and dias_wd_filtro:
-                if d.weekday() in dias_wd_filtro:
-                    dias_validos.append(d)
-            else:
-                dias_validos.append(d)
-        d += timedelta(days=1)
-
-    # 3) Generar slots para cada día válido
-    for di in dias_validos:
-        slots = generar_slots_para_dia(di, t_desde, t_hasta, slot_minutes, citas_parsed)
-        disponibilidad_por_dia[di.isoformat()] = slots
-
-    resultado = [{"dia": k, "citas": disponibilidad_por_dia[k]} for k in sorted(disponibilidad_por_dia)]
-    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    return {
+        "slot_minutes": slot_minutes,
+        "t_desde": t_desde,
+        "t_hasta": t_hasta,
+        "dias_semana": dias_wd_filtro,
+        "cantidad_dias": target_count,
+        "fecha_inicio": fecha_inicio,
+        "fecha_fin": fecha_fin,
+        "limite_slots": limite_slots,
+        "inicio_minimo": inicio_minimo,
+        "capacidad": capacidad,
+        "plantilla": plantilla,
+    }
+
+
+def ventana_dias(hoy, config):
+    """(inicio, max_dias) de la búsqueda: desde fecha_inicio (o hoy) hasta 2 años o fecha_fin."""
+    inicio = config["fecha_inicio"] or hoy
+    max_dias = MAX_DIAS_BUSQUEDA
+    if config["fecha_fin"] is not None:
+        max_dias = min(max_dias, (config["fecha_fin"] - inicio).days + 1)
+    return inicio, max_dias
+
+
+def seleccionar_dias(hoy, config):
+    """Días válidos base según Cantidad_dias y dias_habiles:
+    - Siempre excluir domingos (weekday==6) y festivos
+    - Si hay dias_habiles, seleccionar los próximos N días que cumplan con esos días de la semana
+    - Si no hay dias_habiles, seleccionar los próximos N días válidos
+    - Con fecha_inicio/fecha_fin, sólo dentro de esa ventana
+    """
+    inicio, max_dias = ventana_dias(hoy, config)
+    cantidad = config["cantidad_dias"] if config["cantidad_dias"] is not None else max_dias
+    # Tabla precalculada de días hábiles (ver calendario_habil): búsqueda hasta 2 años
+    return dias_validos_desde(inicio, cantidad, config["dias_semana"], max_dias)
+
+
+def generador_slots(config, motor=None):
+    """(generar_slots, fusionar): con plantilla, la plantilla compilada; con capacidad > 1
+    se cuentan solapamientos sobre los intervalos sin fusionar; si no, el motor elegido
+    sobre bloques fusionados.
+    """
+    capacidad = config.get("capacidad", 1)
+    plantilla = config.get("plantilla")
+    if plantilla is not None:
+        # Resta de intervalos sobre las franjas compiladas (ver plantilla_horario)
+        return partial(plantilla.generar_slots, capacidad=capacidad), capacidad <= 1
+    if capacidad > 1:
+        return partial(generar_slots_con_capacidad, capacidad=capacidad), False
+    return MOTORES.get(motor, MOTORES["intervalos"])(), True
+
+
+def iterar_disponibilidad(dias_validos, config, citas_parsed, motor=None):
+    """Genera {"dia", "citas"} día por día, en orden, a medida que se calcula cada uno."""
+    # Ocupación indexada por día una sola vez
+    generar_slots, fusionar = generador_slots(config, motor)
+    ocupacion = indexar_ocupacion(citas_parsed, dias_validos, fusionar=fusionar)
+    for di in sorted(set(dias_validos)):
+        slots = generar_slots(di, config["t_desde"], config["t_hasta"], config["slot_minutes"],
+                              ocupacion.get(di, []))
+        yield {"dia": di.isoformat(), "citas": slots}
+
+
+def _ampliada(ventana, plantilla):
+    # El margen de la plantilla alcanza citas de los días vecinos a la ventana
+    extra = plantilla.dias_extra() if plantilla is not None else 0
+    if ventana is None or not extra:
+        return ventana
+    return ventana[0] - timedelta(days=extra), ventana[1] + timedelta(days=extra)
+
+
+def _con_margen(plantilla, intervalos):
+    return plantilla.con_margen(intervalos) if plantilla is not None else intervalos
+
+
+def ocupacion_de(payload, config, ventana=None):
+    """recolectar_ocupacion con el margen de la plantilla (si hay) ya aplicado a cada cita.
+    La ventana se amplía lo que alcance el margen, para no perder ocurrencias vecinas.
+    """
+    plantilla = config.get("plantilla")
+    return _con_margen(plantilla, recolectar_ocupacion(payload, _ampliada(ventana, plantilla)))
+
+
+def ocupacion_por_tramos(payload, config):
+    """Como ocupacion_de, para recorrer la ventana de a tramos sin expandir las series ni leer
+    el almacén en toda ella: (fijos, por_tramo). `fijos` no depende de los días recorridos;
+    por_tramo(desde, hasta) da las ocurrencias de las series y los eventos guardados en esos
+    días (None si no hay ni series ni almacén).
+    """
+    plantilla = config.get("plantilla")
+    fijos, series = extraer_ocupacion(payload)
+    fijos = _con_margen(plantilla, fijos)
+    if not series and not usa_almacen(payload):
+        return fijos, None
+
+    def por_tramo(desde, hasta):
+        ventana = _ampliada((desde, hasta), plantilla)
+        return _con_margen(plantilla, expandir_en_ventana(payload, series, ventana)
+                           + ocupacion_del_almacen(payload, ventana))
+
+    return fijos, por_tramo
+
+
+def disponibilidad_para_dias(dias_validos, config, citas_parsed, motor=None):
+    return list(iterar_disponibilidad(dias_validos, config, citas_parsed, motor))
+
+
+def _guardar_al_terminar(dias, cache, clave):
+    # Entrega los días a medida que salen y guarda el resultado completo al final
+    acumulado = []
+    for dia in dias:
+        acumulado.append(dia)
+        yield dia
+    cache.guardar(clave, acumulado)
+
+
+# Largo del primer tramo de días en que primeros_slots expande las series
+DIAS_PRIMER_TRAMO = 7
+
+
+def primeros_slots(hoy, config, citas_parsed, motor=None, por_tramo=None):
+    """Primeros `limite_slots` slots libres desde inicio_minimo (o el inicio de la ventana).
+    Los días válidos se recorren uno a uno y el cálculo se detiene al completar N, así que
+    el costo depende de N y no del tamaño de la ventana. Sólo se listan los días con slots.
+    Con `por_tramo` (ver ocupacion_por_tramos) las series y el almacén se leen a medida que
+    se avanza, en tramos de DIAS_PRIMER_TRAMO días que duplican su largo.
+    """
+    limite = config["limite_slots"]
+    minimo = config["inicio_minimo"]
+    inicio, max_dias = ventana_dias(hoy, config)
+    if minimo is not None and minimo.date() > inicio:
+        max_dias -= (minimo.date() - inicio).days
+        inicio = minimo.date()
+    dias = iterar_dias_validos(inicio, config["dias_semana"], max_dias)
+    if config["cantidad_dias"] is not None:
+        dias = islice(dias, max(0, config["cantidad_dias"]))
+
+    generar_slots, fusionar = generador_slots(config, motor)
+    ultimo = inicio + timedelta(days=max(0, max_dias - 1))
+    ocupacion = indexar_ocupacion(citas_parsed, rango=(inicio, ultimo), fusionar=fusionar)
+    hora_minima = minimo.strftime("%H:%M") if minimo is not None else None
+    resultado = []
+    fin_tramo = None
+    tramo = {}
+    largo = DIAS_PRIMER_TRAMO
+    for di in dias:
+        if por_tramo is not None and (fin_tramo is None or di > fin_tramo):
+            fin_tramo = min(di + timedelta(days=largo - 1), ultimo)
+            tramo = indexar_ocupacion(por_tramo(di, fin_tramo), rango=(di, fin_tramo), fusionar=fusionar)
+            largo *= 2
+        bloques = ocupacion.get(di, [])
+        if di in tramo:
+            bloques = fusionar_intervalos(bloques + tramo[di]) if fusionar else sorted(bloques + tramo[di])
+        slots = generar_slots(di, config["t_desde"], config["t_hasta"], config["slot_minutes"], bloques)
+        if hora_minima is not None and di == minimo.date():
+            slots = [s for s in slots if s["hora_inicio"] >= hora_minima]
+        if not slots:
+            continue
+        slots = slots[:limite]
+        resultado.append({"dia": di.isoformat(), "citas": slots})
+        limite -= len(slots)
+        if limite <= 0:
+            break
+    return resultado
+
+
+def _buscar_en_cache(cache, hoy, config, citas_parsed):
+    # (clave, resultado guardado o None)
+    with etapa("cache"):
+        # Con capacidad > 1 importan los solapamientos: la clave usa los intervalos sin fusionar
+        intervalos = fusionar_intervalos(citas_parsed) if config["capacidad"] <= 1 else sorted(citas_parsed)
+        # Con fecha_inicio explícita la respuesta no depende del día en que se pide
+        clave = clave_cache(config["fecha_inicio"] or hoy, config, intervalos)
+        resultado = cache.obtener(clave)
+    if resultado is not None:
+        contar("cache_aciertos")
+    return clave, resultado
+
+
+def disponibilidad_agente(payload, hoy, motor=None, dias_por_config=None, perezoso=False):
+    """Disponibilidad de una sola fuente de ocupación, pasando por la cache de resultados.
+    `dias_por_config` permite compartir la selección de días entre agentes de un lote.
+    Con `perezoso` retorna un iterador que calcula los días a medida que se consumen.
+    La ocupación se reúne sólo para los días que se responden: las series (RRULE) no se
+    expanden en todo el horizonte de búsqueda.
+    """
+    config = leer_configuracion(payload)
+
+    if config["limite_slots"] is not None:
+        citas_parsed, por_tramo = ocupacion_por_tramos(payload, config)
+        # Con series o almacén la clave necesitaría leerlos en todo el horizonte: no se cachea
+        cache = obtener_cache() if por_tramo is None else None
+        clave = None
+        if cache is not None:
+            clave, resultado = _buscar_en_cache(cache, hoy, config, citas_parsed)
+            if resultado is not None:
+                return resultado
+        with etapa("slots"):
+            resultado = primeros_slots(hoy, config, citas_parsed, motor, por_tramo)
+        if cache is not None:
+            cache.guardar(clave, resultado)
+        return resultado
+
+    with etapa("dias"):
+        if dias_por_config is None:
+            dias_validos = seleccionar_dias(hoy, config)
+        else:
+            llave_dias = (config["cantidad_dias"], frozenset(config["dias_semana"] or ()),
+                          config["fecha_inicio"], config["fecha_fin"])
+            dias_validos = dias_por_config.get(llave_dias)
+            if dias_validos is None:
+                dias_validos = dias_por_config[llave_dias] = seleccionar_dias(hoy, config)
+    contar("dias", len(dias_validos))
+    citas_parsed = ocupacion_de(payload, config, (dias_validos[0], dias_validos[-1]) if dias_validos else None)
+
+    cache = obtener_cache()
+    clave = None
+    if cache is not None:
+        clave, resultado = _buscar_en_cache(cache, hoy, config, citas_parsed)
+        if resultado is not None:
+            return resultado
+
+    if perezoso:
+        dias = iterar_disponibilidad(dias_validos, config, citas_parsed, motor)
+        return _guardar_al_terminar(dias, cache, clave) if cache is not None else dias
+
+    with etapa("slots"):
+        resultado = disponibilidad_para_dias(dias_validos, config, citas_parsed, motor)
+    if midiendo() is not None:
+        contar("slots", sum(len(d["citas"]) for d in resultado))
+    if cache is not None:
+        cache.guardar(clave, resultado)
+    return resultado
+
+
+def calcular_disponibilidad(payload, hoy=None, motor=None, perezoso=False):
+    """Calcula la disponibilidad para un payload ya decodificado.
+    `motor` (o payload["motor"]) elige el generador de slots: "intervalos" (por defecto)
+    o "bitmap" (ocupación por minuto, para lotes grandes); ver MOTORES.
+    Retorna la lista [{"dia": ..., "citas": [...]}, ...] ordenada por día; con
+    payload["agentes"] retorna {agente_id: lista} (ver lote.calcular_lote) y con
+    payload["asistentes"] sólo los slots libres en común (ver asistentes.calcular_comun).
+    Con payload["operacion"] actualiza el almacén de ocupación (ver almacen_ocupacion) y con
+    payload["propuestas"] verifica citas candidatas (ver conflictos.verificar_propuestas).
+    Con `perezoso`, para un solo agente la lista puede ser un iterador de días (formato ndjson).
+    """
+    payload = normalizar_payload(payload)
+
+    if hoy is None:
+        hoy = fecha_hoy() + timedelta(days=1)  # empezamos desde mañana
+    if motor is None and isinstance(payload, dict):
+        motor = payload.get("motor")
+
+    if isinstance(payload, dict) and payload.get("operacion") is not None:
+        from almacen_ocupacion import aplicar_operacion
+
+        return aplicar_operacion(payload)
+    if isinstance(payload, dict) and isinstance(payload.get("propuestas"), list):
+        from conflictos import verificar_propuestas
+
+        return verificar_propuestas(payload)
+    if isinstance(payload, dict) and isinstance(payload.get("agentes"), list):
+        from lote import calcular_lote
+
+        return calcular_lote(payload, hoy, motor)
+    if isinstance(payload, dict) and isinstance(payload.get("asistentes"), list):
+        from asistentes import calcular_comun
+
+        return calcular_comun(payload, hoy, motor)
+
+    return disponibilidad_agente(payload, hoy, motor, perezoso=perezoso)
+
+
+# Código de salida cuando el cuerpo recibido por stdin/fd no es válido (index.php responde 400)
+CODIGO_ERROR_CLIENTE = 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor de disponibilidad de citas")
+    parser.add_argument("payload", nargs="?",
+                        help="payload JSON como argumento; '-' lo lee desde stdin")
+    parser.add_argument("--stdin", action="store_true",
+                        help="leer el cuerpo (JSON o form-urlencoded) desde stdin")
+    parser.add_argument("--fd", type=int, default=None,
+                        help="leer el cuerpo desde este descriptor de archivo")
+    parser.add_argument("--motor", choices=sorted(MOTORES), default=None,
+                        help="generador de slots (por defecto el del payload o 'intervalos')")
+    parser.add_argument("--formato", choices=FORMATOS, default=None,
+                        help="formato de salida (por defecto el del payload o 'json'); ver formatos_salida")
+    parser.add_argument("--informar-formato", action="store_true",
+                        help="escribir primero una línea con el formato elegido (la usa index.php)")
+    parser.add_argument("--hoy", default=None,
+                        help="fecha de hoy (YYYY-MM-DD) para resultados reproducibles; también CITAS_HOY")
+    parser.add_argument("--metricas-fd", type=int, default=None,
+                        help="escribir la línea Server-Timing de esta ejecución en este descriptor (ver metricas)")
+    args = parser.parse_args()
+
+    medicion = iniciar_metricas(forzar=True) if args.metricas_fd is not None else None
+    if medicion is not None and os.environ.get("CITAS_T0"):
+        # index.php pasa el instante previo a proc_open: arranque = lanzar el intérprete + imports
+        try:
+            medicion.sumar("arranque", max(0.0, reloj.time() - float(os.environ["CITAS_T0"])))
+        except ValueError:
+            pass
+
+    # Con CITAS_COALESCER_DIR, ejecuciones simultáneas con el mismo cuerpo y opciones
+    # comparten una sola respuesta (ver coalescencia); el cuerpo se resume mientras se lee
+    directorio_coalescer = os.environ.get("CITAS_COALESCER_DIR")
+    lector = None
+    if args.stdin or args.fd is not None or args.payload == "-":
+        # Sin límite de ARG_MAX: el cuerpo llega por pipe y se lee en modo incremental
+        flujo = os.fdopen(args.fd, "rb") if args.fd is not None else sys.stdin.buffer
+        if directorio_coalescer:
+            from coalescencia import LectorConResumen
+
+            flujo = lector = LectorConResumen(flujo)
+        try:
+            with etapa("decodificacion"):
+                payload = decodificar_flujo(flujo)
+        except ValueError as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(CODIGO_ERROR_CLIENTE)
+    else:
+        if args.payload is None:
+            print(json.dumps({"error": "Se requiere al menos un argumento (payload JSON)"}))
+            return
+
+        # Parseo del JSON de entrada (puede traer 'citas' y/o 'filtro')
+        try:
+            with etapa("decodificacion"):
+                payload = json.loads(args.payload)
+        except Exception as e:
+            print(json.dumps({"error": f"Error al interpretar JSON: {str(e)}"}))
+            return
+
+    hoy = None
+    if args.hoy:
+        if parsear_fecha(args.hoy) is None:
+            parser.error(f"--hoy inválido: {args.hoy}")
+        hoy = parsear_fecha(args.hoy) + timedelta(days=1)
+    formato = args.formato or formato_de(payload)
+    if args.informar_formato:
+        # index.php decide streaming, Content-Type y ETag con esta línea: el formato se
+        # resuelve sólo aquí (--formato o "formato" del payload)
+        sys.stdout.write(formato + "\n")
+        sys.stdout.flush()
+    if directorio_coalescer and formato != "ndjson":
+        from coalescencia import clave_solicitud, coalescible, coalescer_entre_procesos
+
+        if coalescible(payload):
+            resumen = lector.resumen() if lector is not None else hashlib.sha256(args.payload.encode("utf-8")).hexdigest()
+            clave = clave_solicitud(resumen, formato, args.motor, hoy or fecha_hoy())
+
+            def calcular():
+                resultado = calcular_disponibilidad(payload, hoy=hoy, motor=args.motor)
+                with etapa("salida"):
+                    return "".join(fragmentos(resultado, formato, payload))
+
+            texto, compartido = coalescer_entre_procesos(directorio_coalescer, clave, calcular)
+            if compartido:
+                contar("coalescidas")
+            sys.stdout.write(texto + "\n")
+            sys.stdout.flush()
+            if medicion is not None:
+                contar("bytes_salida", len(texto.encode("utf-8")))
+                escribir_metricas(medicion, args.metricas_fd)
+            return
+
+    resultado = calcular_disponibilidad(payload, hoy=hoy, motor=args.motor, perezoso=formato == "ndjson")
+    with etapa("salida"):
+        for trozo in fragmentos(resultado, formato, payload):
+            sys.stdout.write(trozo)
+            if medicion is not None:
+                contar("bytes_salida", len(trozo.encode("utf-8")))
+            if formato == "ndjson":
+                sys.stdout.flush()
+        if formato != "ndjson":
+            sys.stdout.write("\n")
+        sys.stdout.flush()
+
+    if medicion is not None:
+        escribir_metricas(medicion, args.metricas_fd)
+
+
+def escribir_metricas(medicion, fd):
+    terminar_metricas(medicion)
+    try:
+        os.write(fd, (medicion.server_timing() + "\n").encode("utf-8"))
+    except OSError:
+        pass
 
 
 if __name__ == "__main__":
+    # lote, asistentes, formatos_salida... importan "main": que reutilicen este módulo en
+    # lugar de cargar main.py otra vez (doble import y estado duplicado)
+    sys.modules.setdefault("main", sys.modules[__name__])
     try:
-        main()
+        if os.environ.get("CITAS_PERFIL"):
+            # Perfil de toda la ejecución (ver perfilado); sólo se importa si se pide
+            from perfilado import modo_entorno, perfilar
+
+            with perfilar(modo_entorno()) as perfil:
+                main()
+            if perfil.segundos:
+                perfil.guardar(etiqueta="main")
+        else:
+            main()
     except Exception as e:
         print(json.dumps({
             "error": "Error inesperado en la ejecución",
@@ -0,0 +1,164 @@
+import os
+import threading
+import time as reloj
+
+# Instrumentación opcional por etapa. Con CITAS_METRICAS=1 cada solicitud registra la
+# duración de sus etapas (decodificacion, extraccion, fechas, dias, cache, slots, salida)
+# y algunos conteos (eventos, intervalos, dias, slots, bytes_salida). La medición vive en
+# el hilo que atiende la solicitud; sin ella, etapa() y contar() no hacen nada.
+#
+# Salidas:
+#   - cabecera Server-Timing (servidor.py) o línea por --metricas-fd (main.py / index.php)
+#   - GET /metrics en servidor.py: histogramas acumulados en formato de texto Prometheus
+#     (por proceso, igual que /estadisticas)
+
+ACTIVAS = os.environ.get("CITAS_METRICAS", "0") == "1"
+
+# Límites superiores (segundos) de los histogramas
+CUBETAS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Hilo(threading.local):
+    # Atributo de clase: leerlo sin medición activa no lanza AttributeError (mucho más barato)
+    medicion = None
+
+
+_local = _Hilo()
+
+
+class Medicion:
+    """Duraciones (segundos) y conteos de una solicitud."""
+
+    __slots__ = ("etapas", "conteos", "inicio")
+
+    def __init__(self):
+        self.etapas = {}
+        self.conteos = {}
+        self.inicio = reloj.perf_counter()
+
+    def sumar(self, nombre, segundos):
+        self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (duraciones en ms)."""
+        partes = [f"{k};dur={v * 1000:.2f}" for k, v in self.etapas.items()]
+        partes.extend(f"{k};desc={v}" for k, v in self.conteos.items())
+        return ", ".join(partes)
+
+
+class _Nula:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULA = _Nula()
+
+
+class _Etapa:
+    __slots__ = ("_medicion", "_nombre", "_t0")
+
+    def __init__(self, medicion, nombre):
+        self._medicion = medicion
+        self._nombre = nombre
+
+    def __enter__(self):
+        self._t0 = reloj.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._medicion.sumar(self._nombre, reloj.perf_counter() - self._t0)
+        return False
+
+
+def midiendo():
+    """Medición activa en este hilo (o None)."""
+    return _local.medicion
+
+
+def etapa(nombre):
+    """Context manager que suma la duración del bloque a la etapa `nombre`."""
+    medicion = _local.medicion
+    if medicion is None:
+        return _NULA
+    return _Etapa(medicion, nombre)
+
+
+def contar(nombre, n=1):
+    medicion = _local.medicion
+    if medicion is not None:
+        medicion.conteos[nombre] = medicion.conteos.get(nombre, 0) + n
+
+
+def iniciar(forzar=False):
+    """Abre la medición del hilo si las métricas están activas (o `forzar`)."""
+    if not (ACTIVAS or forzar):
+        return None
+    medicion = _local.medicion = Medicion()
+    return medicion
+
+
+def terminar(medicion):
+    """Cierra la medición del hilo, agrega el total y la acumula en los histogramas."""
+    _local.medicion = None
+    if medicion is None:
+        return None
+    medicion.etapas["total"] = reloj.perf_counter() - medicion.inicio
+    _ACUMULADO.registrar(medicion)
+    return medicion
+
+
+class Acumulado:
+    """Histogramas por etapa y contadores totales del proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.solicitudes = 0
+        self.histogramas = {}  # etapa -> [conteo por cubeta..., suma, total]
+        self.contadores = {}
+
+    def registrar(self, medicion):
+        with self._lock:
+            self.solicitudes += 1
+            for nombre, segundos in medicion.etapas.items():
+                h = self.histogramas.get(nombre)
+                if h is None:
+                    h = self.histogramas[nombre] = [0] * len(CUBETAS) + [0.0, 0]
+                for i, limite in enumerate(CUBETAS):
+                    if segundos <= limite:
+                        h[i] += 1
+                h[-2] += segundos
+                h[-1] += 1
+            for nombre, n in medicion.conteos.items():
+                self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def prometheus(self):
+        with self._lock:
+            lineas = [
+                "# HELP citas_solicitudes_total Solicitudes medidas",
+                "# TYPE citas_solicitudes_total counter",
+                f"citas_solicitudes_total {self.solicitudes}",
+                "# HELP citas_etapa_segundos Duración de cada etapa del cálculo",
+                "# TYPE citas_etapa_segundos histogram",
+            ]
+            for nombre in sorted(self.histogramas):
+                h = self.histogramas[nombre]
+                for i, limite in enumerate(CUBETAS):
+                    lineas.append(f'citas_etapa_segundos_bucket{{etapa="{nombre}",le="{limite}"}} {h[i]}')
+                lineas.append(f'citas_etapa_segundos_bucket{{etapa="{nombre}",le="+Inf"}} {h[-1]}')
+                lineas.append(f'citas_etapa_segundos_sum{{etapa="{nombre}"}} {h[-2]:.6f}')
+                lineas.append(f'citas_etapa_segundos_count{{etapa="{nombre}"}} {h[-1]}')
+            for nombre in sorted(self.contadores):
+                lineas.append(f"# TYPE citas_{nombre}_total counter")
+                lineas.append(f"citas_{nombre}_total {self.contadores[nombre]}")
+        return "\n".join(lineas) + "\n"
+
+
+_ACUMULADO = Acumulado()
+
+
+def exponer():
+    """Texto Prometheus con lo acumulado en este proceso."""
+    return _ACUMULADO.prometheus()
@@ -0,0 +1,70 @@
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa bytearray + accumulate
+    np = None
+
+# Motor alternativo de slots para trabajos por lotes (muchos agentes, ventanas largas):
+# la ocupación de cada día se rasteriza en celdas de un minuto y el estado libre/ocupado
+# de todos los slots se obtiene de una suma acumulada (ocupados = S[fin] - S[inicio]).
+# Produce exactamente los mismos slots que generar_slots_desde_bloques.
+
+_ETIQUETAS_HORA = [f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)]
+_UN_MINUTO = timedelta(minutes=1)
+
+
+def _minuto_piso(dt: datetime, base: datetime) -> int:
+    return (dt - base) // _UN_MINUTO
+
+
+def _minuto_techo(dt: datetime, base: datetime) -> int:
+    return -((base - dt) // _UN_MINUTO)
+
+
+def rasterizar(bloques, base: datetime, largo: int):
+    """Ocupación por minuto desde `base`: la celda m vale 1 si algún bloque toca
+    [m, m+1). Con piso/techo por minuto, un slot de minutos enteros [s, e) se cruza con
+    un bloque exactamente cuando alguna de sus celdas está ocupada (también con segundos).
+    """
+    ocupacion = bytearray(largo)
+    for ci, cf in bloques:
+        a = max(0, _minuto_piso(ci, base))
+        b = min(largo, _minuto_techo(cf, base))
+        if a < b:
+            ocupacion[a:b] = b"\x01" * (b - a)
+    return ocupacion
+
+
+def generar_slots_bitmap(d, t_desde: time, t_hasta: time, slot_minutes: int, bloques):
+    # Regla: sábados (weekday==5) solo hasta las 13:00, incluso si el horario/jornada define mayor rango
+    cap_sabado = time(13, 0, 0)
+    t_hasta_real = t_hasta
+    if d.weekday() == 5 and (t_hasta > cap_sabado):
+        t_hasta_real = cap_sabado
+
+    base = datetime.combine(d, time(0, 0, 0))
+    inicio = _minuto_piso(datetime.combine(d, t_desde), base)
+    fin = _minuto_techo(datetime.combine(d, t_hasta_real), base)
+    if fin <= inicio:
+        return []
+
+    paso = max(1, int(slot_minutes))
+    inicios = range(inicio, fin, paso)
+    largo = inicios[-1] + paso  # el último slot puede pasar del fin de jornada (e incluso de medianoche)
+    ocupacion = rasterizar(bloques, base, largo)
+
+    if np is not None:
+        acumulado = np.concatenate(([0], np.cumsum(np.frombuffer(ocupacion, dtype=np.uint8), dtype=np.int64)))
+        ini = np.arange(inicio, fin, paso)
+        libres = ini[(acumulado[ini + paso] - acumulado[ini]) == 0].tolist()
+    else:
+        acumulado = list(accumulate(ocupacion, initial=0))
+        libres = [s for s in inicios if acumulado[s + paso] == acumulado[s]]
+
+    etiquetas = _ETIQUETAS_HORA
+    return [
+        {"hora_inicio": etiquetas[s % 1440], "hora_fin": etiquetas[(s + paso) % 1440]}
+        for s in libres
+    ]
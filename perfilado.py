@@ -0,0 +1,190 @@
+import argparse
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time as reloj
+import tracemalloc
+from contextlib import contextmanager
+
+# Perfilado opcional de solicitudes individuales (cProfile y/o tracemalloc) para reproducir
+# payloads patológicos (calendarios enormes, minutos muy pequeños).
+#
+# Variables de entorno:
+#   CITAS_PERFIL=cprofile|tracemalloc|ambos   perfila todas las solicitudes (main.py y servidor.py)
+#   CITAS_PERFIL_DIR=/tmp/citas_perfiles      dónde se escriben los resultados
+#   CITAS_PERFIL_TOKEN=secreto                habilita el encabezado X-Citas-Perfil; la solicitud
+#                                             debe traer el mismo valor en X-Citas-Perfil-Token
+#   CITAS_PERFIL_CONFIABLES=127.0.0.1,::1     además, IPs cuyo encabezado se respeta (detrás de
+#                                             un proxy todas llegan como 127.0.0.1: por eso el token)
+#
+# Por solicitud se escribe <marca>.prof (pstats, para snakeviz/pstats) y <marca>.txt con las
+# funciones más costosas y los sitios que más memoria asignaron.
+#
+# Uso offline con un payload guardado:
+#   python3 perfilado.py payload.json --orden cumulative --lineas 30 [--tracemalloc]
+
+MODOS = ("cprofile", "tracemalloc", "ambos")
+
+ENCABEZADO = "X-Citas-Perfil"
+
+ENCABEZADO_TOKEN = "X-Citas-Perfil-Token"
+
+# Sin token configurado el perfilado por solicitud queda deshabilitado
+TOKEN = os.environ.get("CITAS_PERFIL_TOKEN", "")
+
+DIRECTORIO = os.environ.get("CITAS_PERFIL_DIR", os.path.join("/tmp", "citas_perfiles"))
+
+CONFIABLES = frozenset(
+    ip.strip() for ip in os.environ.get("CITAS_PERFIL_CONFIABLES", "127.0.0.1,::1").split(",") if ip.strip()
+)
+
+# tracemalloc es global al proceso: una sola solicitud a la vez lo usa
+_TRACEMALLOC = threading.Lock()
+_SECUENCIA = itertools.count(1)
+
+
+def normalizar_modo(valor):
+    if not valor or valor == "0":
+        return None
+    valor = str(valor).strip().lower()
+    if valor in ("1", "si", "true"):
+        return "ambos"
+    return valor if valor in MODOS else None
+
+
+def modo_entorno():
+    return normalizar_modo(os.environ.get("CITAS_PERFIL"))
+
+
+def token_valido(token):
+    if not TOKEN or not token:
+        return False
+    return hmac.compare_digest(str(token).encode("utf-8"), TOKEN.encode("utf-8"))
+
+
+def modo_solicitud(encabezado, ip_cliente, token=None):
+    """Modo pedido por X-Citas-Perfil, sólo con el token de CITAS_PERFIL_TOKEN y desde una IP
+    confiable; si no, el del entorno.
+    """
+    if encabezado and ip_cliente in CONFIABLES and token_valido(token):
+        return normalizar_modo(encabezado) or modo_entorno()
+    return modo_entorno()
+
+
+def _texto_cprofile(perfil, orden, lineas):
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).sort_stats(orden).print_stats(lineas)
+    return salida.getvalue()
+
+
+def _texto_tracemalloc(instantanea, lineas):
+    estadisticas = instantanea.statistics("lineno")
+    total = sum(s.size for s in estadisticas)
+    filas = [f"Asignado al final: {total / 1024:.1f} KiB en {len(estadisticas)} sitios"]
+    filas.extend(str(s) for s in estadisticas[:lineas])
+    return "\n".join(filas) + "\n"
+
+
+class Perfil:
+    """Resultado de una ejecución perfilada."""
+
+    def __init__(self):
+        self.cprofile = None
+        self.instantanea = None
+        self.pico = None
+        self.segundos = 0.0
+
+    def texto(self, orden="cumulative", lineas=30):
+        partes = [f"Duración: {self.segundos * 1000:.1f} ms"]
+        if self.pico is not None:
+            partes.append(f"Pico de memoria (tracemalloc): {self.pico / 1e6:.2f} MB")
+        if self.cprofile is not None:
+            partes.append(_texto_cprofile(self.cprofile, orden, lineas))
+        if self.instantanea is not None:
+            partes.append(_texto_tracemalloc(self.instantanea, lineas))
+        return "\n".join(partes)
+
+    def guardar(self, directorio=DIRECTORIO, etiqueta="solicitud"):
+        """Escribe <marca>.prof y <marca>.txt en `directorio`; retorna la ruta base."""
+        os.makedirs(directorio, exist_ok=True)
+        marca = f"{reloj.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_SECUENCIA)}-{etiqueta}"
+        base = os.path.join(directorio, marca)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(base + ".prof")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(self.texto())
+        return base
+
+
+@contextmanager
+def perfilar(modo):
+    """Ejecuta el bloque bajo cProfile y/o tracemalloc según `modo` y entrega un Perfil
+    (vacío si `modo` es None). Si otra solicitud ya usa tracemalloc, se omite en esta.
+    """
+    perfil = Perfil()
+    if modo is None:
+        yield perfil
+        return
+    usar_cprofile = modo in ("cprofile", "ambos")
+    usar_tracemalloc = modo in ("tracemalloc", "ambos") and _TRACEMALLOC.acquire(blocking=False)
+    try:
+        if usar_tracemalloc:
+            tracemalloc.start(25)
+        if usar_cprofile:
+            perfil.cprofile = cProfile.Profile()
+            perfil.cprofile.enable()
+        t0 = reloj.perf_counter()
+        try:
+            yield perfil
+        finally:
+            perfil.segundos = reloj.perf_counter() - t0
+            if usar_cprofile:
+                perfil.cprofile.disable()
+            if usar_tracemalloc:
+                perfil.instantanea = tracemalloc.take_snapshot()
+                perfil.pico = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    finally:
+        if usar_tracemalloc:
+            _TRACEMALLOC.release()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Perfila el cálculo completo para un payload guardado")
+    parser.add_argument("payload", help="archivo con el cuerpo (JSON o form-urlencoded)")
+    parser.add_argument("--orden", default="cumulative", help="criterio de pstats (cumulative, tottime, calls...)")
+    parser.add_argument("--lineas", type=int, default=30)
+    parser.add_argument("--tracemalloc", action="store_true", help="también sitios de asignación de memoria")
+    parser.add_argument("--motor", default=None)
+    parser.add_argument("--hoy", default=None, help="fecha de hoy (YYYY-MM-DD)")
+    parser.add_argument("--guardar", default=None, help="directorio donde dejar .prof y .txt")
+    args = parser.parse_args(argv[1:])
+
+    os.environ.setdefault("CITAS_CACHE", "0")
+    from datetime import timedelta
+
+    from formatos_salida import formato_de, fragmentos
+    from main import calcular_disponibilidad, decodificar_flujo, parsear_fecha
+
+    hoy = parsear_fecha(args.hoy) + timedelta(days=1) if args.hoy else None
+    bytes_salida = 0
+    with perfilar("ambos" if args.tracemalloc else "cprofile") as perfil:
+        with open(args.payload, "rb") as f:
+            payload = decodificar_flujo(f)
+        formato = formato_de(payload)
+        resultado = calcular_disponibilidad(payload, hoy=hoy, motor=args.motor, perezoso=formato == "ndjson")
+        for trozo in fragmentos(resultado, formato, payload):
+            bytes_salida += len(trozo)
+    print(f"Salida: {bytes_salida} caracteres")
+    print(perfil.texto(args.orden, args.lineas))
+    if args.guardar:
+        print(f"Guardado en {perfil.guardar(args.guardar, 'cli')}.*", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
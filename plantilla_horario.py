@@ -0,0 +1,273 @@
+import json
+import os
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+from main import SPANISH_DAY_TO_WEEKDAY, fusionar_intervalos, normalizar_dia_es
+
+# Plantillas de horario por día de la semana: varias franjas por día, descansos y margen
+# alrededor de cada cita existente. Reemplaza a horario/jornada (y al tope de sábado a las
+# 13:00, que la plantilla define explícitamente) cuando viene "filtro.plantilla":
+#
+#   "plantilla": {
+#     "horario": {"lunes": ["08:00-12:00", "14:00-18:00"], "sabado": "08:00-12:00",
+#                 "todos": ["08:00-17:00"]},          # "todos": días de semana no listados
+#     "descansos": ["12:30-13:30"],                    # o {"viernes": [...], "todos": [...]}
+#     "margen": 10                                     # o {"antes": 10, "despues": 5}
+#   }
+#   "plantilla": "consultorio"                         # nombre en CITAS_PLANTILLAS (archivo JSON)
+#
+# Una franja es "HH:MM-HH:MM", ["HH:MM", "HH:MM"] o {"desde", "hasta"} ("24:00" cierra el
+# día). La plantilla se compila una vez por (definición, minutos) y queda en memoria del
+# proceso: por día de la semana, las franjas menos los descansos (minutos desde medianoche)
+# y la grilla de slots con sus etiquetas. Un slot se ofrece sólo si cabe entero en una
+# franja. Para cada día, los libres salen de restar la ocupación (con margen) a las
+# franjas; los slots son los de la grilla contenidos en algún tramo libre.
+
+ARCHIVO_PLANTILLAS = os.environ.get("CITAS_PLANTILLAS")
+
+# Plantillas compiladas que se conservan (LRU por proceso)
+MAX_COMPILADAS = int(os.environ.get("CITAS_PLANTILLAS_MAX", "256"))
+
+_UN_MINUTO = timedelta(minutes=1)
+
+_NOMBRADAS = None
+
+
+def _etiqueta(m):
+    return f"{m // 60 % 24:02d}:{m % 60:02d}"
+
+
+def minuto_de(valor):
+    """"HH:MM" -> minutos desde medianoche (0..1440) o None."""
+    try:
+        h, m = [int(x) for x in str(valor).strip().split(":", 1)]
+    except (TypeError, ValueError):
+        return None
+    total = h * 60 + m
+    return total if 0 <= m < 60 and 0 <= total <= 1440 else None
+
+
+def leer_franja(valor):
+    """Franja en cualquiera de sus formas -> (desde, hasta) en minutos, o None."""
+    if isinstance(valor, str):
+        partes = valor.split("-", 1)
+    elif isinstance(valor, (list, tuple)) and len(valor) == 2:
+        partes = valor
+    elif isinstance(valor, dict):
+        partes = (valor.get("desde"), valor.get("hasta"))
+    else:
+        return None
+    if len(partes) != 2:
+        return None
+    a, b = minuto_de(partes[0]), minuto_de(partes[1])
+    if a is None or b is None or b <= a:
+        return None
+    return a, b
+
+
+def leer_franjas(valor):
+    # Una franja suelta o una lista de franjas
+    if valor is None:
+        return []
+    if isinstance(valor, (str, dict)) or (isinstance(valor, (list, tuple)) and len(valor) == 2
+                                          and all(isinstance(v, str) and "-" not in v for v in valor)):
+        valor = [valor]
+    if not isinstance(valor, (list, tuple)):
+        return []
+    return fusionar_intervalos(f for f in (leer_franja(v) for v in valor) if f is not None)
+
+
+def por_dia_semana(valor):
+    """{weekday: [(desde, hasta), ...]} desde un dict por nombre de día ("todos" completa los
+    días no listados) o una lista/franja que vale para todos los días.
+    """
+    if not isinstance(valor, dict) or leer_franja(valor) is not None:
+        franjas = leer_franjas(valor)
+        return {wd: franjas for wd in range(7)}
+    todos = None
+    dias = {}
+    for nombre, franjas in valor.items():
+        clave = normalizar_dia_es(str(nombre))
+        if clave in ("todos", "todo"):
+            todos = leer_franjas(franjas)
+        elif clave in SPANISH_DAY_TO_WEEKDAY:
+            dias[SPANISH_DAY_TO_WEEKDAY[clave]] = leer_franjas(franjas)
+    return {wd: dias.get(wd, todos or []) for wd in range(7)}
+
+
+def restar_intervalos(base, quitar):
+    """base - quitar; ambas listas ordenadas (base disjunta). Retorna los tramos que quedan."""
+    resultado = []
+    j = 0
+    n = len(quitar)
+    for a, b in base:
+        # Lo que termina antes de este tramo ya no afecta a los siguientes
+        while j < n and quitar[j][1] <= a:
+            j += 1
+        k = j
+        while k < n and quitar[k][0] < b:
+            qa, qb = quitar[k]
+            if qa > a:
+                resultado.append((a, qa))
+            if qb > a:
+                a = qb
+            if a >= b:
+                break
+            k += 1
+        if a < b:
+            resultado.append((a, b))
+    return resultado
+
+
+def _leer_margen(valor):
+    if isinstance(valor, dict):
+        antes, despues = valor.get("antes", 0), valor.get("despues", 0)
+    else:
+        antes = despues = valor
+    try:
+        return max(0, int(antes or 0)), max(0, int(despues or 0))
+    except (TypeError, ValueError):
+        return 0, 0
+
+
+class PlantillaHorario:
+    """Plantilla compilada: franjas libres de descansos y grilla de slots por weekday."""
+
+    def __init__(self, definicion, slot_minutes, clave):
+        self.clave = clave
+        self.paso = paso = max(1, int(slot_minutes))
+        horario = por_dia_semana(definicion.get("horario"))
+        descansos = por_dia_semana(definicion.get("descansos"))
+        self.margen_antes, self.margen_despues = _leer_margen(definicion.get("margen"))
+        self.franjas = []
+        self.inicios = []
+        self.fines = []
+        self.etiquetas = []
+        for wd in range(7):
+            franjas = restar_intervalos(horario[wd], descansos[wd])
+            inicios = [s for a, b in franjas for s in range(a, b - paso + 1, paso)]
+            self.franjas.append(franjas)
+            self.inicios.append(inicios)
+            self.fines.append([s + paso for s in inicios])
+            self.etiquetas.append([(_etiqueta(s), _etiqueta(s + paso)) for s in inicios])
+        self.dias_semana = frozenset(wd for wd in range(7) if self.inicios[wd])
+
+    def __repr__(self):
+        # Entra en la clave de la cache de resultados (ver cache_resultados.clave_cache)
+        return f"PlantillaHorario({self.clave}, {self.paso})"
+
+    def con_margen(self, citas_parsed):
+        """Intervalos ocupados extendidos por el margen antes y después de cada cita."""
+        if not self.margen_antes and not self.margen_despues:
+            return citas_parsed
+        antes = timedelta(minutes=self.margen_antes)
+        despues = timedelta(minutes=self.margen_despues)
+        return [(ci - antes, cf + despues) for ci, cf in citas_parsed]
+
+    def dias_extra(self):
+        """Días que el margen puede alcanzar fuera de la ventana consultada."""
+        return -(-max(self.margen_antes, self.margen_despues) // 1440)
+
+    def grilla(self, d):
+        """Slots candidatos del día como (inicio, fin) datetime, igual que main.grilla_slots."""
+        base = datetime.combine(d, time(0, 0))
+        wd = d.weekday()
+        return [(base + s * _UN_MINUTO, base + e * _UN_MINUTO) for s, e in zip(self.inicios[wd], self.fines[wd])]
+
+    def contiene(self, inicio, fin):
+        """True si [inicio, fin) cae entero dentro de una franja de su día."""
+        base = datetime.combine(inicio.date(), time(0, 0))
+        a = (inicio - base) / _UN_MINUTO
+        b = (fin - base) / _UN_MINUTO
+        return any(fa <= a and b <= fb for fa, fb in self.franjas[inicio.weekday()])
+
+    def libres(self, d, bloques):
+        """Tramos libres del día (minutos desde medianoche): franjas menos `bloques`, que
+        son datetime ordenados y disjuntos. Cada bloque se redondea hacia afuera al minuto:
+        un slot de minutos enteros se cruza con él exactamente cuando se cruzaba antes.
+        """
+        franjas = self.franjas[d.weekday()]
+        if not bloques:
+            return franjas
+        base = datetime.combine(d, time(0, 0))
+        quitar = [((ci - base) // _UN_MINUTO, -((base - cf) // _UN_MINUTO)) for ci, cf in bloques]
+        return restar_intervalos(franjas, fusionar_intervalos(quitar))
+
+    def generar_slots(self, d, t_desde, t_hasta, slot_minutes, bloques, capacidad=1):
+        """Misma firma que los motores de main.MOTORES (t_desde, t_hasta y slot_minutes ya
+        están en la plantilla). Con capacidad > 1, `bloques` son los eventos sin fusionar y
+        se restan los tramos con `capacidad` citas simultáneas o más.
+        """
+        wd = d.weekday()
+        inicios = self.inicios[wd]
+        if not inicios:
+            return []
+        if capacidad > 1:
+            bloques = tramos_llenos(bloques, capacidad)
+        fines = self.fines[wd]
+        etiquetas = self.etiquetas[wd]
+        n = len(inicios)
+        slots = []
+        for a, b in self.libres(d, bloques):
+            i = bisect_left(inicios, a)
+            while i < n and fines[i] <= b:
+                hora_inicio, hora_fin = etiquetas[i]
+                slots.append({"hora_inicio": hora_inicio, "hora_fin": hora_fin})
+                i += 1
+        return slots
+
+
+def tramos_llenos(eventos, capacidad):
+    """Tramos [inicio, fin) con al menos `capacidad` eventos simultáneos, con el mismo barrido
+    que main.maximo_solapamiento (a igual instante, los fines antes que los inicios).
+    """
+    bordes = sorted([(ci, 1) for ci, _ in eventos] + [(cf, -1) for _, cf in eventos])
+    tramos = []
+    activos = 0
+    desde = None
+    for t, delta in bordes:
+        activos += delta
+        if activos >= capacidad and desde is None:
+            desde = t
+        elif activos < capacidad and desde is not None:
+            if t > desde:
+                tramos.append((desde, t))
+            desde = None
+    return tramos
+
+
+@lru_cache(maxsize=MAX_COMPILADAS)
+def _compilar(clave, slot_minutes):
+    return PlantillaHorario(json.loads(clave), slot_minutes, clave)
+
+
+def plantillas_nombradas():
+    """Plantillas de CITAS_PLANTILLAS ({"nombre": definición, ...}); se lee una vez."""
+    global _NOMBRADAS
+    if _NOMBRADAS is None:
+        _NOMBRADAS = {}
+        if ARCHIVO_PLANTILLAS:
+            try:
+                with open(ARCHIVO_PLANTILLAS, "r", encoding="utf-8") as f:
+                    datos = json.load(f)
+                if isinstance(datos, dict):
+                    _NOMBRADAS = datos
+            except (OSError, ValueError):
+                pass
+    return _NOMBRADAS
+
+
+def compilar_plantilla(definicion, slot_minutes):
+    """Plantilla compilada (compartida entre solicitudes) o None si no define franjas."""
+    if isinstance(definicion, str):
+        definicion = plantillas_nombradas().get(definicion)
+    if not isinstance(definicion, dict):
+        return None
+    try:
+        clave = json.dumps(definicion, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+    plantilla = _compilar(clave, max(1, int(slot_minutes)))
+    return plantilla if plantilla.dias_semana else None
@@ -0,0 +1,216 @@
+from datetime import date, datetime, time, timedelta
+
+from main import parsear_fecha, parsear_intervalo
+
+# Expansión perezosa de eventos recurrentes de Bitrix (RRULE / EXDATE / RECURRENCE_ID).
+# En lugar de subir cada ocurrencia como evento concreto, el calendario trae la serie una
+# vez y aquí se generan sólo las ocurrencias que tocan la ventana consultada: el costo
+# depende de los días de la ventana y no del largo de la serie (DAILY y WEEKLY saltan
+# directo al primer periodo de la ventana; MONTHLY y YEARLY avanzan de a un mes/año).
+#
+# RRULE llega como texto iCal ("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20261231") o como
+# el dict de la API REST ({"FREQ": "WEEKLY", "BYDAY": {"MO": "MO"}, "UNTIL": "31.12.2026"}).
+# Se soportan FREQ DAILY/WEEKLY/MONTHLY/YEARLY con INTERVAL, BYDAY (días de la semana; un
+# ordinal como "1MO" se ignora), COUNT y UNTIL (fecha inclusiva). EXDATE excluye fechas
+# ("29.09.2025;06.10.2025" o lista). Una instancia modificada es un evento concreto con
+# RECURRENCE_ID = ID de la serie y ORIGINAL_DATE_FROM = la ocurrencia que reemplaza, que
+# deja de generarse.
+
+FRECUENCIAS = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+
+DIAS_ICAL = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+
+# Valores con los que Bitrix marca "sin serie" en RECURRENCE_ID
+SIN_SERIE = (None, "", "null", 0, "0")
+
+
+def parsear_dia(valor):
+    """Fecha de UNTIL/EXDATE/ORIGINAL_DATE_FROM: "dd.mm.YYYY", "dd/mm/YYYY", "YYYY-MM-DD" o
+    "YYYYMMDD[THHMMSSZ]", con o sin hora. Retorna date o None.
+    """
+    if isinstance(valor, date):
+        return valor.date() if isinstance(valor, datetime) else valor
+    if not isinstance(valor, str):
+        return None
+    s = valor.strip().split(" ", 1)[0]
+    if len(s) >= 8 and s[:8].isdigit():
+        try:
+            return date(int(s[:4]), int(s[4:6]), int(s[6:8]))
+        except ValueError:
+            return None
+    return parsear_fecha(s.replace(".", "/"))
+
+
+def _valores(campo):
+    # BYDAY/EXDATE: "MO,WE", "a;b", ["MO", "WE"] o {"MO": "MO", ...}
+    if isinstance(campo, dict):
+        return [str(v) for v in campo.values()]
+    if isinstance(campo, (list, tuple)):
+        return [str(v) for v in campo]
+    if isinstance(campo, str):
+        return [v.strip() for v in campo.replace(";", ",").split(",") if v.strip()]
+    return []
+
+
+def leer_regla(rrule):
+    """RRULE (texto o dict) -> {"freq", "intervalo", "dias", "conteo", "hasta"}; None si no se entiende."""
+    if isinstance(rrule, str):
+        partes = {}
+        texto = rrule.strip()
+        if texto.startswith("RRULE:"):
+            texto = texto[len("RRULE:"):]
+        for parte in texto.split(";"):
+            k, sep, v = parte.partition("=")
+            if sep:
+                partes[k.strip().upper()] = v.strip()
+    elif isinstance(rrule, dict):
+        # "~UNTIL" y similares son versiones para mostrar
+        partes = {str(k).upper(): v for k, v in rrule.items() if not str(k).startswith("~")}
+    else:
+        return None
+    freq = str(partes.get("FREQ") or "").upper()
+    if freq not in FRECUENCIAS:
+        return None
+    try:
+        intervalo = max(1, int(partes.get("INTERVAL") or 1))
+        conteo = int(partes["COUNT"]) if partes.get("COUNT") not in (None, "", 0, "0") else None
+    except (TypeError, ValueError):
+        return None
+    dias = sorted({DIAS_ICAL[d[-2:].upper()] for d in _valores(partes.get("BYDAY")) if d[-2:].upper() in DIAS_ICAL})
+    return {
+        "freq": freq,
+        "intervalo": intervalo,
+        "dias": dias,
+        "conteo": conteo,
+        "hasta": parsear_dia(partes.get("UNTIL")),
+    }
+
+
+def _diarias(d0, k, bajo, tope):
+    n = max(0, -(-(bajo - d0).days // k))
+    d = d0 + timedelta(days=n * k)
+    while d <= tope:
+        yield n, d
+        n += 1
+        d += timedelta(days=k)
+
+
+def _semanales(d0, k, dias, bajo, tope):
+    # Semanas desde el lunes de DTSTART (WKST=MO); en la primera sólo cuentan los días >= DTSTART
+    lunes0 = d0 - timedelta(days=d0.weekday())
+    primera = sum(1 for wd in dias if wd >= d0.weekday())
+    w = max(0, (bajo - lunes0).days // 7)
+    w = -(-w // k) * k
+    while lunes0 + timedelta(days=7 * w) <= tope:
+        n = 0 if w == 0 else primera + (w // k - 1) * len(dias)
+        for wd in dias:
+            if w == 0 and wd < d0.weekday():
+                continue
+            yield n, lunes0 + timedelta(days=7 * w + wd)
+            n += 1
+        w += k
+
+
+def _filtradas_por_dia(d0, k, dias, tope):
+    # DAILY con BYDAY e INTERVAL > 1: se recorre desde el inicio para numerar bien COUNT.
+    # Puede no coincidir nunca (INTERVAL=7;BYDAY=TU desde un lunes): el tope corta el recorrido
+    n = 0
+    d = d0
+    while d <= tope:
+        if d.weekday() in dias:
+            yield n, d
+            n += 1
+        d += timedelta(days=k)
+
+
+def _mensuales(d0, k, tope, meses_por_paso=1):
+    # Meses (o años) sin ese día (31, 29/02) se saltan y no cuentan, como en RFC 5545.
+    # Se corta al pasar el año del tope (con INTERVAL enorme, el primer salto ya lo pasa)
+    n = 0
+    m = 0
+    while True:
+        total = d0.month - 1 + m * k * meses_por_paso
+        anio = d0.year + total // 12
+        if anio > tope.year:
+            return
+        try:
+            d = date(anio, total % 12 + 1, d0.day)
+        except ValueError:
+            d = None
+        if d is not None:
+            yield n, d
+            n += 1
+        m += 1
+
+
+def fechas_serie(d0, regla, bajo, tope):
+    """(número de ocurrencia, fecha) en orden creciente hasta `tope`; salta directo a `bajo`
+    cuando se puede.
+    """
+    k = regla["intervalo"]
+    dias = regla["dias"]
+    if regla["freq"] == "DAILY":
+        if not dias:
+            return _diarias(d0, k, bajo, tope)
+        if k == 1:
+            return _semanales(d0, 1, dias, bajo, tope)
+        return _filtradas_por_dia(d0, k, set(dias), tope)
+    if regla["freq"] == "WEEKLY":
+        return _semanales(d0, k, dias or [d0.weekday()], bajo, tope)
+    return _mensuales(d0, k, tope, 12 if regla["freq"] == "YEARLY" else 1)
+
+
+def expandir_serie(inicio, fin, regla, excluidas, desde, hasta):
+    """Ocurrencias (inicio, fin) de la serie que se cruzan con los días [desde, hasta]."""
+    duracion = fin - inicio
+    hora = inicio.time()
+    # Una ocurrencia que empieza antes de `bajo` no alcanza a tocar `desde`
+    bajo = desde - timedelta(days=duracion.days + 1)
+    tope = hasta if regla["hasta"] is None else min(hasta, regla["hasta"])
+    limite = datetime.combine(desde, time(0, 0))
+    conteo = regla["conteo"]
+    for n, d in fechas_serie(inicio.date(), regla, bajo, tope):
+        if d > tope or (conteo is not None and n >= conteo):
+            return
+        if d < bajo or d in excluidas:
+            continue
+        ci = datetime.combine(d, hora)
+        cf = ci + duracion
+        if cf > limite:
+            yield ci, cf
+
+
+def expandir_series(eventos, ventana=None, usar_ts=None):
+    """Intervalos de los eventos con RRULE dentro de `ventana` = (primer día, último día).
+    `eventos` también trae las instancias modificadas (RECURRENCE_ID), que sólo aportan la
+    ocurrencia original a excluir: su propio intervalo se parsea como un evento más.
+    Sin ventana, cada serie aporta sólo su primera ocurrencia (DATE_FROM/DATE_TO).
+    """
+    reemplazadas = {}
+    for ev in eventos:
+        serie = ev.get("RECURRENCE_ID")
+        if serie not in SIN_SERIE:
+            original = parsear_dia(ev.get("ORIGINAL_DATE_FROM"))
+            if original is not None:
+                reemplazadas.setdefault(str(serie), set()).add(original)
+
+    intervalos = []
+    for ev in eventos:
+        if not ev.get("RRULE"):
+            continue
+        base = parsear_intervalo(ev, usar_ts)
+        if base is None:
+            continue
+        excluidas = {d for d in (parsear_dia(v) for v in _valores(ev.get("EXDATE"))) if d is not None}
+        excluidas |= reemplazadas.get(str(ev.get("ID")), set())
+        regla = leer_regla(ev["RRULE"])
+        if regla is None or ventana is None:
+            if base[0].date() not in excluidas:
+                intervalos.append(base)
+            continue
+        try:
+            intervalos.extend(expandir_serie(base[0], base[1], regla, excluidas, ventana[0], ventana[1]))
+        except (ValueError, OverflowError):
+            # Una regla que no se puede expandir descarta sólo ese evento, no la solicitud
+            continue
+    return intervalos
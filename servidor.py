@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+import signal
+import sys
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from almacen_ocupacion import obtener_almacen
+from cache_http import (
+    ETAG_ACTIVO,
+    GZIP_ACTIVO,
+    UMBRAL_GZIP,
+    acepta_gzip,
+    coincide,
+    comprimir,
+    etag_de,
+    etag_gzip,
+    obtener_cache_http,
+)
+from cache_resultados import obtener_cache, usar_memoria
+from calendario_habil import obtener_tabla
+from coalescencia import LectorConResumen, clave_solicitud, coalescible, obtener_coalescedor
+from formatos_salida import FORMATOS, TIPOS_CONTENIDO, formato_de, fragmentos
+from lote import iniciar_pool
+from main import calcular_disponibilidad, decodificar_cuerpo, decodificar_flujo
+import metricas
+import perfilado
+
+# Servidor HTTP persistente: mismo contrato que index.php (POST /) pero sin lanzar
+# un intérprete por solicitud. La tabla de días hábiles y los módulos quedan calientes.
+
+RUTAS_VALIDAS = ("/", "/index.php")
+
+# Lectura incremental del cuerpo JSON (ver lector_flujo); CITAS_LECTURA_FLUJO=0 la desactiva
+LECTURA_FLUJO = os.environ.get("CITAS_LECTURA_FLUJO", "1") != "0"
+
+
+class ManejadorCitas(BaseHTTPRequestHandler):
+    server_version = "CitasServidor/1.0"
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo salen en dos escrituras: con Nagle, en conexiones keep-alive la
+    # segunda espera el ACK retardado del cliente (~40 ms por respuesta)
+    disable_nagle_algorithm = True
+
+    def _cabeceras_cors(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers",
+                         "Content-Type, Authorization, X-Requested-With, If-None-Match")
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+
+    def _comprimir(self, largo):
+        return GZIP_ACTIVO and largo >= UMBRAL_GZIP and acepta_gzip(self.headers.get("Accept-Encoding"))
+
+    def _responder(self, status, cuerpo, tipo="application/json", medicion=None, etag=None):
+        datos = cuerpo.encode("utf-8")
+        largo = len(datos)
+        comprimido = self._comprimir(largo)
+        if comprimido:
+            datos = comprimir(datos)
+            obtener_cache_http().registrar_gzip(largo, len(datos))
+        self.send_response(status)
+        self._cabeceras_cors()
+        if medicion is not None:
+            metricas.contar("bytes_salida", len(datos))
+            metricas.terminar(medicion)
+            self.send_header("Server-Timing", medicion.server_timing())
+        self.send_header("Content-Type", tipo)
+        if GZIP_ACTIVO and largo >= UMBRAL_GZIP:
+            self.send_header("Vary", "Accept-Encoding")
+        if comprimido:
+            self.send_header("Content-Encoding", "gzip")
+        if etag is not None:
+            self.send_header("ETag", etag_gzip(etag) if comprimido else etag)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _no_modificado(self, etag, largo, medicion=None, sin_calculo=False):
+        # 304 sin cuerpo, con el ETag de la representación que se habría enviado
+        obtener_cache_http().registrar_304(sin_calculo)
+        self.send_response(304)
+        self._cabeceras_cors()
+        if medicion is not None:
+            metricas.contar("no_modificadas")
+            metricas.terminar(medicion)
+            self.send_header("Server-Timing", medicion.server_timing())
+        if GZIP_ACTIVO and largo >= UMBRAL_GZIP:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag_gzip(etag) if self._comprimir(largo) else etag)
+        self.end_headers()
+
+    def _responder_por_partes(self, trozos, tipo):
+        # Transfer-Encoding: chunked, un trozo por línea NDJSON a medida que se calcula
+        self.send_response(200)
+        self._cabeceras_cors()
+        self.send_header("Content-Type", tipo)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for trozo in trozos:
+                datos = trozo.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(datos), datos))
+        except Exception as e:
+            # Las cabeceras ya salieron: el error va como última línea
+            linea = json.dumps({"error": "Error inesperado en la ejecución", "detail": str(e)}) + "\n"
+            datos = linea.encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(datos), datos))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _formato_consulta(self):
+        _, _, consulta = self.path.partition("?")
+        formato = (parse_qs(consulta).get("formato") or [None])[0]
+        return formato if formato in FORMATOS else None
+
+    def _largo_cuerpo(self):
+        try:
+            return max(0, int(self.headers.get("Content-Length") or 0))
+        except ValueError:
+            return 0
+
+    def _leer_cuerpo(self):
+        largo = self._largo_cuerpo()
+        return self.rfile.read(largo) if largo > 0 else b""
+
+    def _leer_payload(self, lector=None):
+        largo = self._largo_cuerpo()
+        flujo = self.rfile if lector is None else lector
+        if LECTURA_FLUJO and largo > 0:
+            return decodificar_flujo(flujo, limite=largo)
+        return decodificar_cuerpo(flujo.read(largo) if largo > 0 else b"")
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self._cabeceras_cors()
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        ruta = self.path.split("?", 1)[0]
+        if ruta == "/metrics":
+            if not metricas.ACTIVAS:
+                self._responder(404, json.dumps({"error": "Métricas desactivadas (CITAS_METRICAS=1)"}))
+                return
+            self._responder(200, metricas.exponer(), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        if ruta == "/estadisticas":
+            cache = obtener_cache()
+            almacen = obtener_almacen()
+            coalescedor = obtener_coalescedor()
+            datos = {
+                "cache": cache.estadisticas() if cache is not None else None,
+                "almacen": almacen.estadisticas() if almacen is not None else None,
+                "coalescencia": coalescedor.estadisticas() if coalescedor is not None else None,
+                "http": obtener_cache_http().estadisticas(),
+            }
+            self._responder(200, json.dumps(datos))
+            return
+        self._responder(404, json.dumps({"error": "Ruta no encontrada"}))
+
+    def do_POST(self):
+        modo = perfilado.modo_solicitud(self.headers.get(perfilado.ENCABEZADO), self.client_address[0],
+                                        self.headers.get(perfilado.ENCABEZADO_TOKEN))
+        if modo is None:
+            self._atender_post()
+            return
+        # Perfil de la solicitud completa: lectura, cálculo y escritura de la respuesta
+        with perfilado.perfilar(modo) as perfil:
+            self._atender_post()
+        base = perfil.guardar(etiqueta="servidor")
+        print(f"Perfil guardado en {base}.*", file=sys.stderr)
+
+    def _atender_post(self):
+        if self.path.split("?", 1)[0] not in RUTAS_VALIDAS:
+            self._leer_cuerpo()
+            self._responder(404, json.dumps({"error": "Ruta no encontrada"}))
+            return
+
+        medicion = metricas.iniciar()
+        coalescedor = obtener_coalescedor()
+        lector = LectorConResumen(self.rfile) if coalescedor is not None or ETAG_ACTIVO else None
+        try:
+            with metricas.etapa("decodificacion"):
+                payload = self._leer_payload(lector)
+        except ValueError as e:
+            # Pudo quedar parte del cuerpo sin leer: no reutilizar la conexión
+            self.close_connection = True
+            self._responder(400, json.dumps({"error": str(e)}), medicion=medicion)
+            return
+
+        formato = self._formato_consulta() or formato_de(payload)
+
+        def armar_cuerpo():
+            resultado = calcular_disponibilidad(payload)
+            with metricas.etapa("salida"):
+                return "".join(fragmentos(resultado, formato, payload))
+
+        clave = None
+        if formato != "ndjson" and lector is not None and coalescible(payload):
+            clave = clave_solicitud(lector.resumen(), formato, date.today().isoformat())
+        # La respuesta sólo depende de la entrada si no interviene el almacén de ocupación
+        cache_http = obtener_cache_http() if ETAG_ACTIVO and clave is not None and obtener_almacen() is None else None
+        if_none_match = self.headers.get("If-None-Match") if ETAG_ACTIVO else None
+        if cache_http is not None and if_none_match:
+            conocido = cache_http.etag_conocido(clave)
+            if conocido is not None and coincide(if_none_match, conocido[0]):
+                self._no_modificado(*conocido, medicion, sin_calculo=True)
+                return
+
+        etag = None
+        largo = 0
+        try:
+            if formato == "ndjson":
+                resultado = calcular_disponibilidad(payload, perezoso=True)
+                # Las cabeceras salen antes de calcular: sólo se acumula en /metrics. Cada
+                # respuesta se produce a su ritmo, así que no se coalesce.
+                self._responder_por_partes(fragmentos(resultado, formato, payload), TIPOS_CONTENIDO[formato])
+                metricas.terminar(medicion)
+                return
+            if coalescedor is not None and clave is not None:
+                # Solicitudes idénticas simultáneas esperan el cuerpo que arma la primera
+                cuerpo, compartido = coalescedor.ejecutar(clave, armar_cuerpo)
+                if compartido:
+                    metricas.contar("coalescidas")
+            else:
+                cuerpo = armar_cuerpo()
+            if ETAG_ACTIVO:
+                datos = cuerpo.encode("utf-8")
+                etag, largo = etag_de(datos), len(datos)
+                if cache_http is not None:
+                    cache_http.recordar(clave, etag, largo)
+        except Exception as e:
+            # Igual que main.py: el error viaja en el cuerpo con 200
+            cuerpo = json.dumps({
+                "error": "Error inesperado en la ejecución",
+                "detail": str(e)
+            })
+        if coincide(if_none_match, etag):
+            self._no_modificado(etag, largo, medicion)
+            return
+        self._responder(200, cuerpo, medicion=medicion, etag=etag)
+
+    def log_message(self, format, *args):
+        if os.environ.get("CITAS_LOG_ACCESOS"):
+            super().log_message(format, *args)
+
+
+def precalentar():
+    """Carga la tabla de días hábiles antes de aceptar conexiones."""
+    obtener_tabla(date.today())
+
+
+class ServidorCitas(ThreadingHTTPServer):
+    # La cola de listen() por defecto (5) se llena con una ráfaga de conexiones simultáneas:
+    # el núcleo descarta los SYN/ACK sobrantes y el cliente reintenta al segundo o recibe RST
+    request_queue_size = 128
+
+
+def crear_servidor(host="0.0.0.0", puerto=8000):
+    servidor = ServidorCitas((host, puerto), ManejadorCitas)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def servir(host="0.0.0.0", puerto=8000, procesos=1):
+    """Atiende solicitudes hasta recibir SIGINT/SIGTERM.
+    Con procesos > 1 se hace pre-fork: todos los hijos comparten el socket de escucha
+    y el núcleo reparte las conexiones entre ellos (un GIL por proceso).
+    """
+    # Proceso de larga vida: la LRU en memoria de la cache de resultados sí acierta
+    usar_memoria()
+    precalentar()
+    servidor = crear_servidor(host, puerto)
+    if procesos <= 1:
+        iniciar_pool()
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+        return
+
+    hijos = []
+    for _ in range(procesos):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            iniciar_pool()
+            try:
+                servidor.serve_forever()
+            finally:
+                os._exit(0)
+        hijos.append(pid)
+
+    def terminar(signum, frame):
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, terminar)
+    signal.signal(signal.SIGINT, terminar)
+    for pid in hijos:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    servidor.server_close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Servidor HTTP persistente de disponibilidad de citas")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--puerto", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--procesos", type=int, default=int(os.environ.get("CITAS_PROCESOS", "1")),
+                        help="procesos trabajadores (pre-fork) que comparten el socket")
+    args = parser.parse_args(argv[1:])
+    print(f"Escuchando en http://{args.host}:{args.puerto}/ con {args.procesos} proceso(s)", file=sys.stderr)
+    servir(args.host, args.puerto, args.procesos)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
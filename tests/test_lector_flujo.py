@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import decodificar_flujo  # noqa: E402
+
+
+class FlujoCortado:
+    """Flujo binario que entrega el cuerpo en dos lecturas, cortado en `corte`."""
+
+    def __init__(self, datos, corte):
+        self._partes = [datos[:corte], datos[corte:]]
+
+    def read(self, n=-1):
+        while self._partes:
+            parte = self._partes[0]
+            if not parte:
+                self._partes.pop(0)
+                continue
+            if n is None or n < 0 or n >= len(parte):
+                return self._partes.pop(0)
+            self._partes[0] = parte[n:]
+            return parte[:n]
+        return b""
+
+
+class NumerosAlBordeTest(unittest.TestCase):
+    def test_numeros_cortados_en_cada_posicion(self):
+        payload = {
+            "minutos": 20,
+            "capacidad": 12.5e3,
+            "Cantidad_dias": -3.25E-2,
+            "calendar": [{"body": {"result": [
+                {"DATE_FROM": "27/09/2025 09:20:00", "DATE_TO": "27/09/2025 09:30:00", "VERSION": 1.5e10},
+            ]}}],
+            "valores": [12.5, 1.5e3, -0.0, 100],
+        }
+        datos = json.dumps(payload).encode("utf-8")
+        for corte in range(1, len(datos)):
+            with self.subTest(corte=corte):
+                self.assertEqual(decodificar_flujo(FlujoCortado(datos, corte)), payload)
+
+    def test_numero_suelto(self):
+        for numeros in ("12.5", "1.5e3", "-12", "0.25E-2, 3"):
+            texto = '{"valores": [%s], "minutos": 20}' % numeros
+            datos = texto.encode("ascii")
+            for corte in range(1, len(datos)):
+                with self.subTest(texto=texto, corte=corte):
+                    self.assertEqual(decodificar_flujo(FlujoCortado(datos, corte)), json.loads(texto))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import unittest
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import recolectar_ocupacion  # noqa: E402
+from recurrencia import expandir_series  # noqa: E402
+
+VENTANA = (date(2026, 10, 1), date(2026, 12, 31))
+
+
+def serie(rrule, desde, hasta, **campos):
+    """Evento recurrente con DATE_FROM/DATE_TO en formato Bitrix."""
+    ev = {"ID": "10", "DATE_FROM": desde, "DATE_TO": hasta, "RRULE": rrule}
+    ev.update(campos)
+    return ev
+
+
+def dias(intervalos):
+    return [inicio.date().isoformat() for inicio, _ in sorted(intervalos)]
+
+
+class SemanalesTest(unittest.TestCase):
+    def test_count_cuenta_desde_dtstart(self):
+        ev = serie("FREQ=WEEKLY;BYDAY=MO,WE;COUNT=5", "21/10/2026 09:00:00", "21/10/2026 10:00:00")
+        self.assertEqual(dias(expandir_series([ev], VENTANA)),
+                         ["2026-10-21", "2026-10-26", "2026-10-28", "2026-11-02", "2026-11-04"])
+
+    def test_count_con_ventana_a_mitad_de_serie(self):
+        # Saltar directo a la ventana no cambia la numeración de COUNT
+        ev = serie("FREQ=WEEKLY;BYDAY=MO,WE;COUNT=5", "21/10/2026 09:00:00", "21/10/2026 10:00:00")
+        self.assertEqual(dias(expandir_series([ev], (date(2026, 10, 29), date(2026, 12, 31)))),
+                         ["2026-11-02", "2026-11-04"])
+
+    def test_intervalo_y_primera_semana_parcial(self):
+        # DTSTART jueves: el martes de esa semana no cuenta
+        ev = serie("FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH;COUNT=4", "22/10/2026 09:00:00", "22/10/2026 10:00:00")
+        self.assertEqual(dias(expandir_series([ev], VENTANA)),
+                         ["2026-10-22", "2026-11-03", "2026-11-05", "2026-11-17"])
+
+    def test_conserva_horario_y_duracion(self):
+        ev = serie("FREQ=WEEKLY;COUNT=2", "20/10/2026 09:30:00", "20/10/2026 10:15:00")
+        self.assertEqual(sorted(expandir_series([ev], VENTANA)), [
+            (datetime(2026, 10, 20, 9, 30), datetime(2026, 10, 20, 10, 15)),
+            (datetime(2026, 10, 27, 9, 30), datetime(2026, 10, 27, 10, 15)),
+        ])
+
+
+class DiariasTest(unittest.TestCase):
+    def test_byday_con_intervalo(self):
+        # Cada 3 días desde un lunes, sólo los que caen lunes o viernes
+        ev = serie("FREQ=DAILY;INTERVAL=3;BYDAY=MO,FR;COUNT=3", "19/10/2026 09:00:00", "19/10/2026 10:00:00")
+        self.assertEqual(dias(expandir_series([ev], VENTANA)), ["2026-10-19", "2026-11-06", "2026-11-09"])
+
+    def test_regla_que_nunca_coincide(self):
+        # Cada 7 días desde un lunes nunca cae martes: termina al final de la ventana
+        ev = serie("FREQ=DAILY;INTERVAL=7;BYDAY=TU", "19/10/2026 09:00:00", "19/10/2026 10:00:00")
+        self.assertEqual(expandir_series([ev], VENTANA), [])
+
+    def test_intervalo_enorme(self):
+        ev = serie("FREQ=YEARLY;INTERVAL=10000", "19/10/2026 09:00:00", "19/10/2026 10:00:00")
+        self.assertEqual(dias(expandir_series([ev], VENTANA)), ["2026-10-19"])
+
+
+class MensualesTest(unittest.TestCase):
+    def test_meses_sin_el_dia_no_cuentan(self):
+        ev = serie("FREQ=MONTHLY;COUNT=3", "31/01/2026 09:00:00", "31/01/2026 10:00:00")
+        self.assertEqual(dias(expandir_series([ev], (date(2026, 1, 1), date(2026, 12, 31)))),
+                         ["2026-01-31", "2026-03-31", "2026-05-31"])
+
+
+class ExcepcionesTest(unittest.TestCase):
+    def test_exdate_excluye_sin_sumar_ocurrencias(self):
+        ev = serie("FREQ=DAILY;COUNT=5", "19/10/2026 09:00:00", "19/10/2026 10:00:00",
+                   EXDATE="21.10.2026;23.10.2026")
+        self.assertEqual(dias(expandir_series([ev], VENTANA)), ["2026-10-19", "2026-10-20", "2026-10-22"])
+
+    def test_instancia_modificada(self):
+        # La ocurrencia del 27/10 se movió al 28/10 por la tarde
+        eventos = [
+            serie("FREQ=WEEKLY;COUNT=3", "20/10/2026 09:00:00", "20/10/2026 10:00:00"),
+            {"ID": "11", "RECURRENCE_ID": "10", "ORIGINAL_DATE_FROM": "27/10/2026 09:00:00",
+             "DATE_FROM": "28/10/2026 15:00:00", "DATE_TO": "28/10/2026 16:00:00"},
+        ]
+        self.assertEqual(dias(expandir_series(eventos, VENTANA)), ["2026-10-20", "2026-11-03"])
+        payload = {"calendar": [{"body": {"result": eventos}}]}
+        self.assertEqual(sorted(recolectar_ocupacion(payload, VENTANA)), [
+            (datetime(2026, 10, 20, 9, 0), datetime(2026, 10, 20, 10, 0)),
+            (datetime(2026, 10, 28, 15, 0), datetime(2026, 10, 28, 16, 0)),
+            (datetime(2026, 11, 3, 9, 0), datetime(2026, 11, 3, 10, 0)),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()